@@ -6,6 +6,12 @@ from capturador_inventario_api.models import (
     Captura, 
     DetalleCaptura,
     BitacoraSincronizacion,
+    BloqueoSincronizacion,
+    DocumentoMicrosip,
+    SnapshotCatalogo,
+    SolicitudIdempotente,
+    CargaCaptura,
+    FragmentoCarga,
     Articulo,
     ClaveAuxiliar,
     Almacen,
@@ -54,7 +60,7 @@ class DetalleCapturaInline(admin.TabularInline):
     model = DetalleCaptura
     extra = 0
     raw_id_fields = ("articulo",)
-    readonly_fields = ("existencia_sistema_al_momento",) 
+    readonly_fields = ("existencia_sistema_al_momento", "total_tickets", "diferencia", "diferencia_valor", "estatus_conciliacion")
 
 @admin.register(Captura)
 class CapturaAdmin(admin.ModelAdmin):
@@ -67,9 +73,10 @@ class CapturaAdmin(admin.ModelAdmin):
 
 @admin.register(DetalleCaptura)
 class DetalleCapturaAdmin(admin.ModelAdmin):
-    list_display = ('captura', 'get_articulo_clave', 'cantidad_contada', 'localizacion_al_momento', 'existencia_sistema_al_momento')
+    list_display = ('captura', 'get_articulo_clave', 'cantidad_contada', 'localizacion_al_momento', 'existencia_sistema_al_momento', 'diferencia', 'estatus_conciliacion')
     search_fields = ('articulo__clave', 'captura__folio')
-    list_filter = ('captura__almacen',)
+    list_filter = ('captura__almacen', 'estatus_conciliacion')
+    readonly_fields = ('total_tickets', 'diferencia', 'diferencia_valor', 'estatus_conciliacion')
     raw_id_fields = ("articulo",)
     
     def get_articulo_clave(self, obj):
@@ -114,7 +121,7 @@ class InventarioArticuloAdmin(admin.ModelAdmin):
         'pendiente_sincronizar_msip'
     )
     search_fields = ('articulo__clave', 'articulo__nombre', 'localizacion')
-    list_filter = ('almacen', 'pendiente_sincronizar_msip')
+    list_filter = ('almacen', 'pendiente_sincronizar_msip', 'bajo_punto_reorden')
     raw_id_fields = ('articulo',)
 
     def get_articulo_clave(self, obj):
@@ -139,6 +146,7 @@ class BitacoraSincronizacionAdmin(admin.ModelAdmin):
     list_display = (
         'fecha_inicio', 
         'status', 
+        'etapa',
         'articulos_procesados', 
         'articulos_creados', 
         'duracion_segundos'
@@ -153,6 +161,11 @@ class BitacoraSincronizacionAdmin(admin.ModelAdmin):
         'articulos_creados',
         'articulos_actualizados',
         'articulos_desactivados',
+        'existencias_procesadas',
+        'inventarios_actualizados',
+        'etapa',
+        'task_id',
+        'solicitado_por',
         'mensaje_error',
         'detalles'
     )
@@ -162,4 +175,71 @@ class BitacoraSincronizacionAdmin(admin.ModelAdmin):
             delta = obj.fecha_fin - obj.fecha_inicio
             return f"{delta.total_seconds():.2f} s"
         return "-"
-    duracion_segundos.short_description = "Duración"
\ No newline at end of file
+    duracion_segundos.short_description = "Duración"
+
+
+@admin.register(BloqueoSincronizacion)
+class BloqueoSincronizacionAdmin(admin.ModelAdmin):
+    """
+    Permite ver quién tiene el bloqueo de sincronización y liberarlo a mano
+    (vaciando 'propietario') si un proceso murió y no se quiere esperar a que expire.
+    """
+    list_display = ('nombre', 'propietario', 'bitacora', 'adquirido_en', 'heartbeat', 'expira')
+    readonly_fields = ('nombre', 'bitacora', 'adquirido_en', 'heartbeat', 'expira')
+
+
+# -------------------------------------------------------------------------
+# 6. BANDEJA DE SALIDA HACIA MICROSIP
+# -------------------------------------------------------------------------
+
+@admin.register(DocumentoMicrosip)
+class DocumentoMicrosipAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tipo', 'almacen', 'estado', 'num_renglones', 'intentos', 'fecha_creacion', 'fecha_aplicacion')
+    list_filter = ('estado', 'tipo', 'almacen')
+    readonly_fields = ('renglones', 'capturas', 'fecha_creacion', 'fecha_aplicacion', 'ultimo_error')
+
+    def num_renglones(self, obj):
+        return len(obj.renglones or [])
+    num_renglones.short_description = "Renglones"
+
+
+# -------------------------------------------------------------------------
+# 7. CATÁLOGO OFFLINE (Snapshots)
+# -------------------------------------------------------------------------
+
+@admin.register(SnapshotCatalogo)
+class SnapshotCatalogoAdmin(admin.ModelAdmin):
+    list_display = ('almacen', 'fecha_generacion', 'total_articulos', 'tamano_bytes', 'etag', 'bitacora')
+    list_filter = ('almacen',)
+    readonly_fields = ('almacen', 'bitacora', 'archivo', 'etag', 'tamano_bytes', 'total_articulos', 'fecha_generacion')
+
+
+# -------------------------------------------------------------------------
+# 8. REINTENTOS IDEMPOTENTES (Handhelds)
+# -------------------------------------------------------------------------
+
+@admin.register(SolicitudIdempotente)
+class SolicitudIdempotenteAdmin(admin.ModelAdmin):
+    list_display = ('dispositivo', 'llave', 'usuario', 'ruta', 'codigo_respuesta', 'fecha_creacion')
+    search_fields = ('dispositivo', 'llave', 'ruta')
+    readonly_fields = ('dispositivo', 'llave', 'usuario', 'ruta', 'huella_solicitud', 'codigo_respuesta', 'respuesta', 'fecha_creacion')
+
+
+# -------------------------------------------------------------------------
+# 9. SUBIDAS POR FRAGMENTOS
+# -------------------------------------------------------------------------
+
+class FragmentoCargaInline(admin.TabularInline):
+    model = FragmentoCarga
+    extra = 0
+    can_delete = False
+    fields = ('numero', 'fecha_recepcion')
+    readonly_fields = ('numero', 'fecha_recepcion')
+
+@admin.register(CargaCaptura)
+class CargaCapturaAdmin(admin.ModelAdmin):
+    list_display = ('id', 'captura', 'usuario', 'estado', 'total_fragmentos', 'fecha_creacion', 'fecha_confirmacion')
+    list_filter = ('estado',)
+    search_fields = ('captura__folio',)
+    readonly_fields = ('captura', 'usuario', 'total_fragmentos', 'fecha_creacion', 'fecha_confirmacion')
+    inlines = [FragmentoCargaInline]
@@ -0,0 +1,147 @@
+"""
+Generación de snapshots del catálogo por almacén (ver SnapshotCatalogo).
+
+Formato: base SQLite comprimida con gzip, con las tablas
+    articulos(id, clave, nombre, seguimiento)
+    claves_auxiliares(clave, articulo_id)
+    existencias(articulo_id, existencia, localizacion)
+    metadatos(llave, valor)
+"""
+import gzip
+import hashlib
+import os
+import sqlite3
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from capturador_inventario_api.models import (
+    Almacen, Articulo, BitacoraSincronizacion, ClaveAuxiliar, InventarioArticulo, SnapshotCatalogo
+)
+
+# Cambiarla invalida los snapshots existentes (cambia el etag)
+VERSION_FORMATO = '1'
+TAMANO_LOTE = 5000
+
+_ESQUEMA = """
+    CREATE TABLE articulos (id INTEGER PRIMARY KEY, clave TEXT NOT NULL, nombre TEXT NOT NULL, seguimiento TEXT);
+    CREATE TABLE claves_auxiliares (clave TEXT NOT NULL, articulo_id INTEGER NOT NULL);
+    CREATE TABLE existencias (articulo_id INTEGER PRIMARY KEY, existencia REAL NOT NULL, localizacion TEXT);
+    CREATE TABLE metadatos (llave TEXT PRIMARY KEY, valor TEXT);
+"""
+
+_INDICES = """
+    CREATE INDEX idx_articulos_clave ON articulos (clave);
+    CREATE INDEX idx_claves_auxiliares_clave ON claves_auxiliares (clave);
+"""
+
+
+def _volcar(con, huella, sql_insert, filas):
+    """Inserta por lotes y acumula las filas en la huella (etag)."""
+    lote = []
+    for fila in filas:
+        huella.update(repr(fila).encode('utf-8'))
+        lote.append(fila)
+        if len(lote) >= TAMANO_LOTE:
+            con.executemany(sql_insert, lote)
+            lote = []
+    if lote:
+        con.executemany(sql_insert, lote)
+
+
+def generacion_actual():
+    """Generación del catálogo = ID de la última sincronización exitosa (0 si no hay)."""
+    ultima = BitacoraSincronizacion.objects.filter(status='EXITO').order_by('-id').values_list('id', flat=True).first()
+    return ultima or 0
+
+
+def _construir_sqlite(ruta, almacen, generacion):
+    """Escribe el catálogo en `ruta` y retorna (etag, total_articulos)."""
+    huella = hashlib.sha256(f"v{VERSION_FORMATO}:{almacen.id}".encode('utf-8'))
+
+    articulos = Articulo.objects.filter(activo=True).order_by('id').values_list(
+        'id', 'clave', 'nombre', 'seguimiento_tipo'
+    ).iterator(chunk_size=TAMANO_LOTE)
+    claves = ClaveAuxiliar.objects.filter(articulo__activo=True).order_by('articulo_id', 'clave').values_list(
+        'clave', 'articulo_id'
+    ).iterator(chunk_size=TAMANO_LOTE)
+    existencias = (
+        (articulo_id, float(existencia), localizacion)
+        for articulo_id, existencia, localizacion in InventarioArticulo.objects.filter(
+            almacen=almacen, articulo__activo=True
+        ).order_by('articulo_id').values_list(
+            'articulo_id', 'existencia', 'localizacion'
+        ).iterator(chunk_size=TAMANO_LOTE)
+    )
+
+    con = sqlite3.connect(ruta)
+    try:
+        con.executescript(_ESQUEMA)
+        _volcar(con, huella, "INSERT INTO articulos VALUES (?, ?, ?, ?)", articulos)
+        _volcar(con, huella, "INSERT INTO claves_auxiliares VALUES (?, ?)", claves)
+        _volcar(con, huella, "INSERT INTO existencias VALUES (?, ?, ?)", existencias)
+        con.executescript(_INDICES)
+
+        etag = huella.hexdigest()
+        total_articulos = con.execute("SELECT COUNT(*) FROM articulos").fetchone()[0]
+        con.executemany("INSERT INTO metadatos VALUES (?, ?)", [
+            ('version_formato', VERSION_FORMATO),
+            ('almacen_id', str(almacen.id)),
+            ('almacen_id_msip', str(almacen.almacen_id_msip)),
+            ('almacen_nombre', almacen.nombre),
+            ('generado', timezone.now().isoformat()),
+            # Punto de partida para el feed de cambios (?desde_generacion=)
+            ('generacion', str(generacion)),
+            ('etag', etag),
+        ])
+        con.commit()
+    finally:
+        con.close()
+
+    return etag, total_articulos
+
+
+def generar_snapshot_almacen(almacen, bitacora=None):
+    """
+    Genera el snapshot del almacén. Si los datos no cambiaron desde el último
+    (mismo etag) se conserva ese y no se escribe nada. Solo se guarda el más reciente.
+    """
+    descriptor, ruta = tempfile.mkstemp(suffix='.sqlite3')
+    os.close(descriptor)
+    try:
+        generacion = bitacora.id if bitacora else generacion_actual()
+        etag, total_articulos = _construir_sqlite(ruta, almacen, generacion)
+
+        anterior = SnapshotCatalogo.objects.filter(almacen=almacen).first()
+        if anterior and anterior.etag == etag:
+            return anterior
+
+        with open(ruta, 'rb') as archivo:
+            comprimido = gzip.compress(archivo.read(), compresslevel=9)
+    finally:
+        os.remove(ruta)
+
+    snapshot = SnapshotCatalogo(
+        almacen=almacen,
+        bitacora=bitacora,
+        etag=etag,
+        tamano_bytes=len(comprimido),
+        total_articulos=total_articulos
+    )
+    snapshot.archivo.save(f"catalogo_{almacen.almacen_id_msip}_{etag[:12]}.sqlite3.gz", ContentFile(comprimido), save=True)
+
+    for viejo in SnapshotCatalogo.objects.filter(almacen=almacen).exclude(pk=snapshot.pk):
+        viejo.archivo.delete(save=False)
+        viejo.delete()
+
+    return snapshot
+
+
+def generar_snapshots_catalogo(bitacora=None):
+    """Genera (o conserva si no cambió) el snapshot de cada almacén activo."""
+    resultados = {}
+    for almacen in Almacen.objects.filter(activo_web=True):
+        snapshot = generar_snapshot_almacen(almacen, bitacora=bitacora)
+        resultados[almacen.id] = snapshot.etag
+    return resultados
@@ -0,0 +1,94 @@
+"""
+Conciliación de capturas (se ejecuta al pasar una Captura a CONFIRMADO, o al crearla
+ya CONFIRMADA, y se repite sobre los detalles que cambian mientras lo está).
+
+Por cada detalle guarda, en una sola pasada por conjunto (UPDATE con subconsultas):
+    total_tickets        suma de TicketSalida del detalle
+    diferencia           cantidad_contada - existencia_sistema_al_momento
+    diferencia_valor     diferencia * costo_ultimo del artículo (NULL si el artículo aún
+                         no tiene costo sincronizado: un 0 haría pasar la diferencia por
+                         exacta en valor)
+    estatus_conciliacion EXACTO / SOBRANTE / FALTANTE
+
+cantidad_contada ya es el conteo neto: TicketCreateView descuenta cada ticket al
+registrarlo, así que total_tickets es informativo y no se vuelve a restar.
+"""
+from decimal import Decimal
+
+from django.db.models import Case, Count, DecimalField, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from capturador_inventario_api.models import Articulo, DetalleCaptura, TicketSalida
+
+_DECIMAL_CANTIDAD = DecimalField(max_digits=18, decimal_places=5)
+_DECIMAL_COSTO = DecimalField(max_digits=18, decimal_places=6)
+
+
+def conciliar_detalles(detalles):
+    """UPDATE por conjunto sobre el queryset de detalles."""
+    tickets = TicketSalida.objects.filter(detalle=OuterRef('pk')).values('detalle').annotate(
+        total=Sum('cantidad')
+    ).values('total')
+    costo = Articulo.objects.filter(pk=OuterRef('articulo_id'), costo_ultimo__gt=0).values('costo_ultimo')[:1]
+    diferencia = ExpressionWrapper(
+        F('cantidad_contada') - F('existencia_sistema_al_momento'), output_field=_DECIMAL_CANTIDAD
+    )
+
+    return detalles.update(
+        total_tickets=Coalesce(Subquery(tickets, output_field=_DECIMAL_CANTIDAD), Value(Decimal('0')), output_field=_DECIMAL_CANTIDAD),
+        diferencia=diferencia,
+        diferencia_valor=Case(
+            When(cantidad_contada=F('existencia_sistema_al_momento'), then=Value(Decimal('0'))),
+            default=ExpressionWrapper(diferencia * Subquery(costo, output_field=_DECIMAL_COSTO), output_field=_DECIMAL_COSTO),
+            output_field=_DECIMAL_COSTO
+        ),
+        estatus_conciliacion=Case(
+            When(cantidad_contada__gt=F('existencia_sistema_al_momento'), then=Value('SOBRANTE')),
+            When(cantidad_contada__lt=F('existencia_sistema_al_momento'), then=Value('FALTANTE')),
+            default=Value('EXACTO')
+        )
+    )
+
+
+def conciliar_captura(captura):
+    """Calcula y guarda las columnas de conciliación de todos los detalles. Retorna el resumen."""
+    conciliar_detalles(DetalleCaptura.objects.filter(captura=captura))
+    return resumen_conciliacion(captura)
+
+
+def reconciliar_si_confirmada(captura, detalle_ids=None):
+    """
+    Los detalles de una captura ya CONFIRMADA cambiaron (ticket, edición, carga): se
+    vuelven a conciliar para que lo guardado no quede desfasado. Con detalle_ids solo
+    esos detalles; sin ellos, la captura completa.
+    """
+    if captura.estado != 'CONFIRMADO':
+        return
+    detalles = DetalleCaptura.objects.filter(captura=captura)
+    if detalle_ids is not None:
+        detalles = detalles.filter(pk__in=detalle_ids)
+    conciliar_detalles(detalles)
+
+
+def limpiar_conciliacion(captura):
+    """La captura regresó a BORRADOR: los valores guardados ya no son definitivos."""
+    DetalleCaptura.objects.filter(captura=captura).update(
+        total_tickets=None, diferencia=None, diferencia_valor=None, estatus_conciliacion=None
+    )
+
+
+def resumen_conciliacion(captura):
+    """
+    Totales de la captura leídos de las columnas ya calculadas. sin_costo cuenta los
+    renglones con diferencia que no entran en diferencia_valor por no tener costo.
+    """
+    resumen = DetalleCaptura.objects.filter(captura=captura).aggregate(
+        renglones=Count('id'),
+        exactos=Count('id', filter=Q(estatus_conciliacion='EXACTO')),
+        sobrantes=Count('id', filter=Q(estatus_conciliacion='SOBRANTE')),
+        faltantes=Count('id', filter=Q(estatus_conciliacion='FALTANTE')),
+        sin_costo=Count('id', filter=Q(diferencia_valor__isnull=True, estatus_conciliacion__isnull=False)),
+        diferencia_valor=Sum('diferencia_valor')
+    )
+    resumen['diferencia_valor'] = resumen['diferencia_valor'] or Decimal('0')
+    return resumen
@@ -0,0 +1,161 @@
+"""
+Conteo cíclico por clasificación ABC (ver settings.CONTEO_CICLICO).
+
+1. clasificar_abc: ordena las existencias del almacén por valor (existencia * costo_ultimo,
+   el costo lo llena la sincronización). Las que suman el primer UMBRAL_A del valor son A,
+   hasta UMBRAL_B son B, el resto C. Un artículo con diferencias (SOBRANTE/FALTANTE) en
+   capturas recientes sube una clase. Sin valor (costos aún sin sincronizar) no reclasifica.
+2. generar_conteo_ciclico: crea la captura BORRADOR del día (tipo CICLICO) con los
+   artículos que ya toca contar según FRECUENCIA_DIAS de su clase, primero A, luego B y C;
+   dentro de cada clase los que llevan más tiempo sin contarse y los de mayor valor.
+"""
+import logging
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Max, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from capturador_inventario_api.models import (
+    AsignacionConteo, Captura, DetalleCaptura, InventarioArticulo, generar_folio_captura
+)
+from capturador_inventario_api.registro_eventos import evento, obtener_logger
+
+log = obtener_logger('tareas')
+
+CLASE_SUPERIOR = {'A': 'A', 'B': 'A', 'C': 'B'}
+TAMANO_LOTE = 2000
+
+
+def _valor_inventario():
+    return ExpressionWrapper(
+        F('existencia') * F('articulo__costo_ultimo'),
+        output_field=DecimalField(max_digits=36, decimal_places=11)
+    )
+
+
+def clasificar_abc(almacen, ahora=None):
+    """Recalcula InventarioArticulo.clasificacion_abc del almacén. Retorna cuántos quedaron en cada clase."""
+    config = settings.CONTEO_CICLICO
+    ahora = ahora or timezone.now()
+
+    filas = list(
+        InventarioArticulo.objects.filter(almacen=almacen, articulo__activo=True)
+        .annotate(valor=_valor_inventario())
+        .order_by('-valor', 'pk')
+        .values_list('pk', 'articulo_id', 'valor')
+    )
+    # Existencias negativas no aportan valor
+    total = sum(max(valor or 0, 0) for _, _, valor in filas)
+    if filas and total <= 0:
+        # Todo quedaría en C y el conteo cíclico dejaría de priorizar lo valioso:
+        # se conserva la clasificación anterior hasta que haya costos
+        evento(
+            log, 'conteo_ciclico.sin_valor', "Almacén sin valor de inventario (¿costos sin sincronizar?); no se reclasifica",
+            logging.WARNING, almacen=almacen.almacen_id_msip
+        )
+        actuales = dict(
+            InventarioArticulo.objects.filter(almacen=almacen, articulo__activo=True)
+            .order_by().values_list('clasificacion_abc').annotate(n=Count('id'))
+        )
+        return {clase: actuales.get(clase, 0) for clase in ('A', 'B', 'C')}
+
+    con_diferencias = set(
+        DetalleCaptura.objects.filter(
+            captura__almacen=almacen,
+            captura__fecha_captura__gte=ahora - timedelta(days=config['DIAS_DIFERENCIAS']),
+            estatus_conciliacion__in=['SOBRANTE', 'FALTANTE']
+        ).values_list('articulo_id', flat=True)
+    )
+
+    limite_a = total * Decimal(str(config['UMBRAL_A']))
+    limite_b = total * Decimal(str(config['UMBRAL_B']))
+
+    por_clase = {'A': [], 'B': [], 'C': []}
+    acumulado = 0
+    for pk, articulo_id, valor in filas:
+        valor = max(valor or 0, 0)
+        # Se clasifica por el acumulado previo: el artículo que cruza el umbral sigue en la clase
+        if valor > 0 and acumulado < limite_a:
+            clase = 'A'
+        elif valor > 0 and acumulado < limite_b:
+            clase = 'B'
+        else:
+            clase = 'C'
+        acumulado += valor
+
+        if articulo_id in con_diferencias:
+            clase = CLASE_SUPERIOR[clase]
+        por_clase[clase].append(pk)
+
+    # update() no toca fecha_ultima_modificacion_local: no aparece en el feed del catálogo
+    for clase, pks in por_clase.items():
+        for inicio in range(0, len(pks), TAMANO_LOTE):
+            InventarioArticulo.objects.filter(pk__in=pks[inicio:inicio + TAMANO_LOTE]).update(clasificacion_abc=clase)
+
+    return {clase: len(pks) for clase, pks in por_clase.items()}
+
+
+def generar_conteo_ciclico(almacen, ahora=None):
+    """
+    Crea la captura BORRADOR del día con sus AsignacionConteo. Retorna la captura,
+    o None si ya existe la del día o no hay artículos pendientes.
+    """
+    config = settings.CONTEO_CICLICO
+    ahora = ahora or timezone.now()
+    hoy = timezone.localdate(ahora)
+
+    # Rango [inicio, fin) del día local en vez de fecha_captura__date: con USE_TZ en
+    # MariaDB __date usa CONVERT_TZ, que sin las tablas de zonas no encuentra nada
+    inicio_dia = timezone.make_aware(datetime.combine(hoy, time.min))
+    fin_dia = timezone.make_aware(datetime.combine(hoy + timedelta(days=1), time.min))
+    if Captura.objects.filter(
+        almacen=almacen, tipo='CICLICO', fecha_captura__gte=inicio_dia, fecha_captura__lt=fin_dia
+    ).exists():
+        return None
+
+    ultimo_conteo = DetalleCaptura.objects.filter(
+        captura__almacen=almacen, articulo_id=OuterRef('articulo_id')
+    ).order_by().values('articulo_id').annotate(ultimo=Max('captura__fecha_captura')).values('ultimo')
+
+    candidatos = InventarioArticulo.objects.filter(almacen=almacen, articulo__activo=True).annotate(
+        ultimo_conteo=Subquery(ultimo_conteo),
+        valor=_valor_inventario()
+    )
+
+    seleccion = []
+    restantes = config['ARTICULOS_POR_DIA']
+    for clase in ('A', 'B', 'C'):
+        if restantes <= 0:
+            break
+        limite = ahora - timedelta(days=config['FRECUENCIA_DIAS'][clase])
+        filas = candidatos.filter(clasificacion_abc=clase).filter(
+            Q(ultimo_conteo__isnull=True) | Q(ultimo_conteo__lt=limite)
+        ).order_by(
+            F('ultimo_conteo').asc(nulls_first=True), F('valor').desc()
+        ).values_list('articulo_id', 'ultimo_conteo')[:restantes]
+
+        seleccion.extend((articulo_id, clase, ultimo) for articulo_id, ultimo in filas)
+        restantes = config['ARTICULOS_POR_DIA'] - len(seleccion)
+
+    if not seleccion:
+        return None
+
+    resumen = ', '.join(
+        f"{clase}: {sum(1 for _, c, _ in seleccion if c == clase)}" for clase in ('A', 'B', 'C')
+    )
+    with transaction.atomic():
+        captura = Captura.objects.create(
+            folio=generar_folio_captura(),
+            almacen=almacen,
+            tipo='CICLICO',
+            detalles_texto=f"Conteo cíclico {hoy.isoformat()} ({resumen})"
+        )
+        AsignacionConteo.objects.bulk_create([
+            AsignacionConteo(captura=captura, articulo_id=articulo_id, clasificacion_abc=clase, ultimo_conteo=ultimo)
+            for articulo_id, clase, ultimo in seleccion
+        ])
+
+    return captura
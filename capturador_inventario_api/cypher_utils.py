@@ -1,28 +1,98 @@
 import base64
-from cryptography.fernet import Fernet, InvalidToken
+from functools import lru_cache
+from cryptography.fernet import Fernet, MultiFernet, InvalidToken
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from django.conf import settings
 
+SALT_DEFECTO = b'hdjk'
+
+
+def _a_bytes(valor):
+    return valor if isinstance(valor, bytes) else valor.encode('utf-8')
+
+
+@lru_cache(maxsize=32)
+def _derivar_fernet(password, salt):
+    """PBKDF2 es costoso a propósito: se deriva una sola vez por (password, salt)."""
+    key = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=1000, backend=default_backend()).derive(password)
+    return Fernet(base64.urlsafe_b64encode(key))
+
+
+@lru_cache(maxsize=8)
+def _multi_fernet(passwords, salt):
+    return MultiFernet([_derivar_fernet(p, salt) for p in passwords])
+
+
 class CypherUtils:
+    """
+    Cifrado simétrico (Fernet) con llave derivada de settings.CRYPTO_PASSWORD.
+
+    Rotación: poner la contraseña nueva en CRYPTO_PASSWORD y las anteriores en
+    CRYPTO_PASSWORDS_ANTERIORES. Se cifra siempre con la nueva y se descifra con
+    cualquiera; `rotar`/`rotar_lote` re-cifran valores viejos con la llave nueva.
+    """
+
+    @staticmethod
+    def _passwords():
+        actual = settings.CRYPTO_PASSWORD
+        anteriores = getattr(settings, 'CRYPTO_PASSWORDS_ANTERIORES', [])
+        return tuple(_a_bytes(p) for p in [actual, *anteriores])
+
+    @staticmethod
+    def cipher():
+        """Cipher (MultiFernet) de las contraseñas configuradas, cacheado."""
+        return _multi_fernet(CypherUtils._passwords(), SALT_DEFECTO)
+
+    @staticmethod
+    def limpiar_cache():
+        """Descarta las llaves derivadas (ej. después de cambiar la configuración)."""
+        _derivar_fernet.cache_clear()
+        _multi_fernet.cache_clear()
 
     @staticmethod
     def encripta(plaintext):
-        password = settings.CRYPTO_PASSWORD
-        enc_bytes =  CypherUtils.encrypt1(plaintext.encode('utf-8'), password.encode('utf-8'))
-        return enc_bytes.decode('utf-8')
+        return CypherUtils.cipher().encrypt(plaintext.encode('utf-8')).decode('utf-8')
 
     @staticmethod
     def desencripta(cyphertext):
-        password = settings.CRYPTO_PASSWORD
-        denc_bytes =  CypherUtils.decrypt1(cyphertext.encode('utf-8'), password.encode('utf-8'))
-        return denc_bytes.decode('utf-8')
+        return CypherUtils.cipher().decrypt(cyphertext.encode('utf-8')).decode('utf-8')
+
+    @staticmethod
+    def encripta_lote(valores):
+        """Cifra una lista de textos con una sola llave derivada. Los None se conservan."""
+        cipher = CypherUtils.cipher()
+        return [
+            cipher.encrypt(v.encode('utf-8')).decode('utf-8') if v is not None else None
+            for v in valores
+        ]
+
+    @staticmethod
+    def desencripta_lote(valores):
+        """Descifra una lista de textos con una sola llave derivada. Los None se conservan."""
+        cipher = CypherUtils.cipher()
+        return [
+            cipher.decrypt(v.encode('utf-8')).decode('utf-8') if v is not None else None
+            for v in valores
+        ]
+
+    @staticmethod
+    def rotar(cyphertext):
+        """Re-cifra un valor (cifrado con cualquier contraseña configurada) con la actual."""
+        return CypherUtils.cipher().rotate(cyphertext.encode('utf-8')).decode('utf-8')
+
+    @staticmethod
+    def rotar_lote(valores):
+        cipher = CypherUtils.cipher()
+        return [
+            cipher.rotate(v.encode('utf-8')).decode('utf-8') if v is not None else None
+            for v in valores
+        ]
 
     @staticmethod
-    def cipherFernet(password):
-        key = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=b'hdjk', iterations=1000, backend=default_backend()).derive(password)
-        return Fernet(base64.urlsafe_b64encode(key))
+    def cipherFernet(password, salt=SALT_DEFECTO):
+        return _derivar_fernet(_a_bytes(password), salt)
 
     @staticmethod
     def encrypt1(plaintext, password):
@@ -30,4 +100,4 @@ class CypherUtils:
 
     @staticmethod
     def decrypt1(ciphertext, password):
-        return CypherUtils.cipherFernet(password).decrypt(ciphertext)
\ No newline at end of file
+        return CypherUtils.cipherFernet(password).decrypt(ciphertext)
@@ -0,0 +1,97 @@
+"""
+Reintentos idempotentes para las subidas de los handhelds.
+
+El cliente envía `Idempotency-Key: <uuid por operación>` y `X-Device-Id: <id del equipo>`.
+La primera petición se procesa y, si fue exitosa (2xx), su respuesta se guarda en
+SolicitudIdempotente. Un reintento con la misma llave recibe esa respuesta guardada
+(header `Idempotent-Replayed: true`) sin volver a ejecutar la vista.
+
+Todo ocurre en una transacción: el registro de la llave bloquea el índice único, así
+que un reintento que llega mientras el original sigue en proceso espera a que termine.
+Si el original falla (no 2xx) se revierte también el registro y el reintento se procesa.
+"""
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from capturador_inventario_api.models import SolicitudIdempotente
+
+LONGITUD_MAXIMA_LLAVE = 64
+
+
+def _huella_solicitud(request):
+    cuerpo = json.dumps(request.data, sort_keys=True, cls=JSONEncoder)
+    return hashlib.sha256(f"{request.method} {request.path}\n{cuerpo}".encode('utf-8')).hexdigest()
+
+
+def _respuesta_guardada(registro, huella):
+    if registro.huella_solicitud != huella:
+        return Response(
+            {"error": "La Idempotency-Key ya se usó con otra petición."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    response = Response(registro.respuesta, status=registro.codigo_respuesta)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotente(metodo):
+    """Decorador para métodos de APIView (post/put/patch). Sin Idempotency-Key no hace nada."""
+    @wraps(metodo)
+    def wrapper(self, request, *args, **kwargs):
+        llave = request.headers.get('Idempotency-Key', '').strip()
+        if not llave:
+            return metodo(self, request, *args, **kwargs)
+        if len(llave) > LONGITUD_MAXIMA_LLAVE:
+            return Response(
+                {"error": f"Idempotency-Key excede {LONGITUD_MAXIMA_LLAVE} caracteres."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        dispositivo = (request.headers.get('X-Device-Id', '').strip() or f"usuario:{request.user.pk}")[:64]
+        huella = _huella_solicitud(request)
+
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    registro = SolicitudIdempotente.objects.create(
+                        dispositivo=dispositivo,
+                        llave=llave,
+                        usuario=request.user if request.user.is_authenticated else None,
+                        ruta=request.path[:200],
+                        huella_solicitud=huella
+                    )
+            except IntegrityError:
+                # Ya se procesó (o el original acaba de terminar): respuesta guardada
+                existente = SolicitudIdempotente.objects.get(dispositivo=dispositivo, llave=llave)
+                return _respuesta_guardada(existente, huella)
+
+            response = metodo(self, request, *args, **kwargs)
+
+            if status.is_success(response.status_code):
+                registro.codigo_respuesta = response.status_code
+                registro.respuesta = json.loads(json.dumps(response.data, cls=JSONEncoder))
+                registro.save(update_fields=['codigo_respuesta', 'respuesta'])
+            else:
+                # No se guarda nada: el cliente puede reintentar con la misma llave
+                transaction.set_rollback(True)
+
+        return response
+
+    return wrapper
+
+
+def purgar_solicitudes_idempotentes():
+    """Elimina las respuestas guardadas más viejas que IDEMPOTENCIA_RETENCION_HORAS."""
+    horas = getattr(settings, 'IDEMPOTENCIA_RETENCION_HORAS', 72)
+    limite = timezone.now() - timedelta(hours=horas)
+    eliminadas, _ = SolicitudIdempotente.objects.filter(fecha_creacion__lt=limite).delete()
+    return eliminadas
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from capturador_inventario_api.models import Captura
+from capturador_inventario_api.totales_captura import recalcular_totales
+
+
+class Command(BaseCommand):
+    help = "Reconstruye los totales acumulados de las capturas a partir de sus detalles y tickets."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--folio', action='append', help="Solo las capturas con este folio (se puede repetir).")
+
+    def handle(self, *args, **options):
+        capturas = Captura.objects.all()
+        if options['folio']:
+            capturas = capturas.filter(folio__in=options['folio'])
+
+        actualizadas = recalcular_totales(capturas)
+        self.stdout.write(self.style.SUCCESS(f"Totales recalculados en {actualizadas} capturas."))
@@ -0,0 +1,17 @@
+import json
+
+from django.core.management.base import BaseCommand
+from rest_framework.utils.encoders import JSONEncoder
+
+from capturador_inventario_api.microsip_api.microsip_api_sync_Articulos import InventariosService
+
+
+class Command(BaseCommand):
+    help = "Muestra qué cambiaría la sincronización con Microsip sin escribir nada (dry-run)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--muestra', type=int, default=20, help="Filas de ejemplo por tipo de cambio (0 = solo conteos).")
+
+    def handle(self, *args, **options):
+        resumen = InventariosService().sincronizar_articulos(simular=True, muestra=options['muestra'])
+        self.stdout.write(json.dumps(resumen, cls=JSONEncoder, indent=2, ensure_ascii=False))
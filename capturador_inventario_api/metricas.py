@@ -0,0 +1,166 @@
+"""
+Instrumentación de peticiones (settings.METRICAS).
+
+MetricasMiddleware mide cada petición: duración total, consultas SQL ejecutadas y su
+tiempo (con connection.execute_wrapper, no requiere DEBUG) y tamaño de la respuesta.
+Las muestras se agrupan por método + ruta de urls.py (no por URL concreta, para que
+/captura/15/ y /captura/16/ cuenten juntas) y se guardan en un buffer circular en
+memoria del proceso: no tocan la base de datos y se pierden al reiniciar.
+
+El resumen (percentiles) se calcula al consultarlo en MetricasView.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+from capturador_inventario_api.registro_eventos import obtener_logger
+
+log = obtener_logger('metricas')
+SIN_RUTA = '(sin ruta)'
+
+_lock = threading.Lock()
+_registros = {}
+_inicio = timezone.now()
+
+
+class _Registro:
+    __slots__ = ('muestras', 'peticiones', 'errores')
+
+    def __init__(self, tamano):
+        # (duracion_ms, consultas, tiempo_bd_ms, bytes)
+        self.muestras = deque(maxlen=tamano)
+        self.peticiones = 0
+        self.errores = 0
+
+
+class _ContadorConsultas:
+    """execute_wrapper: cuenta y cronometra las consultas de la petición en curso."""
+
+    def __init__(self):
+        self.consultas = 0
+        self.segundos = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas += 1
+            self.segundos += time.perf_counter() - inicio
+
+
+def _ruta(request):
+    match = getattr(request, 'resolver_match', None)
+    return f"{request.method} /{match.route}" if match else f"{request.method} {SIN_RUTA}"
+
+
+def _tamano_respuesta(response):
+    if getattr(response, 'streaming', False):
+        longitud = response.get('Content-Length')
+        return int(longitud) if longitud else None
+    return len(response.content)
+
+
+def registrar(ruta, duracion_ms, consultas, tiempo_bd_ms, tamano, error):
+    with _lock:
+        registro = _registros.get(ruta)
+        if registro is None:
+            registro = _registros[ruta] = _Registro(settings.METRICAS['MUESTRAS_POR_RUTA'])
+        registro.muestras.append((duracion_ms, consultas, tiempo_bd_ms, tamano))
+        registro.peticiones += 1
+        if error:
+            registro.errores += 1
+
+
+def reiniciar():
+    global _inicio
+    with _lock:
+        _registros.clear()
+        _inicio = timezone.now()
+
+
+def _percentil(ordenados, p):
+    # Rango más cercano: suficiente para unas cientos de muestras
+    if not ordenados:
+        return None
+    indice = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+def resumen():
+    """Una fila por ruta con los percentiles de las muestras que siguen en el buffer."""
+    with _lock:
+        copia = [
+            (ruta, list(registro.muestras), registro.peticiones, registro.errores)
+            for ruta, registro in _registros.items()
+        ]
+        desde = _inicio
+
+    filas = []
+    for ruta, muestras, peticiones, errores in copia:
+        duraciones = sorted(m[0] for m in muestras)
+        consultas = sorted(m[1] for m in muestras)
+        tiempos_bd = sorted(m[2] for m in muestras)
+        tamanos = [m[3] for m in muestras if m[3] is not None]
+        filas.append({
+            "ruta": ruta,
+            "peticiones": peticiones,
+            "errores": errores,
+            "muestras": len(muestras),
+            "latencia_ms": {
+                "p50": _percentil(duraciones, 50),
+                "p95": _percentil(duraciones, 95),
+                "p99": _percentil(duraciones, 99),
+                "max": duraciones[-1] if duraciones else None
+            },
+            "consultas": {
+                "promedio": round(sum(consultas) / len(consultas), 1) if consultas else None,
+                "p95": _percentil(consultas, 95),
+                "max": consultas[-1] if consultas else None
+            },
+            "tiempo_bd_ms": {
+                "p50": _percentil(tiempos_bd, 50),
+                "p95": _percentil(tiempos_bd, 95)
+            },
+            "bytes": {
+                "promedio": round(sum(tamanos) / len(tamanos)) if tamanos else None,
+                "max": max(tamanos) if tamanos else None
+            }
+        })
+    return desde, filas
+
+
+class MetricasMiddleware:
+    """Con METRICAS['HABILITADO'] = False Django lo descarta al arrancar (sin costo por petición)."""
+
+    def __init__(self, get_response):
+        if not settings.METRICAS['HABILITADO']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        contador = _ContadorConsultas()
+        inicio = time.perf_counter()
+        with ExitStack() as stack:
+            for conexion in connections.all():
+                stack.enter_context(conexion.execute_wrapper(contador))
+            response = self.get_response(request)
+        duracion_ms = round((time.perf_counter() - inicio) * 1000, 2)
+
+        try:
+            registrar(
+                _ruta(request), duracion_ms, contador.consultas,
+                round(contador.segundos * 1000, 2), _tamano_respuesta(response),
+                response.status_code >= 500
+            )
+        except Exception as e:
+            # La instrumentación nunca debe tumbar la petición
+            log.warning("No se pudo registrar la métrica de %s: %s", request.path, e)
+
+        return response
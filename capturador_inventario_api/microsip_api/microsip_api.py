@@ -1,124 +1,169 @@
-from ctypes import c_int, c_char_p, c_double, windll, create_string_buffer, POINTER, c_char
+from ctypes import c_int, c_char_p, c_double, create_string_buffer, POINTER, c_char
+from functools import lru_cache
+
+from django.conf import settings
+
+from capturador_inventario_api.registro_eventos import obtener_logger
+
+log = obtener_logger('dll')
 
 # --- CONFIGURACIÓN DE LA DLL (ApiMicrosip.dll) ---
-# Se asume que la DLL está accesible en el PATH o en la carpeta del script/ejecutable.
-try:
-    # Reemplaza esta línea con la ruta ABSOLUTA y COMPLETA a tu ApiMicrosip.dll
-    DLL_PATH = r"C:\Users\Vergara\Documents\GitHub\capturador_inventario_proyecto\env\capturador_inventario_api\Scripts\ApiMicrosip.dll" 
-
-    microsip_dll = windll.LoadLibrary(DLL_PATH)
-except OSError as e:
-    print(f"Error al cargar la DLL: {e}. Asegúrate de que estás usando Python 32-bit (x86) y que la DLL está accesible.")
-    raise
-
-# --- API BÁSICA (Para manejo de errores) ---
-
-# inSetErrorHandling(ExceptionOnError, MessageOnException: Integer); stdcall;
-# La función de Inventarios es inSetErrorHandling (de la API Inventarios, no la básica SetErrorHandling)
-microsip_dll.inSetErrorHandling.argtypes = [c_int, c_int]
-microsip_dll.inSetErrorHandling.restype = c_int
-
-# inGetLastErrorMessage (ErrorMessage: PChar): Integer; stdcall;
-# Nota: La Api Inventarios usa inGetLastErrorMessage
-# Esta función rellena un buffer (PChar), por lo que debemos aceptar un
-# puntero a char (POINTER(c_char)) en lugar de c_char_p para poder pasar
-# `create_string_buffer(...)` sin errores de conversión.
-microsip_dll.inGetLastErrorMessage.argtypes = [POINTER(c_char)]
-microsip_dll.inGetLastErrorMessage.restype = c_int
-
-# GetLastErrorCode: Integer; stdcall; (API Básica)
-microsip_dll.GetLastErrorCode.restype = c_int
-
-# DBDisconnect(DBHandle: Integer): Integer; stdcall;
-microsip_dll.DBDisconnect.argtypes = [c_int]
-microsip_dll.DBDisconnect.restype = c_int
-
-# DBConnect(DBHandle: Integer; DatabaseName, UserName, Password: PChar): Integer; stdcall;
-microsip_dll.DBConnect.argtypes = [c_int, c_char_p, c_char_p, c_char_p]
-microsip_dll.DBConnect.restype = c_int
-
-# NewDB: Integer; stdcall; (Se asume que NewDB y NewTrn están en la DLL si los usa DBConnect)
-microsip_dll.NewDB.restype = c_int
-microsip_dll.NewTrn.argtypes = [c_int, c_int]
-microsip_dll.NewTrn.restype = c_int
-
-# SetDBInventarios (DBHandle: Integer): Integer; stdcall;
-microsip_dll.SetDBInventarios.argtypes = [c_int]
-microsip_dll.SetDBInventarios.restype = c_int
-
-# SqlQry (SqlHandle: Integer; Query: PChar): Integer; stdcall;
-microsip_dll.SqlQry.argtypes = [c_int, c_char_p]
-microsip_dll.SqlQry.restype = c_int
-
-# SqlExecQuery (SqlHandle: Integer): Integer; stdcall;
-microsip_dll.SqlExecQuery.argtypes = [c_int]
-microsip_dll.SqlExecQuery.restype = c_int
-
-# SqlNext (SqlHandle: Integer): Integer; stdcall;
-microsip_dll.SqlNext.argtypes = [c_int]
-microsip_dll.SqlNext.restype = c_int
-
-# **NUEVA DECLARACIÓN DE SQLEOF** (API Básica)
-# SqlEof (SqlHandle: Integer): Integer; stdcall;
-microsip_dll.SqlEof.argtypes = [c_int]
-microsip_dll.SqlEof.restype = c_int
-
-# SqlGetFieldAsInteger (SqlHandle: Integer; FieldName: PChar; Var FieldValue: Integer): Integer; stdcall;
-# El tercer parámetro es una salida por referencia (var / pointer to Integer).
-# Debe declararse como POINTER(c_int) para que `byref(c_int())` sea aceptado
-# sin que ctypes intente convertir el CArgObject a un entero.
-microsip_dll.SqlGetFieldAsInteger.argtypes = [c_int, c_char_p, POINTER(c_int)]
-microsip_dll.SqlGetFieldAsInteger.restype = c_int
-
-# NewSql (TrnHandle: Integer): Integer; stdcall;
-microsip_dll.NewSql.argtypes = [c_int]
-microsip_dll.NewSql.restype = c_int
-
-# SqlClose (SqlHandle: Integer): Integer; stdcall;
-microsip_dll.SqlClose.argtypes = [c_int]
-microsip_dll.SqlClose.restype = c_int
-
-# SqlSetParamAsString (SqlHandle: Integer; ParamName, ParamValue: PChar): Integer; stdcall;
-microsip_dll.SqlSetParamAsString.argtypes = [c_int, c_char_p, c_char_p]
-microsip_dll.SqlSetParamAsString.restype = c_int
-
-# SqlGetFieldAsString (SqlHandle: Integer; FieldName: PChar; Buffer: PChar): Integer; stdcall;
-# Declaramos esta función para poder pasar `create_string_buffer(...)` como salida.
-microsip_dll.SqlGetFieldAsString.argtypes = [c_int, c_char_p, POINTER(c_char)]
-microsip_dll.SqlGetFieldAsString.restype = c_int
-
-# --- API INVENTARIOS (Funciones de Entrada) ---
-
-# NuevaEntrada(ConceptoInId, AlmacenId, Fecha, Folio, Descripcion, CentroCostold)
-microsip_dll.NuevaEntrada.argtypes = [
-    c_int, c_int, c_char_p, c_char_p, c_char_p, c_int
-]
-microsip_dll.NuevaEntrada.restype = c_int
-
-# RenglonEntrada(Articulold, Unidades, CostoUnitario, CostoTotal)
-microsip_dll.RenglonEntrada.argtypes = [
-    c_int, c_double, c_double, c_double
-]
-microsip_dll.RenglonEntrada.restype = c_int
-
-# RenglonEntradaLotes (ClaveLote, FechaCaducidad: PChar; Unidades: Double): Integer; stdcall;
-microsip_dll.RenglonEntradaLotes.argtypes = [
-    c_char_p, c_char_p, c_double
-]
-microsip_dll.RenglonEntradaLotes.restype = c_int
-
-# RenglonEntradaSeries (ClaveSerie: PChar; NumConsecutivos: Integer): Integer; stdcall;
-microsip_dll.RenglonEntradaSeries.argtypes = [
-    c_char_p, c_int
-]
-microsip_dll.RenglonEntradaSeries.restype = c_int
-
-# AplicaEntrada: Integer; stdcall;
-microsip_dll.AplicaEntrada.restype = c_int
-
-# AbortaDoctoInventarios: stdcall;
-microsip_dll.AbortaDoctoInventarios.restype = None
-
-# SetDBInventarios(DBHandle: Integer): Integer; stdcall;
-microsip_dll.SetDBInventarios.argtypes = [c_int]
-microsip_dll.SetDBInventarios.restype = c_int
\ No newline at end of file
+# La DLL se carga de forma diferida (primer uso), no al importar este módulo:
+# los procesos que no la usan (web, Linux, pruebas) no pagan la carga ni fallan.
+# La ruta se puede cambiar con MICROSIP_CONFIG['DLL_PATH'].
+DLL_PATH = r"C:\Users\Vergara\Documents\GitHub\capturador_inventario_proyecto\env\capturador_inventario_api\Scripts\ApiMicrosip.dll"
+
+
+@lru_cache(maxsize=1)
+def cargar_dll():
+    """Carga ApiMicrosip.dll una sola vez por proceso y declara sus firmas."""
+    from ctypes import windll  # Solo existe en Windows
+
+    ruta = getattr(settings, 'MICROSIP_CONFIG', {}).get('DLL_PATH', DLL_PATH)
+    try:
+        dll = windll.LoadLibrary(ruta)
+    except OSError as e:
+        log.error("Error al cargar la DLL (%s): %s. Asegúrate de que estás usando Python 32-bit (x86) y que la DLL está accesible.", ruta, e)
+        raise
+
+    _declarar_firmas(dll)
+    return dll
+
+
+def __getattr__(nombre):
+    # Compatibilidad: `from .microsip_api import microsip_dll` sigue funcionando (carga diferida)
+    if nombre == 'microsip_dll':
+        return cargar_dll()
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
+
+def _declarar_firmas(dll):
+    # --- API BÁSICA (Para manejo de errores) ---
+
+    # inSetErrorHandling(ExceptionOnError, MessageOnException: Integer); stdcall;
+    # La función de Inventarios es inSetErrorHandling (de la API Inventarios, no la básica SetErrorHandling)
+    dll.inSetErrorHandling.argtypes = [c_int, c_int]
+    dll.inSetErrorHandling.restype = c_int
+
+    # inGetLastErrorMessage (ErrorMessage: PChar): Integer; stdcall;
+    # Nota: La Api Inventarios usa inGetLastErrorMessage
+    # Esta función rellena un buffer (PChar), por lo que debemos aceptar un
+    # puntero a char (POINTER(c_char)) en lugar de c_char_p para poder pasar
+    # `create_string_buffer(...)` sin errores de conversión.
+    dll.inGetLastErrorMessage.argtypes = [POINTER(c_char)]
+    dll.inGetLastErrorMessage.restype = c_int
+
+    # GetLastErrorCode: Integer; stdcall; (API Básica)
+    dll.GetLastErrorCode.restype = c_int
+
+    # DBDisconnect(DBHandle: Integer): Integer; stdcall;
+    dll.DBDisconnect.argtypes = [c_int]
+    dll.DBDisconnect.restype = c_int
+
+    # DBConnect(DBHandle: Integer; DatabaseName, UserName, Password: PChar): Integer; stdcall;
+    dll.DBConnect.argtypes = [c_int, c_char_p, c_char_p, c_char_p]
+    dll.DBConnect.restype = c_int
+
+    # NewDB: Integer; stdcall; (Se asume que NewDB y NewTrn están en la DLL si los usa DBConnect)
+    dll.NewDB.restype = c_int
+    dll.NewTrn.argtypes = [c_int, c_int]
+    dll.NewTrn.restype = c_int
+
+    # SetDBInventarios (DBHandle: Integer): Integer; stdcall;
+    dll.SetDBInventarios.argtypes = [c_int]
+    dll.SetDBInventarios.restype = c_int
+
+    # SqlQry (SqlHandle: Integer; Query: PChar): Integer; stdcall;
+    dll.SqlQry.argtypes = [c_int, c_char_p]
+    dll.SqlQry.restype = c_int
+
+    # SqlExecQuery (SqlHandle: Integer): Integer; stdcall;
+    dll.SqlExecQuery.argtypes = [c_int]
+    dll.SqlExecQuery.restype = c_int
+
+    # SqlNext (SqlHandle: Integer): Integer; stdcall;
+    dll.SqlNext.argtypes = [c_int]
+    dll.SqlNext.restype = c_int
+
+    # **NUEVA DECLARACIÓN DE SQLEOF** (API Básica)
+    # SqlEof (SqlHandle: Integer): Integer; stdcall;
+    dll.SqlEof.argtypes = [c_int]
+    dll.SqlEof.restype = c_int
+
+    # SqlGetFieldAsInteger (SqlHandle: Integer; FieldName: PChar; Var FieldValue: Integer): Integer; stdcall;
+    # El tercer parámetro es una salida por referencia (var / pointer to Integer).
+    # Debe declararse como POINTER(c_int) para que `byref(c_int())` sea aceptado
+    # sin que ctypes intente convertir el CArgObject a un entero.
+    dll.SqlGetFieldAsInteger.argtypes = [c_int, c_char_p, POINTER(c_int)]
+    dll.SqlGetFieldAsInteger.restype = c_int
+
+    # NewSql (TrnHandle: Integer): Integer; stdcall;
+    dll.NewSql.argtypes = [c_int]
+    dll.NewSql.restype = c_int
+
+    # SqlClose (SqlHandle: Integer): Integer; stdcall;
+    dll.SqlClose.argtypes = [c_int]
+    dll.SqlClose.restype = c_int
+
+    # SqlSetParamAsString (SqlHandle: Integer; ParamName, ParamValue: PChar): Integer; stdcall;
+    dll.SqlSetParamAsString.argtypes = [c_int, c_char_p, c_char_p]
+    dll.SqlSetParamAsString.restype = c_int
+
+    # SqlGetFieldAsString (SqlHandle: Integer; FieldName: PChar; Buffer: PChar): Integer; stdcall;
+    # Declaramos esta función para poder pasar `create_string_buffer(...)` como salida.
+    dll.SqlGetFieldAsString.argtypes = [c_int, c_char_p, POINTER(c_char)]
+    dll.SqlGetFieldAsString.restype = c_int
+
+    # --- API INVENTARIOS (Funciones de Entrada) ---
+
+    # NuevaEntrada(ConceptoInId, AlmacenId, Fecha, Folio, Descripcion, CentroCostold)
+    dll.NuevaEntrada.argtypes = [
+        c_int, c_int, c_char_p, c_char_p, c_char_p, c_int
+    ]
+    dll.NuevaEntrada.restype = c_int
+
+    # RenglonEntrada(Articulold, Unidades, CostoUnitario, CostoTotal)
+    dll.RenglonEntrada.argtypes = [
+        c_int, c_double, c_double, c_double
+    ]
+    dll.RenglonEntrada.restype = c_int
+
+    # RenglonEntradaLotes (ClaveLote, FechaCaducidad: PChar; Unidades: Double): Integer; stdcall;
+    dll.RenglonEntradaLotes.argtypes = [
+        c_char_p, c_char_p, c_double
+    ]
+    dll.RenglonEntradaLotes.restype = c_int
+
+    # RenglonEntradaSeries (ClaveSerie: PChar; NumConsecutivos: Integer): Integer; stdcall;
+    dll.RenglonEntradaSeries.argtypes = [
+        c_char_p, c_int
+    ]
+    dll.RenglonEntradaSeries.restype = c_int
+
+    # AplicaEntrada: Integer; stdcall;
+    dll.AplicaEntrada.restype = c_int
+
+    # --- API INVENTARIOS (Funciones de Salida) ---
+
+    # NuevaSalida(ConceptoInId, AlmacenId, AlmacenDestinoId, Fecha, Folio, Descripcion, CentroCostoId)
+    # AlmacenDestinoId solo aplica para traspasos (0 en salidas normales)
+    dll.NuevaSalida.argtypes = [
+        c_int, c_int, c_int, c_char_p, c_char_p, c_char_p, c_int
+    ]
+    dll.NuevaSalida.restype = c_int
+
+    # RenglonSalida(ArticuloId, Unidades, CostoUnitario, CostoTotal)
+    dll.RenglonSalida.argtypes = [
+        c_int, c_double, c_double, c_double
+    ]
+    dll.RenglonSalida.restype = c_int
+
+    # AplicaSalida: Integer; stdcall;
+    dll.AplicaSalida.restype = c_int
+
+    # AbortaDoctoInventarios: stdcall;
+    dll.AbortaDoctoInventarios.restype = None
+
+    # SetDBInventarios(DBHandle: Integer): Integer; stdcall;
+    dll.SetDBInventarios.argtypes = [c_int]
+    dll.SetDBInventarios.restype = c_int
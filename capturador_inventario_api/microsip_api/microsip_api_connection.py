@@ -1,10 +1,17 @@
-from ctypes import c_int, c_char_p, c_double, byref, create_string_buffer, windll, POINTER, c_char
+import atexit
+import logging
+import threading
+import time
+from ctypes import c_int, c_char_p, c_double, byref, create_string_buffer, POINTER, c_char
 from django.conf import settings 
 from django.core.exceptions import ImproperlyConfigured
-from capturador_inventario_api.microsip_api.microsip_api import microsip_dll
+from capturador_inventario_api.microsip_api.microsip_api_transporte import obtener_transporte
+from capturador_inventario_api.registro_eventos import evento, obtener_logger
 from functools import wraps
 from datetime import datetime # Se usa para el log de errores
 
+log = obtener_logger('dll')
+
 # --- EXCEPCIONES PERSONALIZADAS ---
 class MicrosipAPIError(Exception):
     """Excepción base para errores específicos de la API de Microsip."""
@@ -15,48 +22,189 @@ class MicrosipAPIError(Exception):
         self.basic_error_code = basic_error_code
         self.details = f"Código API: {api_error_code}. Función: {api_function or 'N/A'}. Código Básico: {basic_error_code or 'N/A'}."
 
+
+def leer_error_api(dll, bookmark="", function_name=""):
+    """Recupera el mensaje de error de la API y lanza MicrosipAPIError si lo hay."""
+    error_buffer = create_string_buffer(256)
+    error_code = dll.inGetLastErrorMessage(error_buffer)
+    basic_error_code = dll.GetLastErrorCode()
+    error_message = error_buffer.value.decode('latin-1', errors='ignore').strip()
+
+    if error_code != 0:
+        full_message = f"Error en {function_name} ({bookmark}). Código: {error_code}. Mensaje: {error_message}"
+        raise MicrosipAPIError(
+            full_message, 
+            api_error_code=error_code,
+            api_function=function_name,
+            basic_error_code=basic_error_code
+        )
+    return None
+
+# --- SESIÓN PERSISTENTE ---
+
+class SesionMicrosip:
+    """
+    Conexión de larga vida con la DLL (db_handle / trn_handle).
+
+    DBConnect contra el servidor Firebird remoto es costoso, así que la sesión se
+    abre una vez y la comparten todas las operaciones de escritura del proceso
+    (el worker de Django-Q es único). Antes de usarla se verifica con una consulta
+    mínima si pasó más de SESION_VERIFICAR_CADA_SEGUNDOS; si falla, se reconecta.
+    El `lock` serializa el uso porque la DLL no es thread-safe.
+    """
+    def __init__(self, transporte, config):
+        self.dll = transporte
+        self.db_file = config['DB_FILE'].encode('latin-1')
+        self.user = config['USER'].encode('latin-1')
+        self.password = config['PASSWORD'].encode('latin-1')
+        self.verificar_cada = config.get('SESION_VERIFICAR_CADA_SEGUNDOS', 60)
+
+        self.lock = threading.RLock()
+        self.db_handle = None
+        self.trn_handle = None
+        self.conectada = False
+        self._ultima_verificacion = 0.0
+
+    def abrir(self):
+        """Establece la conexión a la BD Microsip e inicia la transacción."""
+        if self.db_handle is None:
+            # Handles internos de conexión
+            self.db_handle = self.dll.NewDB()
+            # Transacción Snapshot (Read-Only) para evitar bloqueos en lecturas masivas
+            self.trn_handle = self.dll.NewTrn(self.db_handle, 0)
+
+        self.dll.inSetErrorHandling(0, 0)
+
+        # 1. Conexión a la BD
+        result = self.dll.DBConnect(self.db_handle, self.db_file, self.user, self.password)
+        if result != 0:
+            error_code_basica = self.dll.GetLastErrorCode()
+            msg = f"Fallo de conexión a la BD Firebird. Código DBConnect: {result}. Error API Básica: {error_code_basica}"
+            evento(
+                log, 'dll.conexion_fallida', msg, logging.ERROR,
+                ruta=self.db_file.decode('latin-1'), codigo=result, codigo_basico=error_code_basica
+            )
+            raise MicrosipAPIError(msg, api_error_code=result, api_function="DBConnect", basic_error_code=error_code_basica)
+
+        # 2. Establecer el handle de la BD para la API de Inventarios
+        try:
+            result = self.dll.SetDBInventarios(self.db_handle)
+            if result != 0:
+                leer_error_api(self.dll, function_name="SetDBInventarios")
+        except Exception:
+            self.dll.DBDisconnect(-1)
+            raise
+
+        self.conectada = True
+        self._ultima_verificacion = time.monotonic()
+        evento(log, 'dll.sesion_abierta', "Sesión con Microsip API establecida", db_handle=self.db_handle, trn_handle=self.trn_handle)
+
+    def cerrar(self):
+        """Llama a DBDisconnect(-1)."""
+        if not self.conectada:
+            return
+        self.conectada = False
+        result = self.dll.DBDisconnect(-1)
+        if result == 0:
+            evento(log, 'dll.sesion_cerrada', "Desconexión de Microsip API exitosa", db_handle=self.db_handle)
+        else:
+            error_buffer = create_string_buffer(256)
+            self.dll.inGetLastErrorMessage(error_buffer)
+            error_message = error_buffer.value.decode('latin-1', errors='ignore')
+            evento(log, 'dll.sesion_cerrada', f"Fallo al desconectar la API: {error_message}", logging.WARNING, db_handle=self.db_handle)
+
+    def verificar(self):
+        """Health-check: ejecuta SELECT 1 FROM RDB$DATABASE sobre la transacción de la sesión."""
+        try:
+            sql_handle = self.dll.NewSql(self.trn_handle)
+            try:
+                self.dll.SqlQry(sql_handle, b"SELECT 1 FROM RDB$DATABASE")
+                return self.dll.SqlExecQuery(sql_handle) == 0
+            finally:
+                self.dll.SqlClose(sql_handle)
+        except Exception as e:
+            evento(log, 'dll.verificacion', f"Falló la verificación de la sesión Microsip: {e}", logging.WARNING, db_handle=self.db_handle)
+            return False
+
+    def invalidar(self):
+        """Descarta la conexión actual; se reabrirá en el siguiente uso."""
+        try:
+            self.cerrar()
+        except Exception as e:
+            log.warning("Fallo al cerrar la sesión inválida: %s", e)
+        self.conectada = False
+
+    def asegurar(self):
+        """Deja la sesión lista para usarse: la abre o, si toca, la verifica y reconecta."""
+        if self.conectada and time.monotonic() - self._ultima_verificacion >= self.verificar_cada:
+            if self.verificar():
+                self._ultima_verificacion = time.monotonic()
+            else:
+                evento(log, 'dll.reconexion', "Sesión con Microsip inválida, reconectando", logging.WARNING, db_handle=self.db_handle)
+                self.invalidar()
+
+        if not self.conectada:
+            self.abrir()
+
+
+_sesion_compartida = None
+_lock_sesion_compartida = threading.Lock()
+
+
+def obtener_sesion():
+    """Retorna la sesión Microsip del proceso (se crea al primer uso)."""
+    global _sesion_compartida
+    with _lock_sesion_compartida:
+        if _sesion_compartida is None:
+            try:
+                config = settings.MICROSIP_CONFIG
+            except AttributeError:
+                raise ImproperlyConfigured("La configuración MICROSIP_CONFIG no está definida en settings.py.")
+            _sesion_compartida = SesionMicrosip(obtener_transporte(), config)
+            atexit.register(_sesion_compartida.cerrar)
+    return _sesion_compartida
+
+
 # --- DECORADOR DE CONEXIÓN ---
 
 def microsip_connect(func):
     """
-    Decorador que gestiona automáticamente el ciclo de vida de la conexión y 
-    desconexión de la API de Microsip para cualquier método de la clase de servicio.
+    Decorador que asegura la sesión persistente de la API de Microsip antes de
+    ejecutar el método y serializa su uso. Ya no desconecta al terminar: la sesión
+    se reutiliza en la siguiente llamada.
     """
     @wraps(func)
     def wrapper(self, *args, **kwargs):
-        # 1. Conectar (Si no está conectado)
-        if not self.microsip_connected:
+        with self.sesion.lock:
+            # 1. Abrir o verificar la sesión
             self.conectar()
-            
-        try:
-            # 2. Ejecutar la función decorada
-            result = func(self, *args, **kwargs)
-            return result
-        
-        except MicrosipAPIError as e:
-            # Si hay un error al registrar un documento, siempre se aborta la transacción
+                
             try:
-                if self.is_connected:
-                    microsip_dll.AbortaDoctoInventarios()
-                    print(f"DEBUG: Transacción de Microsip abortada después del error: {e}")
-            except Exception as abort_e:
-                print(f"ADVERTENCIA: Fallo al intentar abortar la transacción: {abort_e}")
+                # 2. Ejecutar la función decorada
+                result = func(self, *args, **kwargs)
+                return result
             
-            raise e
-            
-        finally:
-            # 3. Desconectar
-            if self.microsip_connected:
-                self.desconectar()
+            except MicrosipAPIError as e:
+                # Si hay un error al registrar un documento, siempre se aborta la transacción
+                try:
+                    if self.is_connected:
+                        self.dll.AbortaDoctoInventarios()
+                        evento(
+                            log, 'dll.documento_abortado', f"Transacción de Microsip abortada después del error: {e}",
+                            logging.WARNING, funcion=e.api_function, codigo=e.api_error_code
+                        )
+                except Exception as abort_e:
+                    log.warning("Fallo al intentar abortar la transacción: %s", abort_e)
+                
+                raise e
 
-    return wrapper
+            except Exception:
+                # Error inesperado (ej. OSError de la DLL): reconectar en el siguiente uso
+                self.sesion.invalidar()
+                raise
 
+    return wrapper
 
-# NOTA: Debemos declarar la función GetLastErrorCode de la API Básica aquí
-try:
-    microsip_dll.GetLastErrorCode.restype = c_int
-except AttributeError:
-    pass
 
 # Mapeo de valores de SEGUIMIENTO (Microsip Integer) a Django Char
 SEGUIMIENTO_MAP_IN = {
@@ -73,99 +221,73 @@ class MicrosipConnectionBase:
     NOTA: Las funciones de LECTURA masiva han sido eliminadas de aquí porque
     ahora se realizan vía SQL Directo (FDB) en los servicios de Sync.
     Esta clase se conserva para Gestión de Conexión y Escritura (Transactions).
+
+    La conexión vive en una SesionMicrosip compartida por todo el proceso. Se puede
+    inyectar otro transporte (ej. MicrosipDLLSimulada) con el parámetro `dll`; en ese
+    caso la instancia usa una sesión propia. La sesión (y la DLL) se obtienen hasta
+    el primer uso, así que crear el servicio para solo leer no carga la DLL.
     """
-    def __init__(self):
+    def __init__(self, dll=None):
         try:
-            config = settings.MICROSIP_CONFIG
+            self._config = settings.MICROSIP_CONFIG
         except AttributeError:
              raise ImproperlyConfigured("La configuración MICROSIP_CONFIG no está definida en settings.py.")
 
-        # Handles internos de conexión
-        self.db_handle = microsip_dll.NewDB()
-        
-        # Transacción Snapshot (Read-Only) para evitar bloqueos en lecturas masivas
-        self.trn_handle = microsip_dll.NewTrn(self.db_handle, 0) 
-        
-        self.db_file = config['DB_FILE'].encode('latin-1')
-        self.user = config['USER'].encode('latin-1')
-        self.password = config['PASSWORD'].encode('latin-1')
-        
-        self.is_connected = False
-        self.microsip_connected = False
+        self._dll_inyectada = dll
+        self._sesion = None
+
+    @property
+    def sesion(self):
+        if self._sesion is None:
+            if self._dll_inyectada is not None:
+                self._sesion = SesionMicrosip(self._dll_inyectada, self._config)
+            else:
+                self._sesion = obtener_sesion()
+        return self._sesion
+
+    @property
+    def dll(self):
+        return self.sesion.dll
+
+    @property
+    def db_handle(self):
+        return self.sesion.db_handle
+
+    @property
+    def trn_handle(self):
+        return self.sesion.trn_handle
+
+    @property
+    def is_connected(self):
+        return self.sesion.conectada
+
+    @property
+    def microsip_connected(self):
+        return self.sesion.conectada
 
     def _get_api_error_message(self, bookmark="", function_name=""):
         """Recupera el mensaje de error de la API y lanza una excepción limpia."""
-        error_buffer = create_string_buffer(256)
-        error_code = microsip_dll.inGetLastErrorMessage(error_buffer)
-        basic_error_code = microsip_dll.GetLastErrorCode()
-        error_message = error_buffer.value.decode('latin-1', errors='ignore').strip()
-
-        if error_code != 0:
-            full_message = f"Error en {function_name} ({bookmark}). Código: {error_code}. Mensaje: {error_message}"
-            raise MicrosipAPIError(
-                full_message, 
-                api_error_code=error_code,
-                api_function=function_name,
-                basic_error_code=basic_error_code
-            )
-        return None
+        return leer_error_api(self.dll, bookmark=bookmark, function_name=function_name)
 
     def conectar(self):
-        """Establece la conexión a la BD Microsip e inicia la transacción."""
-        try:
-            microsip_dll.inSetErrorHandling(0, 0)
-            
-            # 1. Conexión a la BD
-            result = microsip_dll.DBConnect(self.db_handle, self.db_file, self.user, self.password)
-            
-            if result != 0:
-                error_code_basica = microsip_dll.GetLastErrorCode()
-                msg = f"Fallo de conexión a la BD Firebird. Código DBConnect: {result}. Error API Básica: {error_code_basica}"
-                print(f"\n--- DEBUG DE CONEXIÓN FALLIDA ---\nDEBUG: Ruta usada: {self.db_file.decode('latin-1')}\n-----------------------------------\n")
-                raise MicrosipAPIError(msg, api_error_code=result, api_function="DBConnect", basic_error_code=error_code_basica)
-
-            self.is_connected = True
-            
-            # 2. Establecer el handle de la BD para la API de Inventarios
-            result = microsip_dll.SetDBInventarios(self.db_handle)
-            if result != 0:
-                self._get_api_error_message(function_name="SetDBInventarios")
-            
-            self.microsip_connected = True
-            print(f"DEBUG: Conexión con Microsip API establecida ({self.db_handle}).")
-
-        except Exception:
-            if self.is_connected:
-                microsip_dll.DBDisconnect(-1)
-            self.is_connected = False
-            self.microsip_connected = False
-            raise 
+        """Abre la sesión persistente (o la verifica si ya estaba abierta)."""
+        self.sesion.asegurar()
 
     def desconectar(self):
-        """Llama a DBDisconnect(-1)."""
-        if self.is_connected:
-            result = microsip_dll.DBDisconnect(-1)
-            if result == 0:
-                self.is_connected = False
-                self.microsip_connected = False
-                print("DEBUG: Desconexión de Microsip API exitosa.")
-            else:
-                error_buffer = create_string_buffer(256)
-                microsip_dll.inGetLastErrorMessage(error_buffer)
-                error_message = error_buffer.value.decode('latin-1', errors='ignore')
-                print(f"ADVERTENCIA: Fallo al desconectar la API. Mensaje: {error_message}")
+        """Cierra la sesión persistente (la siguiente operación la reabre)."""
+        self.sesion.cerrar()
     
     def diagnostico_sql(self):
         """Prueba rápida para diagnosticar si el motor SQL acepta una consulta mínima."""
         info = {}
-        sql_handle = microsip_dll.NewSql(self.trn_handle)
+        sql_handle = self.dll.NewSql(self.trn_handle)
         try:
             q = "SELECT 1 FROM RDB$DATABASE"
             info['query'] = q
-            microsip_dll.SqlQry(sql_handle, q.encode('latin-1'))
-            info['SqlExecQuery'] = microsip_dll.SqlExecQuery(sql_handle)
+            self.dll.SqlQry(sql_handle, q.encode('latin-1'))
+            info['SqlExecQuery'] = self.dll.SqlExecQuery(sql_handle)
         finally:
-            microsip_dll.SqlClose(sql_handle)
+            self.dll.SqlClose(sql_handle)
         return info
 
     @microsip_connect
@@ -173,15 +295,21 @@ class MicrosipConnectionBase:
         """
         [FUNCIÓN DE BAJO NIVEL - CONSERVADA PARA ESCALABILIDAD]
         Implementa la lógica completa para registrar una nueva Entrada de Inventario en Microsip.
-        Esta función es vital para futuras funcionalidades de escritura (ej. enviar conteos a Microsip).
+        Abre y cierra su propia conexión; para varios documentos usar _registrar_entrada
+        dentro de un método decorado (una sola conexión por lote).
         """
+        return self._registrar_entrada(encabezado_data, renglones_data)
+
+    def _registrar_entrada(self, encabezado_data, renglones_data):
+        """Registra una Entrada usando la conexión actual (requiere estar conectado)."""
         # 1. ENCABEZADO
-        print("DEBUG: Iniciando NuevaEntrada...")
+        log.debug("Iniciando NuevaEntrada")
+        inicio = time.perf_counter()
         fecha_str = encabezado_data['Fecha'].encode('latin-1')
         folio_str = encabezado_data.get('Folio', '').encode('latin-1')
         desc_str = encabezado_data.get('Descripcion', '').encode('latin-1')
 
-        result = microsip_dll.NuevaEntrada(
+        result = self.dll.NuevaEntrada(
             c_int(encabezado_data['ConceptoInId']),
             c_int(encabezado_data['AlmacenId']),
             fecha_str,
@@ -192,13 +320,13 @@ class MicrosipConnectionBase:
         self._get_api_error_message(function_name="NuevaEntrada", bookmark="Encabezado")
 
         # 2. RENGLONES
-        print("DEBUG: Registrando renglones...")
+        log.debug("Registrando renglones de entrada")
         for i, renglon in enumerate(renglones_data):
             articulo_id_final = renglon['ArticuloId']
             seguimiento = renglon['Seguimiento']
             articulo_nombre = renglon['Nombre']
             
-            result = microsip_dll.RenglonEntrada(
+            result = self.dll.RenglonEntrada(
                 c_int(articulo_id_final),
                 c_double(renglon['Unidades']),
                 c_double(renglon.get('CostoUnitario', 0.0)),
@@ -212,7 +340,7 @@ class MicrosipConnectionBase:
                 for lote in lotes:
                     lote_clave_str = lote['ClaveLote'].encode('latin-1')
                     fecha_caducidad_str = lote['FechaCaducidad'].encode('latin-1')
-                    result = microsip_dll.RenglonEntradaLotes(
+                    result = self.dll.RenglonEntradaLotes(
                         lote_clave_str, fecha_caducidad_str, c_double(lote['Unidades'])
                     )
                     self._get_api_error_message(function_name="RenglonEntradaLotes", bookmark=f"Lote {lote['ClaveLote']}")
@@ -222,13 +350,60 @@ class MicrosipConnectionBase:
                 for serie in series:
                     serie_clave_str = serie['ClaveSerie'].encode('latin-1')
                     num_consecutivos = serie.get('NumConsecutivos', 1)
-                    result = microsip_dll.RenglonEntradaSeries(serie_clave_str, c_int(num_consecutivos))
+                    result = self.dll.RenglonEntradaSeries(serie_clave_str, c_int(num_consecutivos))
                     self._get_api_error_message(function_name="RenglonEntradaSeries", bookmark=f"Serie {serie['ClaveSerie']}")
 
         # 3. APLICACIÓN
-        print("DEBUG: Aplicando entrada...")
-        result = microsip_dll.AplicaEntrada()
+        log.debug("Aplicando entrada")
+        result = self.dll.AplicaEntrada()
         self._get_api_error_message(function_name="AplicaEntrada", bookmark="Finalización")
 
-        print("DEBUG: ¡Entrada de inventario registrada y aplicada con éxito!")
-        return True
\ No newline at end of file
+        evento(
+            log, 'dll.documento_aplicado', "Entrada de inventario registrada y aplicada", tipo='ENTRADA',
+            folio=encabezado_data.get('Folio', ''), almacen=encabezado_data['AlmacenId'], renglones=len(renglones_data),
+            duracion_ms=round((time.perf_counter() - inicio) * 1000, 1)
+        )
+        return True
+
+    def _registrar_salida(self, encabezado_data, renglones_data):
+        """
+        Registra una Salida de Inventario usando la conexión actual (requiere estar conectado).
+        Solo soporta artículos de seguimiento Normal (sin lotes ni series).
+        """
+        log.debug("Iniciando NuevaSalida")
+        inicio = time.perf_counter()
+        fecha_str = encabezado_data['Fecha'].encode('latin-1')
+        folio_str = encabezado_data.get('Folio', '').encode('latin-1')
+        desc_str = encabezado_data.get('Descripcion', '').encode('latin-1')
+
+        self.dll.NuevaSalida(
+            c_int(encabezado_data['ConceptoInId']),
+            c_int(encabezado_data['AlmacenId']),
+            c_int(encabezado_data.get('AlmacenDestinoId', 0)),
+            fecha_str,
+            folio_str,
+            desc_str,
+            c_int(encabezado_data.get('CentroCostold', 0))
+        )
+        self._get_api_error_message(function_name="NuevaSalida", bookmark="Encabezado")
+
+        log.debug("Registrando renglones de salida")
+        for renglon in renglones_data:
+            self.dll.RenglonSalida(
+                c_int(renglon['ArticuloId']),
+                c_double(renglon['Unidades']),
+                c_double(renglon.get('CostoUnitario', 0.0)),
+                c_double(renglon.get('CostoTotal', 0.0))
+            )
+            self._get_api_error_message(function_name="RenglonSalida", bookmark=f"Articulo {renglon['Nombre']}")
+
+        log.debug("Aplicando salida")
+        self.dll.AplicaSalida()
+        self._get_api_error_message(function_name="AplicaSalida", bookmark="Finalización")
+
+        evento(
+            log, 'dll.documento_aplicado', "Salida de inventario registrada y aplicada", tipo='SALIDA',
+            folio=encabezado_data.get('Folio', ''), almacen=encabezado_data['AlmacenId'], renglones=len(renglones_data),
+            duracion_ms=round((time.perf_counter() - inicio) * 1000, 1)
+        )
+        return True
@@ -0,0 +1,271 @@
+import logging
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from capturador_inventario_api.models import Captura, DetalleCaptura, DocumentoMicrosip, InventarioArticulo
+from .microsip_api_connection import MicrosipConnectionBase, microsip_connect, MicrosipAPIError
+from .microsip_api_worker import worker_dll_habilitado, ClienteDLL
+from ..registro_eventos import evento, obtener_logger
+
+log = obtener_logger('envio')
+
+
+class EnvioConteosService(MicrosipConnectionBase):
+    """
+    Envía a Microsip las diferencias de las capturas CONFIRMADAS (write-back).
+
+    1. preparar_documentos(): calcula diferencias por almacén y llena la bandeja de
+       salida (DocumentoMicrosip). Solo toca la BD de Django.
+    2. enviar_documentos_pendientes(): aplica los documentos PENDIENTES/ERROR con
+       UNA sola conexión a la DLL para todo el lote.
+    """
+
+    # -------------------------------------------------------------------------
+    # 1. PREPARACIÓN (Capturas -> Bandeja de salida)
+    # -------------------------------------------------------------------------
+
+    def preparar_documentos(self):
+        """
+        Agrupa las diferencias de todas las capturas CONFIRMADAS por almacén:
+        - Sobrantes (contado > sistema) -> Entradas de ajuste.
+        - Faltantes (contado < sistema) -> Salidas de ajuste.
+        Si varias capturas del lote contaron el mismo artículo en el mismo almacén (p. ej.
+        un conteo general y uno cíclico), vale solo la más reciente (fecha_captura): sumar
+        entre capturas contaría dos veces las mismas piezas. Dentro de esa captura se
+        suman sus renglones del artículo contra su existencia de sistema.
+        Las capturas quedan en PROCESADO y sus existencias marcadas como pendientes.
+
+        No se envían (y se reportan) los artículos con lotes/series y los sobrantes sin
+        costo conocido: una Entrada con costo 0 alteraría la valuación en Microsip.
+        """
+        log.debug("Preparando documentos de ajuste para Microsip")
+        config = settings.MICROSIP_CONFIG
+        renglones_por_documento = config.get('RENGLONES_POR_DOCUMENTO', 500)
+
+        with transaction.atomic():
+            capturas = list(
+                Captura.objects.select_for_update().filter(estado='CONFIRMADO', almacen__isnull=False)
+            )
+            if not capturas:
+                return {"capturas_procesadas": 0, "documentos_creados": 0, "articulos_omitidos": [], "articulos_sin_costo": []}
+
+            capturas_por_almacen = defaultdict(list)
+            for captura in capturas:
+                capturas_por_almacen[captura.almacen_id].append(captura)
+
+            detalles = DetalleCaptura.objects.filter(captura__in=capturas, articulo__isnull=False)
+            captura_mas_reciente = detalles.filter(
+                captura__almacen_id=OuterRef('captura__almacen_id'), articulo_id=OuterRef('articulo_id')
+            ).order_by('-captura__fecha_captura', '-captura_id').values('captura_id')[:1]
+
+            filas = detalles.annotate(
+                captura_vigente=Subquery(captura_mas_reciente)
+            ).filter(captura_id=F('captura_vigente')).values(
+                'captura__almacen_id',
+                'articulo_id',
+                'articulo__articulo_id_msip',
+                'articulo__clave',
+                'articulo__seguimiento_tipo',
+                'articulo__costo_ultimo'
+            ).annotate(
+                contado=Sum('cantidad_contada'),
+                sistema=Max('existencia_sistema_al_momento')
+            )
+
+            entradas = defaultdict(list)
+            salidas = defaultdict(list)
+            afectados = defaultdict(set)
+            omitidos = []
+            sin_costo = []
+
+            for fila in filas:
+                diferencia = fila['contado'] - fila['sistema']
+                if diferencia == 0:
+                    continue
+
+                # Lotes/Series requieren el detalle de lote o serie, que la captura no registra
+                if fila['articulo__seguimiento_tipo'] != 'N':
+                    omitidos.append(fila['articulo__clave'])
+                    continue
+
+                # El costo viene de la sincronización (CALC_EXIS_ARTALM); sin él no se valúa la entrada
+                costo = fila['articulo__costo_ultimo'] or 0
+                if diferencia > 0 and costo <= 0:
+                    sin_costo.append(fila['articulo__clave'])
+                    continue
+
+                almacen_id = fila['captura__almacen_id']
+                renglon = {
+                    'articulo_id': fila['articulo_id'],
+                    'articulo_id_msip': fila['articulo__articulo_id_msip'],
+                    'clave': fila['articulo__clave'],
+                    'unidades': float(abs(diferencia)),
+                    'costo_unitario': float(costo),
+                }
+                if diferencia > 0:
+                    entradas[almacen_id].append(renglon)
+                else:
+                    salidas[almacen_id].append(renglon)
+                afectados[almacen_id].add(fila['articulo_id'])
+
+            documentos_creados = 0
+            for tipo, grupos in (('ENTRADA', entradas), ('SALIDA', salidas)):
+                for almacen_id, renglones in grupos.items():
+                    capturas_almacen = capturas_por_almacen[almacen_id]
+                    folios = ', '.join(c.folio for c in capturas_almacen)
+                    for inicio in range(0, len(renglones), renglones_por_documento):
+                        documento = DocumentoMicrosip.objects.create(
+                            almacen_id=almacen_id,
+                            tipo=tipo,
+                            descripcion=f"Ajuste inventario físico: {folios}"[:200],
+                            renglones=renglones[inicio:inicio + renglones_por_documento]
+                        )
+                        documento.capturas.set(capturas_almacen)
+                        documentos_creados += 1
+
+            for almacen_id, articulo_ids in afectados.items():
+                InventarioArticulo.objects.filter(
+                    almacen_id=almacen_id, articulo_id__in=articulo_ids
+                ).update(pendiente_sincronizar_msip=True)
+
+            Captura.objects.filter(pk__in=[c.pk for c in capturas]).update(estado='PROCESADO')
+
+        if omitidos:
+            evento(
+                log, 'envio.omitidos', f"{len(omitidos)} artículos con lotes/series no se enviaron", logging.WARNING,
+                articulos=len(omitidos), claves=', '.join(omitidos[:20])
+            )
+        if sin_costo:
+            evento(
+                log, 'envio.sin_costo', f"{len(sin_costo)} sobrantes sin costo conocido no se enviaron", logging.WARNING,
+                articulos=len(sin_costo), claves=', '.join(sin_costo[:20])
+            )
+        evento(
+            log, 'envio.preparados', "Documentos de ajuste preparados",
+            capturas=len(capturas), documentos=documentos_creados
+        )
+
+        return {
+            "capturas_procesadas": len(capturas),
+            "documentos_creados": documentos_creados,
+            "articulos_omitidos": omitidos,
+            "articulos_sin_costo": sin_costo
+        }
+
+    # -------------------------------------------------------------------------
+    # 2. ENVÍO (Bandeja de salida -> Microsip DLL)
+    # -------------------------------------------------------------------------
+
+    def enviar_documentos_pendientes(self):
+        # Con el worker DLL activo, el envío se hace en el proceso dueño de la DLL
+        if worker_dll_habilitado():
+            return ClienteDLL().llamar('enviar_documentos_pendientes')
+
+        max_intentos = settings.MICROSIP_CONFIG.get('MAX_INTENTOS_DOCUMENTO', 5)
+        documentos = list(
+            DocumentoMicrosip.objects.filter(
+                Q(estado='PENDIENTE') | Q(estado='ERROR', intentos__lt=max_intentos)
+            ).select_related('almacen').order_by('id')
+        )
+        if not documentos:
+            return {"aplicados": 0, "errores": 0}
+
+        # Solo abrimos la conexión a la DLL si hay algo que enviar
+        return self._aplicar_documentos(documentos)
+
+    @microsip_connect
+    def _aplicar_documentos(self, documentos):
+        evento(log, 'envio.inicio', "Enviando documentos a Microsip (una sola conexión)", documentos=len(documentos))
+        inicio = time.perf_counter()
+        aplicados = 0
+        errores = 0
+
+        for documento in documentos:
+            documento.intentos += 1
+            try:
+                self._aplicar_documento(documento)
+            except MicrosipAPIError as e:
+                # Abortamos solo este documento y seguimos con el resto del lote
+                self._abortar_documento(documento)
+                documento.estado = 'ERROR'
+                documento.ultimo_error = f"{e} {e.details}"
+                evento(
+                    log, 'envio.documento_error', str(e), logging.ERROR,
+                    documento=documento.id, intento=documento.intentos, funcion=e.api_function, codigo=e.api_error_code
+                )
+                documento.save(update_fields=['estado', 'intentos', 'ultimo_error'])
+                errores += 1
+                continue
+            except Exception as e:
+                # Error inesperado (no de la DLL): igual se registra el intento y se sigue
+                self._abortar_documento(documento)
+                documento.estado = 'ERROR'
+                documento.ultimo_error = f"{type(e).__name__}: {e}"
+                log.exception("Error inesperado al aplicar el documento %s (intento %s)", documento.id, documento.intentos)
+                documento.save(update_fields=['estado', 'intentos', 'ultimo_error'])
+                errores += 1
+                continue
+
+            # Se guarda inmediatamente para no reenviar un documento ya aplicado
+            documento.estado = 'APLICADO'
+            documento.ultimo_error = None
+            documento.fecha_aplicacion = timezone.now()
+            documento.save(update_fields=['estado', 'intentos', 'ultimo_error', 'fecha_aplicacion'])
+            self._liberar_pendientes(documento)
+            aplicados += 1
+
+        evento(
+            log, 'envio.fin', "Envío de documentos terminado", aplicados=aplicados, errores=errores,
+            duracion_ms=round((time.perf_counter() - inicio) * 1000, 1)
+        )
+        return {"aplicados": aplicados, "errores": errores}
+
+    def _abortar_documento(self, documento):
+        try:
+            self.dll.AbortaDoctoInventarios()
+        except Exception as abort_e:
+            log.warning("Fallo al intentar abortar el documento %s: %s", documento.id, abort_e)
+
+    def _aplicar_documento(self, documento):
+        conceptos = settings.MICROSIP_CONFIG['CONCEPTOS']
+        encabezado = {
+            'ConceptoInId': conceptos['ENTRADA_AJUSTE_ID'] if documento.tipo == 'ENTRADA' else conceptos['SALIDA_AJUSTE_ID'],
+            'AlmacenId': documento.almacen.almacen_id_msip,
+            'Fecha': timezone.localdate().strftime('%d/%m/%Y'),
+            'Folio': '',  # Microsip asigna el folio
+            'Descripcion': documento.descripcion,
+        }
+        renglones = [
+            {
+                'ArticuloId': r['articulo_id_msip'],
+                'Nombre': r['clave'],
+                'Seguimiento': 0,
+                'Unidades': r['unidades'],
+                'CostoUnitario': r['costo_unitario'],
+                'CostoTotal': r['costo_unitario'] * r['unidades'],
+            }
+            for r in documento.renglones
+        ]
+
+        if documento.tipo == 'ENTRADA':
+            return self._registrar_entrada(encabezado, renglones)
+        return self._registrar_salida(encabezado, renglones)
+
+    def _liberar_pendientes(self, documento):
+        """Quita la marca de pendiente a los artículos que ya no tienen otro documento sin aplicar."""
+        articulo_ids = {r['articulo_id'] for r in documento.renglones}
+
+        otros = DocumentoMicrosip.objects.filter(
+            almacen_id=documento.almacen_id
+        ).exclude(estado='APLICADO').values_list('renglones', flat=True)
+        for renglones in otros:
+            articulo_ids -= {r['articulo_id'] for r in renglones}
+
+        if articulo_ids:
+            InventarioArticulo.objects.filter(
+                almacen_id=documento.almacen_id, articulo_id__in=articulo_ids
+            ).update(pendiente_sincronizar_msip=False)
@@ -0,0 +1,88 @@
+"""
+Backends de LECTURA directa a la base Firebird de Microsip (sync masivo).
+
+- LectorFirebird: driver fdb, importado solo al ejecutar la primera consulta.
+- LectorSimulado: Python puro, responde filas predefinidas (pruebas / Linux sin Firebird).
+
+Se elige con MICROSIP_CONFIG['USAR_LECTOR_SIMULADO'] (ver obtener_lector).
+"""
+from django.conf import settings
+
+
+def _filas_a_dicts(cursor):
+    """Convierte el resultado del cursor en una lista de dicts (strings sin espacios)."""
+    if not cursor.description:
+        return []
+    columnas = [col[0] for col in cursor.description]
+    resultado = []
+    for fila in cursor.fetchall():
+        registro = {}
+        for i, columna in enumerate(columnas):
+            valor = fila[i]
+            if isinstance(valor, str):
+                valor = valor.strip()
+            registro[columna] = valor
+        resultado.append(registro)
+    return resultado
+
+
+class LectorMicrosip:
+    """Interfaz: `consultar(sql, params)` retorna una lista de dicts {COLUMNA: valor}."""
+
+    def consultar(self, sql, params=None):
+        raise NotImplementedError
+
+
+class LectorFirebird(LectorMicrosip):
+    """Lectura real vía fdb. El driver se importa en la primera consulta."""
+
+    def __init__(self, config):
+        self.config = config
+
+    def consultar(self, sql, params=None):
+        import fdb  # REQUISITO: pip install fdb
+
+        con = fdb.connect(
+            dsn=self.config['DB_FILE'],
+            user=self.config['USER'],
+            password=self.config['PASSWORD'],
+            charset='NONE'
+        )
+        cursor = con.cursor()
+        try:
+            cursor.execute(sql, params or ())
+            return _filas_a_dicts(cursor)
+        finally:
+            cursor.close()
+            con.close()
+
+
+class LectorSimulado(LectorMicrosip):
+    """
+    Responde con filas registradas de antemano. Cada respuesta se asocia a un
+    fragmento del SQL (ej. 'FROM ARTICULOS A'); si ninguno coincide retorna [].
+    Las consultas recibidas quedan en `consultas`.
+
+        lector = LectorSimulado({'FROM ALMACENES': [{'ALMACEN_ID': 1, 'NOMBRE': 'GENERAL'}]})
+    """
+
+    def __init__(self, respuestas=None):
+        self.respuestas = dict(respuestas or {})
+        self.consultas = []
+
+    def responder(self, fragmento_sql, filas):
+        self.respuestas[fragmento_sql] = filas
+
+    def consultar(self, sql, params=None):
+        self.consultas.append((sql, params))
+        for fragmento, filas in self.respuestas.items():
+            if fragmento in sql:
+                return [dict(fila) for fila in filas]
+        return []
+
+
+def obtener_lector(config=None):
+    config = config or settings.MICROSIP_CONFIG
+    if config.get('USAR_LECTOR_SIMULADO', False):
+        return LectorSimulado()
+    return LectorFirebird(config)
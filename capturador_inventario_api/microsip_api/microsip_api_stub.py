@@ -0,0 +1,161 @@
+"""
+Implementación en Python puro de las funciones de ApiMicrosip.dll que usa el proyecto.
+Permite ejecutar los flujos de escritura (ej. envío de conteos) en Linux o en pruebas,
+sin Windows ni conexión al servidor Firebird.
+
+Uso:
+    servicio = EnvioConteosService(dll=MicrosipDLLSimulada())
+o bien MICROSIP_CONFIG['USAR_DLL_SIMULADA'] = True en settings.py.
+"""
+
+from .microsip_api_transporte import TransporteMicrosip
+
+
+def _valor(arg):
+    """Desenvuelve c_int/c_double/bytes a valores Python."""
+    valor = getattr(arg, 'value', arg)
+    if isinstance(valor, bytes):
+        return valor.decode('latin-1')
+    return valor
+
+
+class MicrosipDLLSimulada(TransporteMicrosip):
+    """
+    Imita la DLL: todas las funciones retornan 0 (éxito) y se registran en `llamadas`.
+    Los documentos aplicados quedan en `documentos_aplicados` para poder revisarlos.
+
+    Para simular un error, indicar el nombre de la función en `fallar_en`
+    (ej. MicrosipDLLSimulada(fallar_en={'AplicaEntrada'})).
+    """
+
+    CODIGO_ERROR = 1
+
+    def __init__(self, fallar_en=None):
+        self.fallar_en = set(fallar_en or [])
+        self.llamadas = []
+        self.documentos_aplicados = []
+        self.conectado = False
+        self._siguiente_handle = 1
+        self._documento_actual = None
+        self._ultimo_error = (0, '')
+
+    # --- Utilidades internas ---
+
+    def _registrar(self, funcion, *args):
+        self.llamadas.append((funcion, tuple(_valor(a) for a in args)))
+        if funcion in self.fallar_en:
+            self._ultimo_error = (self.CODIGO_ERROR, f"Error simulado en {funcion}")
+            return self.CODIGO_ERROR
+        self._ultimo_error = (0, '')
+        return 0
+
+    def _nuevo_handle(self):
+        handle = self._siguiente_handle
+        self._siguiente_handle += 1
+        return handle
+
+    # --- API Básica ---
+
+    def inSetErrorHandling(self, exception_on_error, message_on_exception):
+        return self._registrar('inSetErrorHandling', exception_on_error, message_on_exception)
+
+    def inGetLastErrorMessage(self, buffer):
+        codigo, mensaje = self._ultimo_error
+        if mensaje:
+            buffer.value = mensaje.encode('latin-1')[:len(buffer) - 1]
+        return codigo
+
+    def GetLastErrorCode(self):
+        return self._ultimo_error[0]
+
+    def NewDB(self):
+        return self._nuevo_handle()
+
+    def NewTrn(self, db_handle, tipo):
+        return self._nuevo_handle()
+
+    def NewSql(self, trn_handle):
+        return self._nuevo_handle()
+
+    def DBConnect(self, db_handle, database, user, password):
+        resultado = self._registrar('DBConnect', db_handle, database, user)
+        self.conectado = resultado == 0
+        return resultado
+
+    def DBDisconnect(self, db_handle):
+        self.conectado = False
+        return self._registrar('DBDisconnect', db_handle)
+
+    def SetDBInventarios(self, db_handle):
+        return self._registrar('SetDBInventarios', db_handle)
+
+    def SqlQry(self, sql_handle, query):
+        return self._registrar('SqlQry', sql_handle, query)
+
+    def SqlExecQuery(self, sql_handle):
+        return self._registrar('SqlExecQuery', sql_handle)
+
+    def SqlClose(self, sql_handle):
+        return self._registrar('SqlClose', sql_handle)
+
+    # --- API Inventarios ---
+
+    def _nuevo_documento(self, tipo, funcion, concepto, almacen, fecha, folio, descripcion):
+        resultado = self._registrar(funcion, concepto, almacen, fecha, folio, descripcion)
+        if resultado == 0:
+            self._documento_actual = {
+                'tipo': tipo,
+                'concepto': _valor(concepto),
+                'almacen': _valor(almacen),
+                'fecha': _valor(fecha),
+                'folio': _valor(folio),
+                'descripcion': _valor(descripcion),
+                'renglones': [],
+            }
+        return resultado
+
+    def _renglon(self, funcion, articulo_id, unidades, costo_unitario, costo_total):
+        resultado = self._registrar(funcion, articulo_id, unidades, costo_unitario, costo_total)
+        if resultado == 0 and self._documento_actual is not None:
+            self._documento_actual['renglones'].append({
+                'articulo_id': _valor(articulo_id),
+                'unidades': _valor(unidades),
+                'costo_unitario': _valor(costo_unitario),
+                'costo_total': _valor(costo_total),
+            })
+        return resultado
+
+    def _aplicar(self, funcion):
+        resultado = self._registrar(funcion)
+        if resultado == 0 and self._documento_actual is not None:
+            self.documentos_aplicados.append(self._documento_actual)
+            self._documento_actual = None
+        return resultado
+
+    def NuevaEntrada(self, concepto, almacen, fecha, folio, descripcion, centro_costo):
+        return self._nuevo_documento('ENTRADA', 'NuevaEntrada', concepto, almacen, fecha, folio, descripcion)
+
+    def RenglonEntrada(self, articulo_id, unidades, costo_unitario, costo_total):
+        return self._renglon('RenglonEntrada', articulo_id, unidades, costo_unitario, costo_total)
+
+    def RenglonEntradaLotes(self, clave_lote, fecha_caducidad, unidades):
+        return self._registrar('RenglonEntradaLotes', clave_lote, fecha_caducidad, unidades)
+
+    def RenglonEntradaSeries(self, clave_serie, num_consecutivos):
+        return self._registrar('RenglonEntradaSeries', clave_serie, num_consecutivos)
+
+    def AplicaEntrada(self):
+        return self._aplicar('AplicaEntrada')
+
+    def NuevaSalida(self, concepto, almacen, almacen_destino, fecha, folio, descripcion, centro_costo):
+        return self._nuevo_documento('SALIDA', 'NuevaSalida', concepto, almacen, fecha, folio, descripcion)
+
+    def RenglonSalida(self, articulo_id, unidades, costo_unitario, costo_total):
+        return self._renglon('RenglonSalida', articulo_id, unidades, costo_unitario, costo_total)
+
+    def AplicaSalida(self):
+        return self._aplicar('AplicaSalida')
+
+    def AbortaDoctoInventarios(self):
+        self._registrar('AbortaDoctoInventarios')
+        self._documento_actual = None
@@ -1,6 +1,10 @@
+from collections import defaultdict
 from datetime import datetime, date
+import logging
+from decimal import Decimal
+import hashlib
+import time
 import traceback
-import fdb  # REQUISITO: pip install fdb
 from django.db import IntegrityError, transaction
 from django.utils import timezone
 from django.conf import settings # Para leer la config de conexión
@@ -11,9 +15,16 @@ from capturador_inventario_api.models import (
     ClaveAuxiliar, 
     BitacoraSincronizacion, 
     Almacen, 
-    InventarioArticulo
+    InventarioArticulo,
+    calcular_bajo_punto_reorden,
+    calcular_localizacion_orden
 )
-from .microsip_api_connection import MicrosipConnectionBase, microsip_connect, MicrosipAPIError 
+from .microsip_api_connection import MicrosipConnectionBase, MicrosipAPIError
+from .microsip_api_sync_bloqueo import ArrendamientoSincronizacion
+from .microsip_api_lectura import obtener_lector
+from ..registro_eventos import contexto_log, evento, medir, obtener_logger
+
+log = obtener_logger('sync')
 
 # Mapa para la DLL (cuando escribamos en el futuro)
 SEGUIMIENTO_MAP_OUT = {
@@ -22,12 +33,38 @@ SEGUIMIENTO_MAP_OUT = {
     'S': 2,
 }
 
+
+def calcular_huella(*valores):
+    """
+    Calcula la huella (hash MD5) de una fila sincronizada.
+    Los decimales se normalizan a 5 posiciones para que la misma fila de Firebird
+    produzca siempre el mismo hash, sin importar la escala con la que llegue.
+    """
+    partes = []
+    for valor in valores:
+        if valor is None:
+            partes.append('')
+        elif isinstance(valor, (Decimal, float, int)) and not isinstance(valor, bool):
+            partes.append(f"{Decimal(str(valor)):.5f}")
+        elif isinstance(valor, (list, tuple)):
+            partes.append(','.join(str(v) for v in valor))
+        else:
+            partes.append(str(valor))
+    return hashlib.md5('\x1f'.join(partes).encode('utf-8')).hexdigest()
+
 class InventariosService(MicrosipConnectionBase): 
     """
     Servicio híbrido:
     - Usa SQL Directo (fdb) para LEER masivamente (Sync rápido).
     - Usa DLL Microsip para ESCRIBIR transacciones (Validación de negocio).
+
+    Ambos backends se crean hasta el primer uso; `lector` permite inyectar uno
+    (ej. LectorSimulado) igual que `dll` para la escritura.
     """
+
+    def __init__(self, dll=None, lector=None):
+        super().__init__(dll=dll)
+        self.lector = lector
     
     # -------------------------------------------------------------------------
     # GESTIÓN DE CONEXIÓN SQL DIRECTA (SOLO LECTURA)
@@ -48,49 +85,16 @@ class InventariosService(MicrosipConnectionBase):
         raise ValueError("No se encontró configuración de Microsip en settings.py")
 
     def _ejecutar_query_firebird(self, sql, params=None):
-        conf = self._get_db_config()
-        
-        dsn = conf['DB_FILE']
-        user = conf['USER']
-        password = conf['PASSWORD']
-        
-        con = fdb.connect(
-            dsn=dsn, 
-            user=user, 
-            password=password,
-            charset='NONE' 
-        )
-        
-        cursor = con.cursor()
-        try:
-            cursor.execute(sql, params or ())
-            
-            # Verificar si la consulta retorna resultados
-            if cursor.description:
-                columns = [col[0] for col in cursor.description]
-                rows = cursor.fetchall()
-                result = []
-                for row in rows:
-                    row_dict = {}
-                    for i, col_name in enumerate(columns):
-                        val = row[i]
-                        if isinstance(val, str):
-                            val = val.strip()
-                        row_dict[col_name] = val
-                    result.append(row_dict)
-                return result
-            else:
-                return [] # Para sentencias que no retornan nada (aunque execute block returns sí retorna)
-        finally:
-            cursor.close()
-            con.close()
+        if self.lector is None:
+            self.lector = obtener_lector(self._get_db_config())
+        return self.lector.consultar(sql, params)
 
     # -------------------------------------------------------------------------
     # 1. EXTRACCIÓN DE DATOS MAESTROS
     # -------------------------------------------------------------------------
 
     def extraer_articulos_y_claves_msip(self):
-        print("-> 1. Extrayendo Artículos y Claves vía SQL Directo...")
+        log.debug("1. Extrayendo artículos y claves vía SQL directo")
         
         sql = """
             SELECT 
@@ -159,20 +163,26 @@ class InventariosService(MicrosipConnectionBase):
             }
             claves_por_articulo[art_id] = claves_auxiliares
 
-        print(f"-> Extracción finalizada: {len(articulos_microsip)} artículos activos procesados.")
         return articulos_microsip, claves_por_articulo, ids_activos
 
     # -------------------------------------------------------------------------
     # 2. SINCRONIZACIÓN DE ALMACENES
     # -------------------------------------------------------------------------
 
-    def _sincronizar_almacenes(self):
-        print("-> 2. Sincronizando Almacenes...")
-        sql = "SELECT ALMACEN_ID, NOMBRE FROM ALMACENES"
-        almacenes_msip = self._ejecutar_query_firebird(sql)
-        
-        creados = 0
-        actualizados = 0
+    def extraer_almacenes_msip(self):
+        return self._ejecutar_query_firebird("SELECT ALMACEN_ID, NOMBRE FROM ALMACENES")
+
+    def _calcular_cambios_almacenes(self, almacenes_msip):
+        """
+        Diff de almacenes contra Django (lo usan la sincronización y la simulación).
+        Retorna (nuevos [(msip_id, nombre)], renombrados [(pk, nombre)], ids_msip_activos).
+        """
+        existentes = {
+            msip_id: (pk, nombre)
+            for pk, msip_id, nombre in Almacen.objects.values_list('pk', 'almacen_id_msip', 'nombre')
+        }
+        nuevos = []
+        renombrados = []
         ids_activos = []
 
         for row in almacenes_msip:
@@ -180,36 +190,60 @@ class InventariosService(MicrosipConnectionBase):
             nombre = row['NOMBRE']
             ids_activos.append(msip_id)
 
-            obj, created = Almacen.objects.update_or_create(
-                almacen_id_msip=msip_id,
-                defaults={'nombre': nombre}
-            )
-            if created: creados += 1
-            else: actualizados += 1
+            existente = existentes.get(msip_id)
+            if existente is None:
+                nuevos.append((msip_id, nombre))
+            elif existente[1] != nombre:
+                renombrados.append((existente[0], nombre))
+
+        return nuevos, renombrados, ids_activos
+
+    def _sincronizar_almacenes(self, almacenes_msip=None):
+        log.debug("2. Sincronizando almacenes")
+        if almacenes_msip is None:
+            almacenes_msip = self.extraer_almacenes_msip()
+
+        nuevos, renombrados, ids_activos = self._calcular_cambios_almacenes(almacenes_msip)
+
+        for msip_id, nombre in nuevos:
+            Almacen.objects.create(almacen_id_msip=msip_id, nombre=nombre)
+        for pk, nombre in renombrados:
+            Almacen.objects.filter(pk=pk).update(nombre=nombre)
         
         Almacen.objects.exclude(almacen_id_msip__in=ids_activos).update(activo_web=False)
-        return creados
+        evento(log, 'sync.almacenes', "Almacenes sincronizados", creados=len(nuevos), renombrados=len(renombrados))
+        return len(nuevos)
 
     # -------------------------------------------------------------------------
     # 3. SINCRONIZACIÓN DE ARTÍCULOS
     # -------------------------------------------------------------------------
 
-    def _actualizar_articulos_django(self, articulos_microsip, log_buffer):
+    def _calcular_cambios_articulos(self, articulos_microsip, claves_por_articulo, log_buffer, ahora=None):
+        """
+        Diff de artículos: compara la huella de cada fila de Microsip contra la guardada
+        en Django. Los artículos sin cambios no se materializan como modelos.
+        Retorna (articulos_a_crear, articulos_a_actualizar, ids_msip_modificados,
+        renombrados [(msip_id, clave, clave_DUP)] de los que se van a escribir).
+        """
+        ahora = ahora or timezone.now()
         articulos_a_crear = []
         articulos_a_actualizar = []
+        ids_modificados = set()
+        renombrados = []
         
-        print("-> 3. Procesando artículos en Django...")
-        
-        articulos_existentes = {a.articulo_id_msip: a for a in Articulo.objects.all()}
-        
+        # Solo traemos las columnas necesarias para el diff (sin instanciar modelos)
+        articulos_existentes = {}
         claves_registradas = {}
-        for a in Articulo.objects.all():
-            key_norm = a.clave.strip().upper()
-            claves_registradas[key_norm] = a.articulo_id_msip
+        for pk, msip_id, clave, huella, activo in Articulo.objects.values_list(
+            'pk', 'articulo_id_msip', 'clave', 'huella_sync', 'activo'
+        ):
+            articulos_existentes[msip_id] = (pk, huella, activo)
+            claves_registradas[clave.strip().upper()] = msip_id
 
         for msip_id, data in articulos_microsip.items():
             clave_original = data['clave'].strip()
             clave_check = clave_original.upper()
+            renombrado = None
             
             if clave_check in claves_registradas:
                 dueno_id = claves_registradas[clave_check]
@@ -217,65 +251,99 @@ class InventariosService(MicrosipConnectionBase):
                 if dueno_id != msip_id:
                     clave_candidata = f"{clave_original}_DUP_{msip_id}"
                     msg = f"⚠ AVISO: Clave duplicada '{clave_original}' (vs ID {dueno_id}). Se renombró a '{clave_candidata}' para el ID {msip_id}."
-                    print(msg)
+                    evento(
+                        log, 'sync.clave_duplicada', msg, logging.WARNING,
+                        clave=clave_original, renombrada=clave_candidata, articulo_id_msip=msip_id, dueno_id_msip=dueno_id
+                    )
                     log_buffer.append(msg)
+                    renombrado = (msip_id, clave_original, clave_candidata)
                     
                     clave_original = clave_candidata
                     clave_check = clave_candidata.upper()
 
             claves_registradas[clave_check] = msip_id
+            clave_final = clave_original.upper()
+
+            claves_aux = sorted({c.strip().upper() for c in claves_por_articulo.get(msip_id, [])})
+            huella = calcular_huella(clave_final, data['nombre'], data['seguimiento_tipo'], claves_aux)
             
-            articulo = articulos_existentes.get(msip_id)
-            if articulo:
-                clave_final = clave_original.upper()
-                
-                if (articulo.clave != clave_final or 
-                    articulo.nombre != data['nombre'] or
-                    articulo.seguimiento_tipo != data['seguimiento_tipo'] or
-                    not articulo.activo):
-                    
-                    articulo.clave = clave_final
-                    articulo.nombre = data['nombre']
-                    articulo.seguimiento_tipo = data['seguimiento_tipo']
-                    articulo.activo = True
-                    articulos_a_actualizar.append(articulo)
+            existente = articulos_existentes.get(msip_id)
+            if existente:
+                pk, huella_actual, activo = existente
+                if huella_actual == huella and activo:
+                    continue
+
+                articulos_a_actualizar.append(Articulo(
+                    pk=pk,
+                    articulo_id_msip=msip_id,
+                    clave=clave_final,
+                    nombre=data['nombre'],
+                    seguimiento_tipo=data['seguimiento_tipo'],
+                    activo=True,
+                    huella_sync=huella,
+                    ultima_sincronizacion=ahora
+                ))
+                if huella_actual != huella:
+                    ids_modificados.add(msip_id)
             else:
-                clave_final = clave_original.upper()
                 articulos_a_crear.append(Articulo(
                     articulo_id_msip=msip_id,
                     clave=clave_final,
                     nombre=data['nombre'],
                     seguimiento_tipo=data['seguimiento_tipo'],
-                    activo=True
+                    activo=True,
+                    huella_sync=huella
                 ))
-        
+                ids_modificados.add(msip_id)
+
+            if renombrado:
+                renombrados.append(renombrado)
+
+        return articulos_a_crear, articulos_a_actualizar, ids_modificados, renombrados
+
+    def _actualizar_articulos_django(self, articulos_microsip, claves_por_articulo, log_buffer, ahora=None):
+        """
+        Crea/actualiza los artículos que detecta _calcular_cambios_articulos.
+        Retorna (creados, actualizados, ids_msip_modificados).
+
+        bulk_update no aplica auto_now: `ultima_sincronizacion` se asigna explícitamente
+        (la usa el feed de cambios de los handhelds).
+        """
+        ahora = ahora or timezone.now()
+        log.debug("3. Procesando artículos en Django")
+        articulos_a_crear, articulos_a_actualizar, ids_modificados, _ = self._calcular_cambios_articulos(
+            articulos_microsip, claves_por_articulo, log_buffer, ahora
+        )
+
         BATCH_SIZE = 1000
         if articulos_a_crear:
             Articulo.objects.bulk_create(articulos_a_crear, batch_size=BATCH_SIZE)
         
         if articulos_a_actualizar:
-            Articulo.objects.bulk_update(articulos_a_actualizar, ['clave', 'nombre', 'seguimiento_tipo', 'activo'], batch_size=BATCH_SIZE)
+            Articulo.objects.bulk_update(articulos_a_actualizar, ['clave', 'nombre', 'seguimiento_tipo', 'activo', 'huella_sync', 'ultima_sincronizacion'], batch_size=BATCH_SIZE)
+
+        return len(articulos_a_crear), len(articulos_a_actualizar), ids_modificados
 
-        return len(articulos_a_crear), len(articulos_a_actualizar)
+    def _articulos_obsoletos(self, ids_microsip_activos):
+        """Artículos activos en Django que ya no vienen de Microsip."""
+        return Articulo.objects.filter(activo=True).exclude(articulo_id_msip__in=ids_microsip_activos)
 
-    def _limpiar_articulos_obsoletos(self, ids_microsip_activos):
+    def _limpiar_articulos_obsoletos(self, ids_microsip_activos, ahora=None):
         if not ids_microsip_activos: return 0
-        return Articulo.objects.filter(activo=True).exclude(articulo_id_msip__in=ids_microsip_activos).update(activo=False)
+        # La fecha marca la baja para que el feed de cambios la envíe como eliminado
+        return self._articulos_obsoletos(ids_microsip_activos).update(
+            activo=False, ultima_sincronizacion=ahora or timezone.now()
+        )
 
     # -------------------------------------------------------------------------
     # 5. SINCRONIZACIÓN DE CLAVES AUXILIARES
     # -------------------------------------------------------------------------
 
-    def _sincronizar_claves_auxiliares(self, ids_microsip_activos, claves_por_articulo):
-        print("-> 5. Sincronizando claves auxiliares...")
-        if ids_microsip_activos:
-             pks_activos = Articulo.objects.filter(articulo_id_msip__in=ids_microsip_activos).values_list('pk', flat=True)
-             ClaveAuxiliar.objects.filter(articulo_id__in=pks_activos).delete()
-
-        articulos_map = {a.articulo_id_msip: a.pk for a in Articulo.objects.filter(articulo_id_msip__in=ids_microsip_activos)}
-        
+    def _calcular_claves_auxiliares(self, ids_microsip_modificados, claves_por_articulo, articulos_map):
+        """Claves auxiliares (sin repetir) que deben quedar en cada artículo modificado: [(pk, clave)]."""
         claves_a_crear = []
-        for msip_id, claves in claves_por_articulo.items():
+        for msip_id in ids_microsip_modificados:
+            claves = claves_por_articulo.get(msip_id, [])
             if msip_id in articulos_map:
                 pk = articulos_map[msip_id]
                 
@@ -284,9 +352,29 @@ class InventariosService(MicrosipConnectionBase):
                 for clave in claves:
                     clave_clean = clave.strip().upper()
                     if clave_clean not in claves_procesadas_para_este_articulo:
-                        claves_a_crear.append(ClaveAuxiliar(articulo_id=pk, clave=clave_clean))
+                        claves_a_crear.append((pk, clave_clean))
                         claves_procesadas_para_este_articulo.add(clave_clean)
 
+        return claves_a_crear
+
+    def _sincronizar_claves_auxiliares(self, ids_microsip_modificados, claves_por_articulo):
+        """
+        Reescribe las claves auxiliares solo de los artículos cuya huella cambió
+        (la huella del artículo incluye sus claves auxiliares).
+        """
+        log.debug("5. Sincronizando claves auxiliares")
+        if not ids_microsip_modificados:
+            return 0
+
+        articulos_map = dict(
+            Articulo.objects.filter(articulo_id_msip__in=ids_microsip_modificados).values_list('articulo_id_msip', 'pk')
+        )
+        ClaveAuxiliar.objects.filter(articulo_id__in=list(articulos_map.values())).delete()
+        
+        claves_a_crear = [
+            ClaveAuxiliar(articulo_id=pk, clave=clave)
+            for pk, clave in self._calcular_claves_auxiliares(ids_microsip_modificados, claves_por_articulo, articulos_map)
+        ]
         if claves_a_crear:
             ClaveAuxiliar.objects.bulk_create(claves_a_crear, batch_size=2000)
             
@@ -296,8 +384,13 @@ class InventariosService(MicrosipConnectionBase):
     # 6. SINCRONIZACIÓN DE INVENTARIO
     # -------------------------------------------------------------------------
 
-    def _sincronizar_existencias_y_localizaciones(self):
-        print("-> 6. Sincronizando Existencias usando procedimiento CALC_EXIS_ARTALM...")
+    def extraer_existencias_msip(self):
+        """
+        Lee existencias, localizaciones, niveles y el valor de la existencia (COSTO_TOTAL,
+        de CALC_EXIS_ARTALM) de Firebird. Se ejecuta FUERA de la transacción de Django para no mantenerla abierta
+        mientras Firebird calcula las existencias.
+        """
+        log.debug("6. Extrayendo existencias con el procedimiento CALC_EXIS_ARTALM")
 
         # USAMOS EXECUTE BLOCK PARA LLAMAR AL PROCEDIMIENTO ALMACENADO DE FORMA MASIVA
         # Esto soluciona que el procedimiento sea 'Executable' y no 'Selectable'.
@@ -311,9 +404,9 @@ class InventariosService(MicrosipConnectionBase):
                 STOCK_MIN NUMERIC(18,5),
                 STOCK_MAX NUMERIC(18,5),
                 PUNTO_REORDEN NUMERIC(18,5),
-                EXISTENCIA NUMERIC(18,5)
+                EXISTENCIA NUMERIC(18,5),
+                COSTO_TOTAL NUMERIC(18,2)
             ) AS
-            DECLARE VARIABLE V_COSTO NUMERIC(15,2);
             BEGIN
               FOR SELECT 
                     A.ARTICULO_ID, 
@@ -332,7 +425,7 @@ class InventariosService(MicrosipConnectionBase):
               BEGIN
                   /* LLAMADA AL PROCEDIMIENTO PROPORCIONADO POR EL USUARIO */
                   EXECUTE PROCEDURE CALC_EXIS_ARTALM(:ARTICULO_ID, :ALMACEN_ID, :P_FECHA)
-                  RETURNING_VALUES :EXISTENCIA, :V_COSTO;
+                  RETURNING_VALUES :EXISTENCIA, :COSTO_TOTAL;
                   
                   SUSPEND;
               END
@@ -342,14 +435,19 @@ class InventariosService(MicrosipConnectionBase):
         # Pasamos la fecha actual
         fecha_corte = date.today()
         
-        datos_msip = self._ejecutar_query_firebird(sql_block, (fecha_corte,))
-        
-        map_articulos = {a.articulo_id_msip: a.pk for a in Articulo.objects.all()}
-        map_almacenes = {al.almacen_id_msip: al.pk for al in Almacen.objects.all()}
-        
+        return self._ejecutar_query_firebird(sql_block, (fecha_corte,))
+
+    def _calcular_cambios_existencias(self, datos_msip, map_articulos, map_almacenes, ahora):
+        """
+        Diff de existencias: (creates, updates) de InventarioArticulo según la huella de
+        cada fila. map_articulos / map_almacenes traducen IDs de Microsip a pk de Django.
+        """
+        # (articulo, almacen) -> (pk, huella, localizacion, pendiente) sin instanciar modelos
         inventario_actual = {
-            (inv.articulo_id, inv.almacen_id): inv 
-            for inv in InventarioArticulo.objects.all()
+            (art_id, alm_id): (pk, huella, loc, pendiente)
+            for pk, art_id, alm_id, huella, loc, pendiente in InventarioArticulo.objects.values_list(
+                'pk', 'articulo_id', 'almacen_id', 'huella_sync', 'localizacion', 'pendiente_sincronizar_msip'
+            )
         }
 
         updates = []
@@ -364,83 +462,400 @@ class InventariosService(MicrosipConnectionBase):
 
             if not django_art_id or not django_alm_id: continue
 
-            inv_obj = inventario_actual.get((django_art_id, django_alm_id))
-            
             nueva_exist = row['EXISTENCIA']
             nueva_loc = row['LOCALIZACION']
+            huella = calcular_huella(nueva_exist, nueva_loc, row['STOCK_MIN'], row['STOCK_MAX'], row['PUNTO_REORDEN'])
+
+            actual = inventario_actual.get((django_art_id, django_alm_id))
             
-            if inv_obj:
-                loc_a_guardar = inv_obj.localizacion
-                if not inv_obj.pendiente_sincronizar_msip:
-                    loc_a_guardar = nueva_loc
-                
-                if (inv_obj.existencia != nueva_exist or 
-                    inv_obj.localizacion != loc_a_guardar or
-                    inv_obj.stock_minimo != row['STOCK_MIN']):
-                    
-                    inv_obj.existencia = nueva_exist
-                    inv_obj.localizacion = loc_a_guardar
-                    inv_obj.stock_minimo = row['STOCK_MIN']
-                    inv_obj.stock_maximo = row['STOCK_MAX']
-                    inv_obj.punto_reorden = row['PUNTO_REORDEN']
-                    updates.append(inv_obj)
+            if actual:
+                pk, huella_actual, loc_actual, pendiente = actual
+                if huella_actual == huella:
+                    continue
+
+                loc_a_guardar = loc_actual if pendiente else nueva_loc
+                updates.append(InventarioArticulo(
+                    pk=pk,
+                    existencia=nueva_exist,
+                    localizacion=loc_a_guardar,
+                    localizacion_orden=calcular_localizacion_orden(loc_a_guardar),
+                    stock_minimo=row['STOCK_MIN'],
+                    stock_maximo=row['STOCK_MAX'],
+                    punto_reorden=row['PUNTO_REORDEN'],
+                    bajo_punto_reorden=calcular_bajo_punto_reorden(nueva_exist, row['STOCK_MIN'], row['PUNTO_REORDEN']),
+                    huella_sync=huella,
+                    fecha_ultima_modificacion_local=ahora
+                ))
             else:
                 creates.append(InventarioArticulo(
                     articulo_id=django_art_id,
                     almacen_id=django_alm_id,
                     existencia=nueva_exist,
                     localizacion=nueva_loc,
+                    localizacion_orden=calcular_localizacion_orden(nueva_loc),
                     stock_minimo=row['STOCK_MIN'],
                     stock_maximo=row['STOCK_MAX'],
-                    punto_reorden=row['PUNTO_REORDEN']
+                    punto_reorden=row['PUNTO_REORDEN'],
+                    bajo_punto_reorden=calcular_bajo_punto_reorden(nueva_exist, row['STOCK_MIN'], row['PUNTO_REORDEN']),
+                    huella_sync=huella
                 ))
 
+        return creates, updates
+
+    def _sincronizar_existencias_y_localizaciones(self, datos_msip, ahora=None):
+        log.debug("6. Sincronizando existencias en Django")
+        ahora = ahora or timezone.now()
+
+        map_articulos = dict(Articulo.objects.values_list('articulo_id_msip', 'pk'))
+        map_almacenes = dict(Almacen.objects.values_list('almacen_id_msip', 'pk'))
+        creates, updates = self._calcular_cambios_existencias(datos_msip, map_articulos, map_almacenes, ahora)
+
         if creates: InventarioArticulo.objects.bulk_create(creates, batch_size=2000)
-        if updates: InventarioArticulo.objects.bulk_update(updates, ['existencia', 'localizacion', 'stock_minimo', 'stock_maximo', 'punto_reorden'], batch_size=2000)
+        if updates: InventarioArticulo.objects.bulk_update(updates, ['existencia', 'localizacion', 'localizacion_orden', 'stock_minimo', 'stock_maximo', 'punto_reorden', 'bajo_punto_reorden', 'huella_sync', 'fecha_ultima_modificacion_local'], batch_size=2000)
         
         return len(creates) + len(updates)
 
+    def _calcular_costos(self, datos_msip, map_articulos):
+        """
+        Costo unitario por artículo: valor / existencia sumando los almacenes con existencia
+        valuada (CALC_EXIS_ARTALM regresa el valor total de la existencia, no el unitario).
+        Los artículos sin existencia valuada conservan su costo anterior.
+        Retorna [Articulo(pk, costo_ultimo)] solo de los que cambian.
+        """
+        existencias = defaultdict(Decimal)
+        valores = defaultdict(Decimal)
+        for row in datos_msip:
+            articulo_id = map_articulos.get(row['ARTICULO_ID'])
+            existencia = Decimal(str(row['EXISTENCIA'] or 0))
+            valor = Decimal(str(row.get('COSTO_TOTAL') or 0))
+            if not articulo_id or existencia <= 0 or valor <= 0:
+                continue
+            existencias[articulo_id] += existencia
+            valores[articulo_id] += valor
+
+        # En la simulación los artículos nuevos son 'nuevo:<id>' (costo actual 0)
+        costos_actuales = dict(Articulo.objects.filter(
+            pk__in=[pk for pk in existencias if not isinstance(pk, str)]
+        ).values_list('pk', 'costo_ultimo'))
+
+        cambios = []
+        for articulo_id, existencia in existencias.items():
+            costo = (valores[articulo_id] / existencia).quantize(Decimal('0.000001'))
+            if costos_actuales.get(articulo_id, Decimal('0')) != costo:
+                cambios.append(Articulo(pk=articulo_id, costo_ultimo=costo))
+        return cambios
+
+    def _sincronizar_costos(self, datos_msip):
+        log.debug("7. Sincronizando costos de artículos")
+        map_articulos = dict(Articulo.objects.values_list('articulo_id_msip', 'pk'))
+        cambios = self._calcular_costos(datos_msip, map_articulos)
+        # bulk_update no toca ultima_sincronizacion: el costo no entra al feed del catálogo
+        if cambios: Articulo.objects.bulk_update(cambios, ['costo_ultimo'], batch_size=2000)
+        return len(cambios)
+
     # -------------------------------------------------------------------------
     # ORQUESTADOR PRINCIPAL
     # -------------------------------------------------------------------------
 
-    @microsip_connect
-    def sincronizar_articulos(self):
-        print("--- INICIANDO ORQUESTADOR DE SINCRONIZACIÓN (MODO HÍBRIDO) ---")
-        bitacora = BitacoraSincronizacion.objects.create(status='EN_PROCESO')
-        log_buffer = []
+    def _reportar_avance(self, bitacora, etapa, **contadores):
+        """
+        Guarda la etapa actual y los contadores en la bitácora para que el endpoint
+        de progreso pueda consultarlos. Solo es visible para otros procesos si se
+        llama fuera de la transacción principal.
+        """
+        bitacora.etapa = etapa
+        for campo, valor in contadores.items():
+            setattr(bitacora, campo, valor)
+        bitacora.save(update_fields=['etapa', *contadores.keys()])
+
+    def sincronizar_articulos(self, bitacora=None, si_ocupado='omitir', simular=False, muestra=20):
+        """
+        Punto de entrada de la sincronización. Toma el bloqueo de sincronización
+        ANTES de conectar a Microsip. Si otra ejecución lo tiene:
+        - si_ocupado='omitir': no hace nada y la bitácora recibida queda como OMITIDO.
+        - si_ocupado='adjuntar': espera a que la otra ejecución termine y retorna su resultado.
+        Si se recibe una bitácora (creada por el endpoint que encola la tarea), se
+        reutiliza para reportar el avance.
+
+        simular=True: extrae y calcula el diff completo pero no escribe nada (ni bloqueo
+        ni bitácora). Retorna el resumen de _simular_sincronizacion.
+        """
+        if simular:
+            return self._simular_sincronizacion(muestra)
+
+        arrendamiento = ArrendamientoSincronizacion()
+        if not arrendamiento.adquirir(bitacora):
+            evento(
+                log, 'sync.omitida', "Sincronización omitida: ya hay una en curso",
+                bitacora_activa=arrendamiento.bitacora_activa_id, si_ocupado=si_ocupado
+            )
+            if si_ocupado == 'adjuntar':
+                return self._adjuntar_a_sincronizacion(arrendamiento, bitacora)
+            return self._omitir_sincronizacion(arrendamiento.bitacora_activa_id, bitacora)
 
         try:
-            articulos_msip, claves_msip, ids_activos = self.extraer_articulos_y_claves_msip()
-            bitacora.articulos_procesados = len(articulos_msip)
-
-            with transaction.atomic():
-                self._sincronizar_almacenes()
-                creados, actualizados = self._actualizar_articulos_django(articulos_msip, log_buffer)
-                desactivados = self._limpiar_articulos_obsoletos(ids_activos)
-                claves_creadas = self._sincronizar_claves_auxiliares(ids_activos, claves_msip)
-                inventarios_proc = self._sincronizar_existencias_y_localizaciones()
-
-            bitacora.articulos_creados = creados
-            bitacora.articulos_actualizados = actualizados
-            bitacora.articulos_desactivados = desactivados
-            bitacora.detalles = f"Sync OK. Inv: {inventarios_proc}. Claves: {claves_creadas}"
-            bitacora.status = 'EXITO'
+            return self._ejecutar_sincronizacion(arrendamiento, bitacora)
+        finally:
+            arrendamiento.liberar()
+
+    def _resultado_desde_bitacora(self, bitacora, omitida=False):
+        return {
+            "bitacora_id": bitacora.id if bitacora else None,
+            "omitida": omitida,
+            "articulos_creados": bitacora.articulos_creados if bitacora else 0,
+            "articulos_actualizados": bitacora.articulos_actualizados if bitacora else 0,
+            "inventarios_procesados": bitacora.inventarios_actualizados if bitacora else 0
+        }
+
+    def _omitir_sincronizacion(self, bitacora_activa_id, bitacora):
+        if bitacora is not None:
+            bitacora.status = 'OMITIDO'
+            bitacora.etapa = 'OMITIDO'
+            bitacora.detalles = f"Ya había una sincronización en curso (bitácora {bitacora_activa_id})."
             bitacora.fecha_fin = timezone.now()
             bitacora.save()
+        resultado = self._resultado_desde_bitacora(None, omitida=True)
+        resultado["bitacora_id"] = bitacora_activa_id
+        return resultado
 
-            print("--- SINCRONIZACIÓN EXITOSA ---")
-            return {
-                "articulos_creados": creados,
-                "articulos_actualizados": actualizados,
-                "inventarios_procesados": inventarios_proc
+    def _adjuntar_a_sincronizacion(self, arrendamiento, bitacora, intervalo=5):
+        """
+        Espera (polling) a que se libere el bloqueo y retorna el resultado de esa ejecución.
+        Si no se libera en SINCRONIZACION_LEASE['ESPERA_ADJUNTAR_SEGUNDOS'] lanza TimeoutError.
+        """
+        bitacora_activa_id = arrendamiento.bitacora_activa_id
+        limite = time.monotonic() + arrendamiento.espera_adjuntar
+        while ArrendamientoSincronizacion.bloqueo_activo(arrendamiento.nombre):
+            if time.monotonic() >= limite:
+                self._omitir_sincronizacion(bitacora_activa_id, bitacora)
+                raise TimeoutError(
+                    f"La sincronización en curso (bitácora {bitacora_activa_id}) no terminó "
+                    f"en {arrendamiento.espera_adjuntar} s."
+                )
+            time.sleep(intervalo)
+
+        self._omitir_sincronizacion(bitacora_activa_id, bitacora)
+        bitacora_activa = BitacoraSincronizacion.objects.filter(pk=bitacora_activa_id).first()
+        return self._resultado_desde_bitacora(bitacora_activa, omitida=True)
+
+    def _ejecutar_sincronizacion(self, arrendamiento, bitacora=None):
+        if bitacora is None:
+            bitacora = BitacoraSincronizacion.objects.create(status='EN_PROCESO')
+        else:
+            bitacora.status = 'EN_PROCESO'
+            bitacora.save(update_fields=['status'])
+        arrendamiento.asociar_bitacora(bitacora)
+        log_buffer = []
+        inicio = time.perf_counter()
+
+        with contexto_log(bitacora=bitacora.id):
+            evento(log, 'sync.inicio', "Iniciando orquestador de sincronización (modo híbrido)")
+            try:
+                self._reportar_avance(bitacora, 'EXTRAYENDO_ARTICULOS')
+                with medir(log, 'sync.etapa', "Artículos extraídos de Microsip", etapa='EXTRAYENDO_ARTICULOS') as campos:
+                    articulos_msip, claves_msip, ids_activos = self.extraer_articulos_y_claves_msip()
+                    campos['filas'] = len(articulos_msip)
+
+                arrendamiento.verificar()
+                self._reportar_avance(bitacora, 'EXTRAYENDO_EXISTENCIAS', articulos_procesados=len(articulos_msip))
+                with medir(log, 'sync.etapa', "Existencias extraídas de Microsip", etapa='EXTRAYENDO_EXISTENCIAS') as campos:
+                    existencias_msip = self.extraer_existencias_msip()
+                    campos['filas'] = len(existencias_msip)
+
+                # Las extracciones pueden tardar: antes de escribir se confirma (y renueva) el bloqueo
+                arrendamiento.verificar(renovar=True)
+                self._reportar_avance(bitacora, 'APLICANDO_CAMBIOS', existencias_procesadas=len(existencias_msip))
+                # Misma marca de tiempo para todas las filas de esta generación (ver feed de cambios)
+                ahora = timezone.now()
+                with medir(log, 'sync.etapa', "Cambios aplicados en Django", etapa='APLICANDO_CAMBIOS') as campos:
+                    with transaction.atomic():
+                        self._sincronizar_almacenes()
+                        creados, actualizados, ids_modificados = self._actualizar_articulos_django(articulos_msip, claves_msip, log_buffer, ahora)
+                        desactivados = self._limpiar_articulos_obsoletos(ids_activos, ahora)
+                        claves_creadas = self._sincronizar_claves_auxiliares(ids_modificados, claves_msip)
+                        inventarios_proc = self._sincronizar_existencias_y_localizaciones(existencias_msip, ahora)
+                        costos = self._sincronizar_costos(existencias_msip)
+                        # Si otra ejecución tomó el bloqueo mientras aplicábamos, se revierte todo
+                        arrendamiento.verificar()
+                    campos.update(
+                        articulos_creados=creados, articulos_actualizados=actualizados,
+                        articulos_desactivados=desactivados, claves_creadas=claves_creadas,
+                        inventarios=inventarios_proc, costos=costos
+                    )
+
+                bitacora.articulos_creados = creados
+                bitacora.articulos_actualizados = actualizados
+                bitacora.articulos_desactivados = desactivados
+                bitacora.inventarios_actualizados = inventarios_proc
+                bitacora.detalles = f"Sync OK. Inv: {inventarios_proc}. Claves: {claves_creadas}. Costos: {costos}"
+                bitacora.etapa = 'FINALIZADO'
+                bitacora.status = 'EXITO'
+                bitacora.fecha_fin = timezone.now()
+                bitacora.save()
+
+                evento(
+                    log, 'sync.fin', "Sincronización exitosa",
+                    duracion_ms=round((time.perf_counter() - inicio) * 1000, 1)
+                )
+                return self._resultado_desde_bitacora(bitacora)
+
+            except Exception as e:
+                error_msg = traceback.format_exc()
+                log.exception(
+                    "Error fatal en la sincronización: %s", e,
+                    extra={'evento': 'sync.error', 'campos': {'etapa': bitacora.etapa}}
+                )
+                bitacora.status = 'ERROR'
+                bitacora.mensaje_error = error_msg
+                bitacora.fecha_fin = timezone.now()
+                bitacora.save()
+                raise e
+
+    # -------------------------------------------------------------------------
+    # SIMULACIÓN (DRY-RUN)
+    # -------------------------------------------------------------------------
+
+    def _simular_sincronizacion(self, muestra=20):
+        """
+        Corre la extracción y los mismos _calcular_cambios_* que la sincronización real,
+        sin escribir en Django. Los artículos y almacenes que se crearían no tienen pk:
+        se representan con 'nuevo:<id Microsip>' para que el diff de claves y existencias
+        los cuente igual que la sincronización real (que los crea antes de esos pasos).
+
+        Retorna los conteos por paso y, con muestra > 0, hasta `muestra` filas de cada tipo.
+        """
+        inicio = time.perf_counter()
+        ahora = timezone.now()
+
+        with contexto_log(simulacion=True):
+            articulos_msip, claves_msip, ids_activos = self.extraer_articulos_y_claves_msip()
+            almacenes_msip = self.extraer_almacenes_msip()
+            existencias_msip = self.extraer_existencias_msip()
+
+            # 2. Almacenes
+            almacenes_nuevos, almacenes_renombrados, ids_almacenes = self._calcular_cambios_almacenes(almacenes_msip)
+            almacenes_desactivados = Almacen.objects.filter(activo_web=True).exclude(almacen_id_msip__in=ids_almacenes)
+
+            # 3. y 4. Artículos
+            a_crear, a_actualizar, ids_modificados, renombrados = self._calcular_cambios_articulos(
+                articulos_msip, claves_msip, [], ahora
+            )
+            obsoletos = self._articulos_obsoletos(ids_activos) if ids_activos else Articulo.objects.none()
+
+            map_articulos = dict(Articulo.objects.values_list('articulo_id_msip', 'pk'))
+            ids_nuevos = {articulo.articulo_id_msip for articulo in a_crear}
+            map_articulos.update({msip_id: f"nuevo:{msip_id}" for msip_id in ids_nuevos})
+            map_almacenes = dict(Almacen.objects.values_list('almacen_id_msip', 'pk'))
+            map_almacenes.update({msip_id: f"nuevo:{msip_id}" for msip_id, _ in almacenes_nuevos})
+
+            # 5. Claves auxiliares: se reescriben completas, se reporta la diferencia real
+            claves_nuevas = set(self._calcular_claves_auxiliares(ids_modificados, claves_msip, map_articulos))
+            claves_actuales = set(ClaveAuxiliar.objects.filter(
+                articulo_id__in=[map_articulos[msip_id] for msip_id in ids_modificados - ids_nuevos if msip_id in map_articulos]
+            ).values_list('articulo_id', 'clave'))
+            claves_agregadas = claves_nuevas - claves_actuales
+            claves_eliminadas = claves_actuales - claves_nuevas
+
+            # 6. Existencias
+            creates, updates = self._calcular_cambios_existencias(existencias_msip, map_articulos, map_almacenes, ahora)
+            costos = self._calcular_costos(existencias_msip, map_articulos)
+
+            resumen = {
+                "simulacion": True,
+                "fecha": ahora,
+                "almacenes": {
+                    "nuevos": len(almacenes_nuevos),
+                    "renombrados": len(almacenes_renombrados),
+                    "desactivados": almacenes_desactivados.count()
+                },
+                "articulos": {
+                    "nuevos": len(a_crear),
+                    "actualizados": len(a_actualizar),
+                    "renombrados_dup": len(renombrados),
+                    "desactivados": obsoletos.count(),
+                    "costos_actualizados": len(costos)
+                },
+                "claves_auxiliares": {
+                    "agregadas": len(claves_agregadas),
+                    "eliminadas": len(claves_eliminadas)
+                },
+                "existencias": {
+                    "nuevas": len(creates),
+                    "modificadas": len(updates)
+                }
             }
+            if muestra:
+                resumen["muestra"] = self._muestra_simulacion(
+                    muestra, map_articulos, map_almacenes, a_crear, a_actualizar, renombrados, obsoletos,
+                    claves_agregadas, claves_eliminadas, creates, updates
+                )
+            resumen["duracion_ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+
+            evento(
+                log, 'sync.simulacion', "Simulación de sincronización terminada",
+                articulos_nuevos=len(a_crear), articulos_actualizados=len(a_actualizar),
+                existencias_modificadas=len(updates), duracion_ms=resumen["duracion_ms"]
+            )
+        return resumen
 
-        except Exception as e:
-            error_msg = traceback.format_exc()
-            print(f"!!! ERROR FATAL !!!: {e}")
-            bitacora.status = 'ERROR'
-            bitacora.mensaje_error = error_msg
-            bitacora.fecha_fin = timezone.now()
-            bitacora.save()
-            raise e
\ No newline at end of file
+    def _muestra_simulacion(self, muestra, map_articulos, map_almacenes, a_crear, a_actualizar, renombrados,
+                            obsoletos, claves_agregadas, claves_eliminadas, creates, updates):
+        """Primeras `muestra` filas de cada cambio, con el valor actual junto al nuevo."""
+        msip_por_articulo = {pk: msip_id for msip_id, pk in map_articulos.items()}
+        msip_por_almacen = {pk: msip_id for msip_id, pk in map_almacenes.items()}
+
+        articulos_actuales = Articulo.objects.in_bulk([articulo.pk for articulo in a_actualizar[:muestra]])
+        inventario_actual = InventarioArticulo.objects.select_related('articulo', 'almacen').in_bulk(
+            [inventario.pk for inventario in updates[:muestra]]
+        )
+
+        def _claves(claves):
+            return [
+                {"articulo_id_msip": msip_por_articulo.get(articulo_id), "clave": clave}
+                for articulo_id, clave in sorted(claves, key=str)[:muestra]
+            ]
+
+        return {
+            "articulos_nuevos": [
+                {"articulo_id_msip": articulo.articulo_id_msip, "clave": articulo.clave, "nombre": articulo.nombre}
+                for articulo in a_crear[:muestra]
+            ],
+            "articulos_actualizados": [
+                {
+                    "articulo_id_msip": articulo.articulo_id_msip,
+                    "clave_actual": articulos_actuales[articulo.pk].clave,
+                    "clave": articulo.clave,
+                    "nombre_actual": articulos_actuales[articulo.pk].nombre,
+                    "nombre": articulo.nombre,
+                    "reactivado": not articulos_actuales[articulo.pk].activo
+                }
+                for articulo in a_actualizar[:muestra]
+            ],
+            "articulos_renombrados_dup": [
+                {"articulo_id_msip": msip_id, "clave": clave, "clave_nueva": clave_nueva}
+                for msip_id, clave, clave_nueva in renombrados[:muestra]
+            ],
+            "articulos_desactivados": list(obsoletos.values('articulo_id_msip', 'clave', 'nombre')[:muestra]),
+            "claves_agregadas": _claves(claves_agregadas),
+            "claves_eliminadas": _claves(claves_eliminadas),
+            "existencias_nuevas": [
+                {
+                    "articulo_id_msip": msip_por_articulo.get(inventario.articulo_id),
+                    "almacen_id_msip": msip_por_almacen.get(inventario.almacen_id),
+                    "existencia": inventario.existencia,
+                    "localizacion": inventario.localizacion
+                }
+                for inventario in creates[:muestra]
+            ],
+            "existencias_modificadas": [
+                {
+                    "clave": inventario_actual[inventario.pk].articulo.clave,
+                    "almacen": inventario_actual[inventario.pk].almacen.nombre,
+                    "existencia_actual": inventario_actual[inventario.pk].existencia,
+                    "existencia": inventario.existencia,
+                    "localizacion_actual": inventario_actual[inventario.pk].localizacion,
+                    "localizacion": inventario.localizacion
+                }
+                for inventario in updates[:muestra]
+            ]
+        }
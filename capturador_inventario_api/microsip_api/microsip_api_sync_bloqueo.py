@@ -0,0 +1,129 @@
+import threading
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from capturador_inventario_api.models import BloqueoSincronizacion
+from capturador_inventario_api.registro_eventos import obtener_logger
+
+log = obtener_logger('sync')
+
+NOMBRE_BLOQUEO_SYNC = 'sincronizacion_microsip'
+
+# Valores por defecto si settings.SINCRONIZACION_LEASE no está definido
+DURACION_DEFECTO = 120
+HEARTBEAT_DEFECTO = 30
+ESPERA_ADJUNTAR_DEFECTO = 3600
+
+
+class ArrendamientoPerdido(Exception):
+    """El bloqueo expiró (sin heartbeat a tiempo) y otra ejecución pudo tomarlo."""
+
+
+class ArrendamientoSincronizacion:
+    """
+    Lease sobre una fila de BloqueoSincronizacion (SELECT ... FOR UPDATE).
+
+    - adquirir(): toma el bloqueo si está libre o expirado.
+    - Mientras se tiene, un hilo renueva 'expira' cada HEARTBEAT segundos
+      usando su propia conexión (la transacción principal del sync no lo bloquea).
+    - liberar(): lo deja libre. Si el proceso muere sin liberar, el bloqueo
+      expira solo después de DURACION segundos sin heartbeat.
+    - verificar(): quien tiene el bloqueo la llama entre etapas; lanza
+      ArrendamientoPerdido si ya no es suyo para que deje de escribir.
+    """
+
+    def __init__(self, nombre=NOMBRE_BLOQUEO_SYNC):
+        config = getattr(settings, 'SINCRONIZACION_LEASE', {})
+        self.nombre = nombre
+        self.duracion = timedelta(seconds=config.get('DURACION_SEGUNDOS', DURACION_DEFECTO))
+        self.intervalo = config.get('HEARTBEAT_SEGUNDOS', HEARTBEAT_DEFECTO)
+        self.espera_adjuntar = config.get('ESPERA_ADJUNTAR_SEGUNDOS', ESPERA_ADJUNTAR_DEFECTO)
+        self.token = uuid.uuid4().hex
+        self.adquirido = False
+        self.perdido = False
+        self.bitacora_activa_id = None  # Bitácora del dueño actual si no pudimos adquirir
+        self._detener = threading.Event()
+        self._hilo = None
+
+    @staticmethod
+    def bloqueo_activo(nombre=NOMBRE_BLOQUEO_SYNC):
+        """Retorna la fila del bloqueo si alguien lo tiene vigente, o None."""
+        return BloqueoSincronizacion.objects.filter(
+            nombre=nombre,
+            expira__gt=timezone.now()
+        ).exclude(propietario='').first()
+
+    def adquirir(self, bitacora=None):
+        with transaction.atomic():
+            bloqueo, _ = BloqueoSincronizacion.objects.select_for_update().get_or_create(nombre=self.nombre)
+            ahora = timezone.now()
+
+            if bloqueo.propietario and bloqueo.expira and bloqueo.expira > ahora:
+                self.bitacora_activa_id = bloqueo.bitacora_id
+                return False
+
+            bloqueo.propietario = self.token
+            bloqueo.bitacora = bitacora
+            bloqueo.adquirido_en = ahora
+            bloqueo.heartbeat = ahora
+            bloqueo.expira = ahora + self.duracion
+            bloqueo.save()
+
+        self.adquirido = True
+        self._iniciar_heartbeat()
+        return True
+
+    def asociar_bitacora(self, bitacora):
+        """Registra en el bloqueo la bitácora de la ejecución (para quienes quieran adjuntarse)."""
+        BloqueoSincronizacion.objects.filter(nombre=self.nombre, propietario=self.token).update(bitacora=bitacora)
+
+    def renovar(self):
+        ahora = timezone.now()
+        renovados = BloqueoSincronizacion.objects.filter(
+            nombre=self.nombre, propietario=self.token
+        ).update(heartbeat=ahora, expira=ahora + self.duracion)
+        if not renovados:
+            # Otro proceso tomó el bloqueo porque dejamos de renovarlo a tiempo
+            self.perdido = True
+        return bool(renovados)
+
+    def verificar(self, renovar=False):
+        """
+        Lanza ArrendamientoPerdido si el heartbeat perdió el bloqueo. Con renovar=True
+        además lo renueva en este momento (antes de una etapa larga o de confirmar cambios).
+        """
+        if not self.perdido and renovar:
+            self.renovar()
+        if self.perdido:
+            raise ArrendamientoPerdido(f"Se perdió el bloqueo '{self.nombre}'; otra sincronización pudo tomarlo.")
+
+    def liberar(self):
+        self._detener.set()
+        if self._hilo:
+            self._hilo.join(timeout=self.intervalo)
+        if self.adquirido:
+            BloqueoSincronizacion.objects.filter(nombre=self.nombre, propietario=self.token).update(
+                propietario='', bitacora=None, expira=None
+            )
+            self.adquirido = False
+
+    def _iniciar_heartbeat(self):
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._latido, name=f"heartbeat-{self.nombre}", daemon=True)
+        self._hilo.start()
+
+    def _latido(self):
+        try:
+            while not self._detener.wait(self.intervalo):
+                if not self.renovar():
+                    break
+        except Exception as e:
+            # Sin heartbeat el bloqueo va a expirar: se da por perdido
+            self.perdido = True
+            log.warning("Fallo el heartbeat del bloqueo '%s': %s", self.nombre, e)
+        finally:
+            # Cada hilo tiene su propia conexión en Django; la cerramos al terminar
+            connection.close()
@@ -0,0 +1,48 @@
+from django.conf import settings
+
+
+class TransporteMicrosip:
+    """
+    Interfaz de transporte hacia la API de Microsip.
+
+    Un transporte expone las funciones de ApiMicrosip.dll que usa el proyecto
+    (ver FUNCIONES) con la misma firma y los mismos códigos de retorno (0 = éxito).
+    Hay dos implementaciones:
+    - TransporteDLL: la DLL real cargada con ctypes (solo Windows, Python 32-bit).
+    - MicrosipDLLSimulada: Python puro, para pruebas y equipos sin Windows.
+    """
+
+    FUNCIONES = (
+        # API Básica
+        'inSetErrorHandling', 'inGetLastErrorMessage', 'GetLastErrorCode',
+        'NewDB', 'NewTrn', 'NewSql', 'DBConnect', 'DBDisconnect', 'SetDBInventarios',
+        'SqlQry', 'SqlExecQuery', 'SqlClose',
+        # API Inventarios
+        'NuevaEntrada', 'RenglonEntrada', 'RenglonEntradaLotes', 'RenglonEntradaSeries', 'AplicaEntrada',
+        'NuevaSalida', 'RenglonSalida', 'AplicaSalida',
+        'AbortaDoctoInventarios',
+    )
+
+
+class TransporteDLL(TransporteMicrosip):
+    """Transporte real: delega cada llamada en la DLL cargada con ctypes."""
+
+    def __init__(self, dll):
+        self._dll = dll
+
+    def __getattr__(self, nombre):
+        return getattr(self._dll, nombre)
+
+
+def obtener_transporte():
+    """
+    Crea el transporte configurado en MICROSIP_CONFIG.
+    La DLL real solo se importa aquí, así que los módulos de conexión se pueden
+    importar en Linux cuando se usa la DLL simulada.
+    """
+    if settings.MICROSIP_CONFIG.get('USAR_DLL_SIMULADA', False):
+        from .microsip_api_stub import MicrosipDLLSimulada
+        return MicrosipDLLSimulada()
+
+    from .microsip_api import cargar_dll
+    return TransporteDLL(cargar_dll())
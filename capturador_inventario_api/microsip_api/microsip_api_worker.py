@@ -0,0 +1,181 @@
+"""
+Proceso dedicado dueño de la DLL de Microsip.
+
+La DLL no es thread-safe, así que en lugar de limitar todo el servidor a un hilo,
+un único proceso (este) hace TODAS las llamadas a la DLL desde un solo hilo y el
+resto (waitress con varios hilos, workers de Django-Q) le envía solicitudes por
+una cola IPC local (multiprocessing.connection sobre 127.0.0.1 con authkey).
+
+Iniciar:
+    python -m capturador_inventario_api.microsip_api.microsip_api_worker
+o lo inicia run_server.py si MICROSIP_WORKER['HABILITADO'] es True.
+"""
+import os
+import pickle
+from multiprocessing.connection import Listener, Client
+
+from django.conf import settings
+
+from capturador_inventario_api.registro_eventos import obtener_logger
+
+log = obtener_logger('dll')
+
+# True dentro del proceso dueño de la DLL (evita que se reenvíe a sí mismo)
+_es_proceso_dll = False
+
+TIMEOUT_DEFECTO = 600
+
+
+def _config():
+    return getattr(settings, 'MICROSIP_WORKER', {})
+
+
+def _direccion():
+    config = _config()
+    return (config.get('HOST', '127.0.0.1'), config.get('PUERTO', 8765))
+
+
+def _authkey():
+    config = _config()
+    return (config.get('AUTHKEY') or settings.SECRET_KEY).encode('utf-8')
+
+
+def worker_dll_habilitado():
+    """True si las llamadas a la DLL se deben enviar al proceso dedicado."""
+    return _config().get('HABILITADO', False) and not _es_proceso_dll
+
+
+# -------------------------------------------------------------------------
+# OPERACIONES EXPUESTAS POR EL WORKER
+# -------------------------------------------------------------------------
+
+def _op_ping():
+    return 'pong'
+
+
+def _op_enviar_documentos_pendientes():
+    from .microsip_api_envio_conteos import EnvioConteosService
+    return EnvioConteosService().enviar_documentos_pendientes()
+
+
+def _op_registrar_entrada_msip(encabezado_data, renglones_data):
+    from .microsip_api_connection import MicrosipConnectionBase
+    return MicrosipConnectionBase().registrar_entrada_msip(encabezado_data, renglones_data)
+
+
+def _op_diagnostico_sql():
+    from .microsip_api_connection import MicrosipConnectionBase
+    servicio = MicrosipConnectionBase()
+    servicio.conectar()
+    return servicio.diagnostico_sql()
+
+
+OPERACIONES = {
+    'ping': _op_ping,
+    'enviar_documentos_pendientes': _op_enviar_documentos_pendientes,
+    'registrar_entrada_msip': _op_registrar_entrada_msip,
+    'diagnostico_sql': _op_diagnostico_sql,
+}
+
+
+# -------------------------------------------------------------------------
+# SERVIDOR (proceso dueño de la DLL)
+# -------------------------------------------------------------------------
+
+def _atender(operacion, args, kwargs):
+    from django.db import close_old_connections
+    from .microsip_api_connection import MicrosipAPIError
+
+    funcion = OPERACIONES.get(operacion)
+    if funcion is None:
+        return ('error', 'ValueError', f"Operación desconocida: {operacion}", None)
+
+    close_old_connections()
+    try:
+        return ('ok', funcion(*args, **kwargs))
+    except MicrosipAPIError as e:
+        return ('error', 'MicrosipAPIError', str(e), {
+            'api_error_code': e.api_error_code,
+            'api_function': e.api_function,
+            'basic_error_code': e.basic_error_code,
+        })
+    except Exception as e:
+        return ('error', type(e).__name__, str(e), None)
+    finally:
+        close_old_connections()
+
+
+def iniciar_servidor_dll():
+    """Atiende solicitudes una por una en el hilo principal (único hilo que toca la DLL)."""
+    global _es_proceso_dll
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "capturador_inventario_api.settings")
+    import django
+    django.setup()
+
+    _es_proceso_dll = True
+    direccion = _direccion()
+    log.info("Worker DLL Microsip escuchando en %s:%s", direccion[0], direccion[1])
+
+    with Listener(direccion, authkey=_authkey()) as listener:
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                log.warning("Conexión rechazada en el worker DLL: %s", e)
+                continue
+
+            # Un cliente que se desconecta o manda basura no debe tumbar el worker
+            # (nadie lo reinicia): se registra y se atiende la siguiente conexión
+            with conn:
+                try:
+                    operacion, args, kwargs = conn.recv()
+                except EOFError:
+                    continue
+                except (OSError, pickle.UnpicklingError, ValueError, TypeError) as e:
+                    log.warning("Solicitud inválida en el worker DLL: %s", e)
+                    continue
+
+                respuesta = _atender(operacion, args, kwargs)
+                try:
+                    conn.send(respuesta)
+                except OSError as e:
+                    # El cliente ya se fue (p. ej. venció su timeout); la operación sí se ejecutó
+                    log.warning("No se pudo responder '%s' al cliente del worker DLL: %s", operacion, e)
+                except (pickle.PicklingError, TypeError, AttributeError) as e:
+                    log.warning("Respuesta de '%s' no serializable: %s", operacion, e)
+                    try:
+                        conn.send(('error', type(e).__name__, f"Respuesta no serializable: {e}", None))
+                    except OSError:
+                        pass
+
+
+# -------------------------------------------------------------------------
+# CLIENTE (web / Django-Q)
+# -------------------------------------------------------------------------
+
+class ClienteDLL:
+    """Envía una operación al worker DLL y espera su resultado."""
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout or _config().get('TIMEOUT_SEGUNDOS', TIMEOUT_DEFECTO)
+
+    def llamar(self, operacion, *args, **kwargs):
+        from .microsip_api_connection import MicrosipAPIError
+
+        with Client(_direccion(), authkey=_authkey()) as conn:
+            conn.send((operacion, args, kwargs))
+            if not conn.poll(self.timeout):
+                raise TimeoutError(f"El worker DLL no respondió '{operacion}' en {self.timeout} s.")
+            respuesta = conn.recv()
+
+        if respuesta[0] == 'ok':
+            return respuesta[1]
+
+        _, tipo, mensaje, detalles = respuesta
+        if tipo == 'MicrosipAPIError':
+            raise MicrosipAPIError(mensaje, **detalles)
+        raise RuntimeError(f"Error en worker DLL ({tipo}): {mensaje}")
+
+
+if __name__ == '__main__':
+    iniciar_servidor_dll()
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-19 00:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('capturador_inventario_api', '0002_ticketsalida'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='articulo',
+            name='huella_sync',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Hash de los campos sincronizados desde Microsip (clave, nombre, seguimiento y claves auxiliares)', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='inventarioarticulo',
+            name='huella_sync',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Hash de la última fila de existencias leída de Microsip', max_length=32),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.0.2 on 2026-10-19 00:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('capturador_inventario_api', '0003_huella_sync'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bitacorasincronizacion',
+            name='etapa',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+        migrations.AddField(
+            model_name='bitacorasincronizacion',
+            name='existencias_procesadas',
+            field=models.IntegerField(default=0, help_text='Filas de existencias leídas de Microsip'),
+        ),
+        migrations.AddField(
+            model_name='bitacorasincronizacion',
+            name='inventarios_actualizados',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='bitacorasincronizacion',
+            name='solicitado_por',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sincronizaciones_solicitadas', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='bitacorasincronizacion',
+            name='task_id',
+            field=models.CharField(blank=True, help_text='ID de la tarea en Django-Q', max_length=64, null=True),
+        ),
+        migrations.AlterField(
+            model_name='bitacorasincronizacion',
+            name='status',
+            field=models.CharField(choices=[('EN_COLA', 'En Cola'), ('EN_PROCESO', 'En Proceso'), ('EXITO', 'Éxito'), ('ERROR', 'Error')], default='EN_PROCESO', max_length=20),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.2 on 2026-10-19 00:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('capturador_inventario_api', '0004_bitacora_progreso'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bitacorasincronizacion',
+            name='status',
+            field=models.CharField(choices=[('EN_COLA', 'En Cola'), ('EN_PROCESO', 'En Proceso'), ('EXITO', 'Éxito'), ('ERROR', 'Error'), ('OMITIDO', 'Omitido')], default='EN_PROCESO', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='BloqueoSincronizacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True)),
+                ('propietario', models.CharField(blank=True, default='', help_text='Token del proceso que tiene el bloqueo (vacío = libre)', max_length=64)),
+                ('adquirido_en', models.DateTimeField(blank=True, null=True)),
+                ('heartbeat', models.DateTimeField(blank=True, null=True)),
+                ('expira', models.DateTimeField(blank=True, null=True)),
+                ('bitacora', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='capturador_inventario_api.bitacorasincronizacion')),
+            ],
+            options={
+                'verbose_name': 'Bloqueo de Sincronización',
+                'verbose_name_plural': 'Bloqueos de Sincronización',
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.2 on 2026-10-19 00:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('capturador_inventario_api', '0005_bloqueo_sincronizacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentoMicrosip',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('tipo', models.CharField(choices=[('ENTRADA', 'Entrada'), ('SALIDA', 'Salida')], max_length=10)),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('APLICADO', 'Aplicado'), ('ERROR', 'Error')], db_index=True, default='PENDIENTE', max_length=10)),
+                ('descripcion', models.CharField(blank=True, default='', max_length=200)),
+                ('renglones', models.JSONField(default=list)),
+                ('intentos', models.IntegerField(default=0)),
+                ('ultimo_error', models.TextField(blank=True, null=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_aplicacion', models.DateTimeField(blank=True, null=True)),
+                ('almacen', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='documentos_microsip', to='capturador_inventario_api.almacen')),
+                ('capturas', models.ManyToManyField(blank=True, related_name='documentos_microsip', to='capturador_inventario_api.captura')),
+            ],
+            options={
+                'verbose_name': 'Documento Microsip',
+                'verbose_name_plural': 'Documentos Microsip',
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Índice FULLTEXT para la búsqueda de artículos por nombre/clave (solo MariaDB/MySQL).
+# En otros motores no hace nada; la vista usa búsqueda con icontains como respaldo.
+
+from django.db import migrations
+
+INDICE = 'ft_articulo_clave_nombre'
+
+
+def crear_indice_fulltext(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    tabla = apps.get_model('capturador_inventario_api', 'Articulo')._meta.db_table
+    schema_editor.execute(f"CREATE FULLTEXT INDEX {INDICE} ON {tabla} (clave, nombre)")
+
+
+def eliminar_indice_fulltext(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    tabla = apps.get_model('capturador_inventario_api', 'Articulo')._meta.db_table
+    schema_editor.execute(f"DROP INDEX {INDICE} ON {tabla}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('capturador_inventario_api', '0006_documento_microsip'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice_fulltext, eliminar_indice_fulltext),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.2 on 2026-10-19 00:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('capturador_inventario_api', '0007_articulo_fulltext'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotCatalogo',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('archivo', models.FileField(upload_to='catalogos/')),
+                ('etag', models.CharField(db_index=True, max_length=64)),
+                ('tamano_bytes', models.BigIntegerField(default=0)),
+                ('total_articulos', models.IntegerField(default=0)),
+                ('fecha_generacion', models.DateTimeField(auto_now_add=True)),
+                ('almacen', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots_catalogo', to='capturador_inventario_api.almacen')),
+                ('bitacora', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='capturador_inventario_api.bitacorasincronizacion')),
+            ],
+            options={
+                'verbose_name': 'Snapshot de Catálogo',
+                'verbose_name_plural': 'Snapshots de Catálogo',
+                'ordering': ['-fecha_generacion'],
+            },
+        ),
+    ]
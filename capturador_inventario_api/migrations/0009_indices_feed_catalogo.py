@@ -0,0 +1,21 @@
+# Generated by Django 5.0.2 on 2026-10-19 00:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('capturador_inventario_api', '0008_snapshot_catalogo'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='articulo',
+            index=models.Index(fields=['ultima_sincronizacion'], name='capturador__ultima__6a5f9b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventarioarticulo',
+            index=models.Index(fields=['almacen', 'fecha_ultima_modificacion_local'], name='capturador__almacen_256668_idx'),
+        ),
+    ]
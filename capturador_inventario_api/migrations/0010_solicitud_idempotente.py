@@ -0,0 +1,35 @@
+# Generated by Django 5.0.2 on 2026-10-19 00:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('capturador_inventario_api', '0009_indices_feed_catalogo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SolicitudIdempotente',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('dispositivo', models.CharField(help_text='Header X-Device-Id (o el usuario si no se envía)', max_length=64)),
+                ('llave', models.CharField(help_text='Header Idempotency-Key', max_length=64)),
+                ('ruta', models.CharField(max_length=200)),
+                ('huella_solicitud', models.CharField(help_text='SHA-256 de ruta + cuerpo, para detectar llaves reutilizadas', max_length=64)),
+                ('codigo_respuesta', models.IntegerField(blank=True, null=True)),
+                ('respuesta', models.JSONField(blank=True, null=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Solicitud Idempotente',
+                'verbose_name_plural': 'Solicitudes Idempotentes',
+                'unique_together': {('dispositivo', 'llave')},
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.2 on 2026-10-19 00:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('capturador_inventario_api', '0010_solicitud_idempotente'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CargaCaptura',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('total_fragmentos', models.IntegerField()),
+                ('estado', models.CharField(choices=[('ABIERTA', 'Abierta'), ('CONFIRMADA', 'Confirmada'), ('CANCELADA', 'Cancelada')], default='ABIERTA', max_length=20)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_confirmacion', models.DateTimeField(blank=True, null=True)),
+                ('captura', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cargas', to='capturador_inventario_api.captura')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Carga de Captura',
+                'verbose_name_plural': 'Cargas de Captura',
+            },
+        ),
+        migrations.CreateModel(
+            name='FragmentoCarga',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero', models.IntegerField()),
+                ('renglones', models.JSONField(default=list)),
+                ('fecha_recepcion', models.DateTimeField(auto_now=True)),
+                ('carga', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fragmentos', to='capturador_inventario_api.cargacaptura')),
+            ],
+            options={
+                'unique_together': {('carga', 'numero')},
+            },
+        ),
+    ]
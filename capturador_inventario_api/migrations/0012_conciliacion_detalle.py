@@ -0,0 +1,71 @@
+# Generated by Django 5.0.2 on 2026-10-19 00:50
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+
+def conciliar_capturas_confirmadas(apps, schema_editor):
+    # Las capturas ya confirmadas/procesadas quedan con sus columnas calculadas.
+    # Copia de conciliacion.conciliar_detalles al momento de esta migración (no se
+    # importa el código de la app para que cambios futuros no rompan migrate)
+    Articulo = apps.get_model('capturador_inventario_api', 'Articulo')
+    DetalleCaptura = apps.get_model('capturador_inventario_api', 'DetalleCaptura')
+    TicketSalida = apps.get_model('capturador_inventario_api', 'TicketSalida')
+    decimal_cantidad = DecimalField(max_digits=18, decimal_places=5)
+    decimal_costo = DecimalField(max_digits=18, decimal_places=6)
+
+    tickets = TicketSalida.objects.filter(detalle=OuterRef('pk')).values('detalle').annotate(
+        total=Sum('cantidad')
+    ).values('total')
+    costo = Articulo.objects.filter(pk=OuterRef('articulo_id')).values('costo_ultimo')[:1]
+    diferencia = ExpressionWrapper(
+        F('cantidad_contada') - F('existencia_sistema_al_momento'), output_field=decimal_cantidad
+    )
+
+    DetalleCaptura.objects.filter(captura__estado__in=['CONFIRMADO', 'PROCESADO']).update(
+        total_tickets=Coalesce(Subquery(tickets, output_field=decimal_cantidad), Value(Decimal('0')), output_field=decimal_cantidad),
+        diferencia=diferencia,
+        diferencia_valor=ExpressionWrapper(
+            diferencia * Coalesce(Subquery(costo, output_field=decimal_costo), Value(Decimal('0')), output_field=decimal_costo),
+            output_field=decimal_costo
+        ),
+        estatus_conciliacion=Case(
+            When(cantidad_contada__gt=F('existencia_sistema_al_momento'), then=Value('SOBRANTE')),
+            When(cantidad_contada__lt=F('existencia_sistema_al_momento'), then=Value('FALTANTE')),
+            default=Value('EXACTO')
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('capturador_inventario_api', '0011_carga_captura_fragmentos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detallecaptura',
+            name='diferencia',
+            field=models.DecimalField(blank=True, decimal_places=5, max_digits=18, null=True),
+        ),
+        migrations.AddField(
+            model_name='detallecaptura',
+            name='diferencia_valor',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=18, null=True),
+        ),
+        migrations.AddField(
+            model_name='detallecaptura',
+            name='estatus_conciliacion',
+            field=models.CharField(blank=True, choices=[('EXACTO', 'Exacto'), ('SOBRANTE', 'Sobrante'), ('FALTANTE', 'Faltante')], db_index=True, max_length=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='detallecaptura',
+            name='total_tickets',
+            field=models.DecimalField(blank=True, decimal_places=5, max_digits=18, null=True),
+        ),
+        migrations.RunPython(conciliar_capturas_confirmadas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.0.2 on 2026-10-19 00:52
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def calcular_totales_existentes(apps, schema_editor):
+    # Copia de totales_captura.recalcular_totales al momento de esta migración (no se
+    # importa el código de la app para que cambios futuros no rompan migrate)
+    Captura = apps.get_model('capturador_inventario_api', 'Captura')
+    DetalleCaptura = apps.get_model('capturador_inventario_api', 'DetalleCaptura')
+    TicketSalida = apps.get_model('capturador_inventario_api', 'TicketSalida')
+    decimal = DecimalField(max_digits=18, decimal_places=5)
+
+    detalles = DetalleCaptura.objects.filter(captura=OuterRef('pk')).order_by().values('captura')
+    tickets = TicketSalida.objects.filter(detalle__captura=OuterRef('pk')).order_by().values('detalle__captura')
+    cero = Value(Decimal('0'))
+
+    Captura.objects.update(
+        total_renglones=Coalesce(
+            Subquery(detalles.annotate(n=Count('id')).values('n'), output_field=IntegerField()), Value(0)
+        ),
+        total_unidades=Coalesce(
+            Subquery(detalles.annotate(s=Sum('cantidad_contada')).values('s'), output_field=decimal), cero,
+            output_field=decimal
+        ),
+        renglones_con_diferencia=Coalesce(
+            Subquery(
+                detalles.exclude(cantidad_contada=F('existencia_sistema_al_momento')).annotate(n=Count('id')).values('n'),
+                output_field=IntegerField()
+            ), Value(0)
+        ),
+        total_tickets=Coalesce(
+            Subquery(tickets.annotate(s=Sum('cantidad')).values('s'), output_field=decimal), cero,
+            output_field=decimal
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('capturador_inventario_api', '0012_conciliacion_detalle'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='captura',
+            name='renglones_con_diferencia',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='captura',
+            name='total_renglones',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='captura',
+            name='total_tickets',
+            field=models.DecimalField(decimal_places=5, default=0, max_digits=18),
+        ),
+        migrations.AddField(
+            model_name='captura',
+            name='total_unidades',
+            field=models.DecimalField(decimal_places=5, default=0, max_digits=18),
+        ),
+        migrations.RunPython(calcular_totales_existentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.2 on 2026-10-19 00:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('capturador_inventario_api', '0013_totales_captura'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='captura',
+            name='estado_no_contados',
+            field=models.CharField(blank=True, choices=[('EN_COLA', 'En Cola'), ('EN_PROCESO', 'En Proceso'), ('LISTO', 'Listo'), ('ERROR', 'Error')], default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='captura',
+            name='fecha_no_contados',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ArticuloNoContado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('localizacion', models.CharField(blank=True, default='', max_length=50)),
+                ('existencia', models.DecimalField(decimal_places=5, default=0, max_digits=18)),
+                ('articulo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='capturador_inventario_api.articulo')),
+                ('captura', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='no_contados', to='capturador_inventario_api.captura')),
+            ],
+            options={
+                'verbose_name': 'Artículo no contado',
+                'verbose_name_plural': 'Artículos no contados',
+                'indexes': [models.Index(fields=['captura', 'localizacion'], name='capturador__captura_16c7df_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.0.2 on 2026-10-19 00:54
+
+import re
+
+from django.db import migrations, models
+
+_SEGMENTOS_LOCALIZACION = re.compile(r'\d+|[^\W\d_]+')
+
+
+def calcular_localizacion_orden(localizacion):
+    # Copia de models.calcular_localizacion_orden al momento de esta migración (no se
+    # importa el código de la app para que cambios futuros no rompan migrate)
+    segmentos = _SEGMENTOS_LOCALIZACION.findall((localizacion or '').upper())
+    if not segmentos:
+        return '1'
+    return '0.' + '.'.join(s.zfill(6) if s.isdigit() else s for s in segmentos)[:253]
+
+
+def calcular_llaves_existentes(apps, schema_editor):
+    # Un UPDATE por localización distinta (son pocas comparadas con las filas)
+    for nombre in ('InventarioArticulo', 'ArticuloNoContado'):
+        modelo = apps.get_model('capturador_inventario_api', nombre)
+        for localizacion in modelo.objects.order_by().values_list('localizacion', flat=True).distinct():
+            modelo.objects.filter(localizacion=localizacion).update(
+                localizacion_orden=calcular_localizacion_orden(localizacion)
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('capturador_inventario_api', '0014_articulos_no_contados'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='articulonocontado',
+            name='localizacion_orden',
+            field=models.CharField(default='1', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='inventarioarticulo',
+            name='localizacion_orden',
+            field=models.CharField(default='1', editable=False, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='articulonocontado',
+            index=models.Index(fields=['captura', 'localizacion_orden'], name='capturador__captura_7b1781_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventarioarticulo',
+            index=models.Index(fields=['almacen', 'localizacion_orden'], name='capturador__almacen_05b9af_idx'),
+        ),
+        migrations.RunPython(calcular_llaves_existentes, migrations.RunPython.noop),
+    ]
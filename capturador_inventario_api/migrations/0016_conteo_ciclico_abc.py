@@ -0,0 +1,39 @@
+# Generated by Django 5.0.2 on 2026-10-19 00:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('capturador_inventario_api', '0015_localizacion_orden'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='captura',
+            name='tipo',
+            field=models.CharField(choices=[('GENERAL', 'General'), ('CICLICO', 'Conteo Cíclico')], default='GENERAL', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='inventarioarticulo',
+            name='clasificacion_abc',
+            field=models.CharField(blank=True, choices=[('A', 'A'), ('B', 'B'), ('C', 'C')], default='', max_length=1),
+        ),
+        migrations.CreateModel(
+            name='AsignacionConteo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clasificacion_abc', models.CharField(max_length=1)),
+                ('ultimo_conteo', models.DateTimeField(blank=True, null=True)),
+                ('articulo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='capturador_inventario_api.articulo')),
+                ('captura', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='asignaciones', to='capturador_inventario_api.captura')),
+            ],
+            options={
+                'verbose_name': 'Asignación de Conteo',
+                'verbose_name_plural': 'Asignaciones de Conteo',
+                'unique_together': {('captura', 'articulo')},
+            },
+        ),
+    ]
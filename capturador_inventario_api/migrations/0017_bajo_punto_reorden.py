@@ -0,0 +1,33 @@
+# Generated by Django 5.0.2 on 2026-10-19 00:58
+
+from django.db import migrations, models
+from django.db.models import F, Q
+
+
+def marcar_existentes(apps, schema_editor):
+    # Mismo criterio que calcular_bajo_punto_reorden(), resuelto en un solo UPDATE
+    InventarioArticulo = apps.get_model('capturador_inventario_api', 'InventarioArticulo')
+    InventarioArticulo.objects.filter(
+        Q(punto_reorden__gt=0, existencia__lte=F('punto_reorden')) |
+        Q(punto_reorden__lte=0, stock_minimo__gt=0, existencia__lte=F('stock_minimo'))
+    ).update(bajo_punto_reorden=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('capturador_inventario_api', '0016_conteo_ciclico_abc'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventarioarticulo',
+            name='bajo_punto_reorden',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='inventarioarticulo',
+            index=models.Index(fields=['almacen', 'bajo_punto_reorden'], name='capturador__almacen_96b1f6_idx'),
+        ),
+        migrations.RunPython(marcar_existentes, migrations.RunPython.noop),
+    ]
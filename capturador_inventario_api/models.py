@@ -1,8 +1,12 @@
-from django.db import models
+import re
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.conf import settings
 from django.utils import timezone 
+from django.core.cache import cache
 from rest_framework.authentication import TokenAuthentication
+from rest_framework import exceptions
+from capturador_inventario_api.permisos import resolver_rol
 
 # -------------------------------------------------------------------------
 # 1. GESTIÓN DE USUARIOS Y EMPLEADOS
@@ -51,12 +55,15 @@ class Articulo(models.Model):
     
     activo = models.BooleanField(default=True)
     ultima_sincronizacion = models.DateTimeField(auto_now=True)
+    huella_sync = models.CharField(max_length=32, blank=True, default='', editable=False, help_text="Hash de los campos sincronizados desde Microsip (clave, nombre, seguimiento y claves auxiliares)")
 
     class Meta:
         verbose_name = "Artículo"
         verbose_name_plural = "Artículos"
         indexes = [
             models.Index(fields=['nombre', 'activo']),
+            # Feed de cambios del catálogo (views/catalogo.py)
+            models.Index(fields=['ultima_sincronizacion']),
         ]
 
     def __str__(self):
@@ -91,28 +98,82 @@ class Almacen(models.Model):
         return self.nombre
 
 
+# Segmentos de una localización: números o letras (los separadores se ignoran)
+_SEGMENTOS_LOCALIZACION = re.compile(r'\d+|[^\W\d_]+')
+# Las vacías van al final del recorrido: las demás llaves empiezan con '0'.
+# (Solo se comparan dígitos entre sí, así no depende de la collation de la BD)
+LOCALIZACION_ORDEN_VACIA = '1'
+
+
+def calcular_localizacion_orden(localizacion):
+    """
+    Llave de orden natural de una localización: 'a-2-10' -> '0.A.000002.000010', así
+    'A-2' queda antes de 'A-10' con un ORDER BY simple sobre la columna.
+    """
+    segmentos = _SEGMENTOS_LOCALIZACION.findall((localizacion or '').upper())
+    if not segmentos:
+        return LOCALIZACION_ORDEN_VACIA
+    return '0.' + '.'.join(s.zfill(6) if s.isdigit() else s for s in segmentos)[:253]
+
+
+def calcular_bajo_punto_reorden(existencia, stock_minimo, punto_reorden):
+    """
+    True si la existencia llegó al nivel de reorden: punto_reorden, o stock_minimo si el
+    artículo no tiene punto de reorden capturado en Microsip. Sin niveles -> False.
+    """
+    nivel = punto_reorden if punto_reorden and punto_reorden > 0 else stock_minimo
+    return bool(nivel and nivel > 0 and (existencia or 0) <= nivel)
+
+
 class InventarioArticulo(models.Model):
     id = models.BigAutoField(primary_key=True)
     articulo = models.ForeignKey(Articulo, on_delete=models.CASCADE, related_name='existencias_almacen')
     almacen = models.ForeignKey(Almacen, on_delete=models.CASCADE, related_name='inventario')
     
     localizacion = models.CharField(max_length=50, blank=True, null=True, verbose_name="Ubicación", db_index=True)
+    # Ver calcular_localizacion_orden(); la sincronización lo mantiene al escribir por lotes
+    localizacion_orden = models.CharField(max_length=255, default=LOCALIZACION_ORDEN_VACIA, editable=False)
     existencia = models.DecimalField(max_digits=18, decimal_places=5, default=0)
     
     stock_minimo = models.DecimalField(max_digits=18, decimal_places=5, default=0)
     stock_maximo = models.DecimalField(max_digits=18, decimal_places=5, default=0)
     punto_reorden = models.DecimalField(max_digits=18, decimal_places=5, default=0)
+    # Ver calcular_bajo_punto_reorden(); se mantiene en la sincronización (reporte de reabasto)
+    bajo_punto_reorden = models.BooleanField(default=False, editable=False)
+
+    # Clasificación ABC por valor y diferencias recientes (ver conteo_ciclico.py)
+    clasificacion_abc = models.CharField(max_length=1, choices=[('A', 'A'), ('B', 'B'), ('C', 'C')], blank=True, default='')
 
     pendiente_sincronizar_msip = models.BooleanField(default=False, help_text="True si se editó localmente y falta enviar a Microsip")
     fecha_ultima_modificacion_local = models.DateTimeField(auto_now=True)
+    huella_sync = models.CharField(max_length=32, blank=True, default='', editable=False, help_text="Hash de la última fila de existencias leída de Microsip")
 
     class Meta:
         verbose_name = "Inventario por Almacén"
         unique_together = ('articulo', 'almacen')
         indexes = [
             models.Index(fields=['articulo', 'almacen']),
+            # Feed de cambios del catálogo por almacén (views/catalogo.py)
+            models.Index(fields=['almacen', 'fecha_ultima_modificacion_local']),
+            # Ruta de conteo por almacén (views/rutaConteo.py)
+            models.Index(fields=['almacen', 'localizacion_orden']),
+            # Reporte de reabasto (views/reabasto.py)
+            models.Index(fields=['almacen', 'bajo_punto_reorden']),
         ]
 
+    def save(self, *args, **kwargs):
+        self.localizacion_orden = calcular_localizacion_orden(self.localizacion)
+        self.bajo_punto_reorden = calcular_bajo_punto_reorden(self.existencia, self.stock_minimo, self.punto_reorden)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if 'localizacion' in update_fields:
+                update_fields.add('localizacion_orden')
+            if update_fields & {'existencia', 'stock_minimo', 'punto_reorden'}:
+                update_fields.add('bajo_punto_reorden')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.articulo.clave} en {self.almacen.nombre}: {self.existencia}"
 
@@ -123,9 +184,11 @@ class InventarioArticulo(models.Model):
 
 class BitacoraSincronizacion(models.Model):
     STATUS_CHOICES = [
+        ('EN_COLA', 'En Cola'),
         ('EN_PROCESO', 'En Proceso'),
         ('EXITO', 'Éxito'),
         ('ERROR', 'Error'),
+        ('OMITIDO', 'Omitido'),
     ]
 
     fecha_inicio = models.DateTimeField(auto_now_add=True)
@@ -135,6 +198,13 @@ class BitacoraSincronizacion(models.Model):
     articulos_creados = models.IntegerField(default=0)
     articulos_actualizados = models.IntegerField(default=0)
     articulos_desactivados = models.IntegerField(default=0)
+    existencias_procesadas = models.IntegerField(default=0, help_text="Filas de existencias leídas de Microsip")
+    inventarios_actualizados = models.IntegerField(default=0)
+
+    # Seguimiento de la ejecución en segundo plano (Django-Q)
+    etapa = models.CharField(max_length=40, blank=True, default='')
+    task_id = models.CharField(max_length=64, null=True, blank=True, help_text="ID de la tarea en Django-Q")
+    solicitado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='sincronizaciones_solicitadas')
     
     detalles = models.TextField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='EN_PROCESO')
@@ -144,6 +214,28 @@ class BitacoraSincronizacion(models.Model):
         return f"Sync {self.fecha_inicio.strftime('%Y-%m-%d %H:%M')} - {self.status}"
 
 
+class BloqueoSincronizacion(models.Model):
+    """
+    Arrendamiento (lease) que garantiza una sola sincronización a la vez entre
+    procesos (Schedule de Django-Q, reintentos, run_test.py manual).
+    El dueño lo renueva con un heartbeat; si deja de hacerlo, expira y otro
+    proceso puede tomarlo.
+    """
+    nombre = models.CharField(max_length=50, unique=True)
+    propietario = models.CharField(max_length=64, blank=True, default='', help_text="Token del proceso que tiene el bloqueo (vacío = libre)")
+    bitacora = models.ForeignKey(BitacoraSincronizacion, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    adquirido_en = models.DateTimeField(null=True, blank=True)
+    heartbeat = models.DateTimeField(null=True, blank=True)
+    expira = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Bloqueo de Sincronización"
+        verbose_name_plural = "Bloqueos de Sincronización"
+
+    def __str__(self):
+        return f"{self.nombre} - {self.propietario or 'LIBRE'}"
+
+
 class Captura(models.Model):
     ESTADOS = [
         ('BORRADOR', 'Borrador'),
@@ -159,14 +251,71 @@ class Captura(models.Model):
     fecha_captura = models.DateTimeField(default=timezone.now)
     
     estado = models.CharField(max_length=20, choices=ESTADOS, default='BORRADOR')
+    TIPOS = [
+        ('GENERAL', 'General'),
+        ('CICLICO', 'Conteo Cíclico'),
+    ]
+    tipo = models.CharField(max_length=10, choices=TIPOS, default='GENERAL')
     detalles_texto = models.TextField(blank=True, null=True)
     modo_offline = models.BooleanField(default=False)
     fecha_reportada = models.DateTimeField(null=True, blank=True)
 
+    # Totales acumulados de los detalles (ver totales_captura.py)
+    total_renglones = models.IntegerField(default=0)
+    total_unidades = models.DecimalField(max_digits=18, decimal_places=5, default=0)
+    renglones_con_diferencia = models.IntegerField(default=0)
+    total_tickets = models.DecimalField(max_digits=18, decimal_places=5, default=0)
+
+    # Artículos con existencia que no se contaron (ver no_contados.py)
+    ESTADOS_NO_CONTADOS = [
+        ('EN_COLA', 'En Cola'),
+        ('EN_PROCESO', 'En Proceso'),
+        ('LISTO', 'Listo'),
+        ('ERROR', 'Error'),
+    ]
+    estado_no_contados = models.CharField(max_length=20, choices=ESTADOS_NO_CONTADOS, blank=True, default='')
+    # Último cambio de estado_no_contados (con LISTO, la fecha del cálculo)
+    fecha_no_contados = models.DateTimeField(null=True, blank=True)
+
     def __str__(self):
         return f"Captura {self.folio} - {self.estado}"
 
 
+def generar_folio_captura():
+    """Siguiente folio del año con formato INV-YYYY-XXXX (ej INV-2025-0001)."""
+    prefix = f"INV-{timezone.localdate().year}"
+
+    # Buscamos el último folio de este año para incrementar
+    ultimo = Captura.objects.filter(folio__startswith=prefix).order_by('-id').first()
+    if ultimo:
+        try:
+            # Extraemos la parte numérica final (despues del último guión)
+            secuencia = int(ultimo.folio.split('-')[-1]) + 1
+        except ValueError:
+            secuencia = 1
+    else:
+        secuencia = 1
+
+    # Formateamos a 4 digitos (rellenando con ceros)
+    return f"{prefix}-{str(secuencia).zfill(4)}"
+
+
+class AsignacionConteo(models.Model):
+    """Artículo que el conteo cíclico del día pide contar en una captura borrador."""
+    captura = models.ForeignKey(Captura, on_delete=models.CASCADE, related_name='asignaciones')
+    articulo = models.ForeignKey(Articulo, on_delete=models.CASCADE, related_name='+')
+    clasificacion_abc = models.CharField(max_length=1)
+    ultimo_conteo = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Asignación de Conteo"
+        verbose_name_plural = "Asignaciones de Conteo"
+        unique_together = ('captura', 'articulo')
+
+    def __str__(self):
+        return f"{self.captura.folio}: {self.articulo.clave} ({self.clasificacion_abc})"
+
+
 class DetalleCaptura(models.Model):
     captura = models.ForeignKey(Captura, related_name='detalles', on_delete=models.CASCADE)
     articulo = models.ForeignKey(Articulo, on_delete=models.PROTECT, null=True, blank=True)
@@ -175,6 +324,18 @@ class DetalleCaptura(models.Model):
     existencia_sistema_al_momento = models.DecimalField(max_digits=18, decimal_places=5, default=0)
     localizacion_al_momento = models.CharField(max_length=50, null=True, blank=True)
 
+    # Conciliación: se calcula al pasar la captura a CONFIRMADO (ver conciliacion.py).
+    # En NULL mientras la captura no se ha confirmado.
+    ESTATUS_CONCILIACION = [
+        ('EXACTO', 'Exacto'),
+        ('SOBRANTE', 'Sobrante'),
+        ('FALTANTE', 'Faltante'),
+    ]
+    total_tickets = models.DecimalField(max_digits=18, decimal_places=5, null=True, blank=True)
+    diferencia = models.DecimalField(max_digits=18, decimal_places=5, null=True, blank=True)
+    diferencia_valor = models.DecimalField(max_digits=18, decimal_places=6, null=True, blank=True)
+    estatus_conciliacion = models.CharField(max_length=10, choices=ESTATUS_CONCILIACION, null=True, blank=True, db_index=True)
+
     class Meta:
         unique_together = ('captura', 'articulo')
 
@@ -182,6 +343,28 @@ class DetalleCaptura(models.Model):
         clave = self.articulo.clave if self.articulo else "SIN_ARTICULO"
         return f"{clave}: Contado {self.cantidad_contada}"
 
+class ArticuloNoContado(models.Model):
+    """
+    Resultado materializado del anti-join InventarioArticulo (existencia > 0 en el
+    almacén de la captura) contra DetalleCaptura. Se recalcula completo en segundo plano.
+    """
+    captura = models.ForeignKey(Captura, on_delete=models.CASCADE, related_name='no_contados')
+    articulo = models.ForeignKey(Articulo, on_delete=models.CASCADE, related_name='+')
+    localizacion = models.CharField(max_length=50, blank=True, default='')
+    localizacion_orden = models.CharField(max_length=255, default=LOCALIZACION_ORDEN_VACIA)
+    existencia = models.DecimalField(max_digits=18, decimal_places=5, default=0)
+
+    class Meta:
+        verbose_name = "Artículo no contado"
+        verbose_name_plural = "Artículos no contados"
+        indexes = [
+            models.Index(fields=['captura', 'localizacion']),
+            models.Index(fields=['captura', 'localizacion_orden']),
+        ]
+
+    def __str__(self):
+        return f"{self.captura.folio}: {self.articulo.clave} ({self.localizacion})"
+
 # --- NUEVO MODELO: TICKET SALIDA ---
 class TicketSalida(models.Model):
     """
@@ -197,9 +380,183 @@ class TicketSalida(models.Model):
         return f"Ticket: {self.cantidad} pzas - {self.responsable}"
 
 
+class DocumentoMicrosip(models.Model):
+    """
+    Bandeja de salida (outbox) de documentos de inventario a registrar en Microsip.
+    Se generan al procesar capturas CONFIRMADAS: las diferencias se agrupan por
+    almacén en pocos documentos grandes (una Entrada para sobrantes y una Salida
+    para faltantes). Los que fallan quedan en ERROR y se reintentan en la siguiente corrida.
+    """
+    TIPOS = [
+        ('ENTRADA', 'Entrada'),
+        ('SALIDA', 'Salida'),
+    ]
+    ESTADOS = [
+        ('PENDIENTE', 'Pendiente'),
+        ('APLICADO', 'Aplicado'),
+        ('ERROR', 'Error'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    almacen = models.ForeignKey(Almacen, on_delete=models.PROTECT, related_name='documentos_microsip')
+    tipo = models.CharField(max_length=10, choices=TIPOS)
+    estado = models.CharField(max_length=10, choices=ESTADOS, default='PENDIENTE', db_index=True)
+    capturas = models.ManyToManyField(Captura, related_name='documentos_microsip', blank=True)
+
+    descripcion = models.CharField(max_length=200, blank=True, default='')
+    # Lista de {articulo_id, articulo_id_msip, clave, unidades, costo_unitario}
+    renglones = models.JSONField(default=list)
+
+    intentos = models.IntegerField(default=0)
+    ultimo_error = models.TextField(null=True, blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_aplicacion = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Documento Microsip"
+        verbose_name_plural = "Documentos Microsip"
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} #{self.id} ({self.almacen}) - {self.estado}"
+
+
+class SnapshotCatalogo(models.Model):
+    """
+    Catálogo completo de un almacén para los handhelds en modo offline:
+    archivo SQLite comprimido con gzip (artículos, claves auxiliares y existencias
+    con localización). Se genera después de cada sincronización exitosa; el
+    `etag` es el hash de los datos, así que si el catálogo no cambió se conserva
+    el snapshot anterior y los dispositivos reciben 304.
+    """
+    id = models.BigAutoField(primary_key=True)
+    almacen = models.ForeignKey(Almacen, on_delete=models.CASCADE, related_name='snapshots_catalogo')
+    bitacora = models.ForeignKey(BitacoraSincronizacion, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    archivo = models.FileField(upload_to='catalogos/')
+    etag = models.CharField(max_length=64, db_index=True)
+    tamano_bytes = models.BigIntegerField(default=0)
+    total_articulos = models.IntegerField(default=0)
+    fecha_generacion = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Snapshot de Catálogo"
+        verbose_name_plural = "Snapshots de Catálogo"
+        ordering = ['-fecha_generacion']
+
+    def __str__(self):
+        return f"Catálogo {self.almacen} ({self.fecha_generacion.strftime('%Y-%m-%d %H:%M')})"
+
+
+class SolicitudIdempotente(models.Model):
+    """
+    Respuesta guardada de una petición con header Idempotency-Key (ver idempotencia.py).
+    Los handhelds reintentan las subidas con la misma llave; el reintento recibe la
+    respuesta original sin volver a procesar (sin duplicar capturas ni sumar dos veces).
+    """
+    id = models.BigAutoField(primary_key=True)
+    dispositivo = models.CharField(max_length=64, help_text="Header X-Device-Id (o el usuario si no se envía)")
+    llave = models.CharField(max_length=64, help_text="Header Idempotency-Key")
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    ruta = models.CharField(max_length=200)
+    huella_solicitud = models.CharField(max_length=64, help_text="SHA-256 de ruta + cuerpo, para detectar llaves reutilizadas")
+    codigo_respuesta = models.IntegerField(null=True, blank=True)
+    respuesta = models.JSONField(null=True, blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Solicitud Idempotente"
+        verbose_name_plural = "Solicitudes Idempotentes"
+        unique_together = ('dispositivo', 'llave')
+
+    def __str__(self):
+        return f"{self.dispositivo} / {self.llave} ({self.codigo_respuesta})"
+
+
+class CargaCaptura(models.Model):
+    """
+    Subida por fragmentos de un conteo grande (ver views/cargaCaptura.py).
+    Cada fragmento se valida y se guarda en FragmentoCarga al llegar; al confirmar
+    se aplican todos juntos a los detalles de la captura en una transacción corta.
+    """
+    ESTADOS = [
+        ('ABIERTA', 'Abierta'),
+        ('CONFIRMADA', 'Confirmada'),
+        ('CANCELADA', 'Cancelada'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    captura = models.ForeignKey(Captura, on_delete=models.CASCADE, related_name='cargas')
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    total_fragmentos = models.IntegerField()
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='ABIERTA')
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_confirmacion = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Carga de Captura"
+        verbose_name_plural = "Cargas de Captura"
+
+    def __str__(self):
+        return f"Carga #{self.id} de {self.captura.folio} ({self.estado})"
+
+
+class FragmentoCarga(models.Model):
+    carga = models.ForeignKey(CargaCaptura, on_delete=models.CASCADE, related_name='fragmentos')
+    numero = models.IntegerField()
+    # Renglones ya validados: [{articulo_id, cantidad_contada}] (cantidad como texto decimal)
+    renglones = models.JSONField(default=list)
+    fecha_recepcion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('carga', 'numero')
+
+    def __str__(self):
+        return f"Fragmento {self.numero} de la carga #{self.carga_id}"
+
+
 # -------------------------------------------------------------------------
 # 5. CLASES EXTRA (Authentication)
 # -------------------------------------------------------------------------
 
+def _llave_cache_token(key):
+    return f"auth_token:{key}"
+
+
+def invalidar_cache_token(user):
+    """
+    Descarta del cache los tokens del usuario (logout, cambio de puesto, baja).
+    Dentro de una transacción se descartan al confirmarla: antes, una petición
+    concurrente leería los datos viejos de la BD y los volvería a cachear.
+    """
+    from rest_framework.authtoken.models import Token
+    llaves = [_llave_cache_token(key) for key in Token.objects.filter(user=user).values_list('key', flat=True)]
+    if llaves:
+        transaction.on_commit(lambda: cache.delete_many(llaves))
+
+
 class BearerTokenAuthentication(TokenAuthentication):
-    keyword = 'Bearer'
\ No newline at end of file
+    """
+    Token 'Bearer' con cache: el Token se guarda junto con su User, Empleado y
+    grupos (y el rol ya resuelto, ver permisos.resolver_rol) durante
+    TOKEN_CACHE_SEGUNDOS, así que las peticiones repetidas de los handhelds no
+    consultan la BD para autenticar ni para revisar permisos.
+    """
+    keyword = 'Bearer'
+
+    def authenticate_credentials(self, key):
+        llave = _llave_cache_token(key)
+        token = cache.get(llave)
+
+        if token is None:
+            model = self.get_model()
+            try:
+                token = model.objects.select_related('user__empleado').prefetch_related('user__groups').get(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed('Invalid token.')
+            # El rol queda resuelto en el usuario y viaja con él en el cache
+            resolver_rol(token.user)
+            cache.set(llave, token, getattr(settings, 'TOKEN_CACHE_SEGUNDOS', 60))
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+
+        return (token.user, token)
\ No newline at end of file
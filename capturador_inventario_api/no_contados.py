@@ -0,0 +1,93 @@
+"""
+Artículos con existencia en el almacén de una captura que nunca se contaron.
+
+El anti-join (InventarioArticulo sin DetalleCaptura en la captura) se resuelve en la
+base de datos con NOT EXISTS y el resultado se materializa en ArticuloNoContado,
+para que la consulta paginada y la exportación no repitan el cruce.
+Se calcula en segundo plano (Django-Q) al confirmar la captura o a petición.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from capturador_inventario_api.models import ArticuloNoContado, Captura, DetalleCaptura, InventarioArticulo
+from capturador_inventario_api.registro_eventos import obtener_logger
+
+log = obtener_logger('tareas')
+
+TAREA_NO_CONTADOS = 'capturador_inventario_api.tasks.task_calcular_no_contados'
+TAMANO_LOTE = 5000
+ESTADOS_EN_CURSO = ('EN_COLA', 'EN_PROCESO')
+
+
+def calculo_en_curso(captura, ahora=None):
+    """
+    True si hay un cálculo EN_COLA/EN_PROCESO que todavía puede terminar. Si el estado
+    no cambió en más de Q_CLUSTER['retry'] segundos (Django-Q ya habría cancelado o
+    reintentado la tarea) el worker murió a medias: se puede volver a encolar.
+    fecha_no_contados guarda el último cambio de estado.
+    """
+    if captura.estado_no_contados not in ESTADOS_EN_CURSO:
+        return False
+    if captura.fecha_no_contados is None:
+        return False
+    vencimiento = timedelta(seconds=settings.Q_CLUSTER.get('retry', 3700))
+    return (ahora or timezone.now()) - captura.fecha_no_contados < vencimiento
+
+
+def consulta_no_contados(captura):
+    """Filas de InventarioArticulo con existencia > 0 cuyo artículo no está en la captura."""
+    contado = DetalleCaptura.objects.filter(captura=captura, articulo_id=OuterRef('articulo_id'))
+    return InventarioArticulo.objects.filter(
+        almacen_id=captura.almacen_id,
+        existencia__gt=0,
+        articulo__activo=True
+    ).filter(~Exists(contado))
+
+
+def calcular_no_contados(captura):
+    """Reemplaza los resultados guardados de la captura. Retorna cuántos artículos faltaron."""
+    Captura.objects.filter(pk=captura.pk).update(estado_no_contados='EN_PROCESO', fecha_no_contados=timezone.now())
+
+    total = 0
+    with transaction.atomic():
+        ArticuloNoContado.objects.filter(captura=captura).delete()
+
+        lote = []
+        for articulo_id, localizacion, localizacion_orden, existencia in consulta_no_contados(captura).order_by().values_list(
+            'articulo_id', 'localizacion', 'localizacion_orden', 'existencia'
+        ).iterator(chunk_size=TAMANO_LOTE):
+            lote.append(ArticuloNoContado(
+                captura_id=captura.pk,
+                articulo_id=articulo_id,
+                localizacion=localizacion or '',
+                localizacion_orden=localizacion_orden,
+                existencia=existencia
+            ))
+            if len(lote) >= TAMANO_LOTE:
+                ArticuloNoContado.objects.bulk_create(lote)
+                total += len(lote)
+                lote = []
+        if lote:
+            ArticuloNoContado.objects.bulk_create(lote)
+            total += len(lote)
+
+        Captura.objects.filter(pk=captura.pk).update(estado_no_contados='LISTO', fecha_no_contados=timezone.now())
+
+    return total
+
+
+def encolar_calculo_no_contados(captura):
+    """Encola el cálculo en Django-Q. Retorna el task_id (None si no se pudo encolar)."""
+    from django_q.tasks import async_task
+
+    Captura.objects.filter(pk=captura.pk).update(estado_no_contados='EN_COLA', fecha_no_contados=timezone.now())
+    try:
+        return async_task(TAREA_NO_CONTADOS, captura.pk, task_name=f"no-contados-{captura.pk}")
+    except Exception as e:
+        log.warning("No se pudo encolar el cálculo de no contados de %s: %s", captura.folio, e)
+        Captura.objects.filter(pk=captura.pk).update(estado_no_contados='ERROR')
+        return None
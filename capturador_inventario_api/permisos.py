@@ -0,0 +1,54 @@
+from rest_framework.permissions import BasePermission
+
+ROL_ADMIN = 'ADMIN'
+ROL_DEFECTO = 'user'
+
+
+def resolver_rol(user):
+    """
+    Resuelve (rol principal, nombres de grupos) de un usuario y lo guarda en el
+    propio objeto, así que se calcula una sola vez por petición (o por token
+    cacheado, ver BearerTokenAuthentication).
+
+    Orden: ADMIN (por grupo o por puesto de Empleado) > primer grupo > puesto > 'user'.
+    """
+    resuelto = getattr(user, '_rol_resuelto', None)
+    if resuelto is not None:
+        return resuelto
+
+    if not getattr(user, 'is_authenticated', False):
+        return (None, [])
+
+    # Usa el prefetch de grupos / select_related de empleado si la autenticación los cargó
+    grupos = [grupo.name for grupo in user.groups.all()]
+    try:
+        puesto = user.empleado.puesto
+    except Exception:
+        puesto = None
+
+    if ROL_ADMIN in grupos or puesto == ROL_ADMIN:
+        rol = ROL_ADMIN
+    elif grupos:
+        rol = grupos[0]
+    else:
+        rol = puesto or ROL_DEFECTO
+
+    user._rol_resuelto = (rol, grupos)
+    return user._rol_resuelto
+
+
+def obtener_rol(user):
+    return resolver_rol(user)[0]
+
+
+def es_administrador(user):
+    return obtener_rol(user) == ROL_ADMIN
+
+
+class EsAdministrador(BasePermission):
+    """Solo usuarios con rol ADMIN."""
+    message = "Esta acción es exclusiva de administradores."
+
+    def has_permission(self, request, view):
+        return es_administrador(request.user)
+
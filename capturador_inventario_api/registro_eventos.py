@@ -0,0 +1,159 @@
+"""
+Logging estructurado (settings.LOGGING).
+
+Cada subsistema usa su propio logger, hijo de 'capturador_inventario_api', para poder
+ajustar su nivel por separado (LOG_NIVEL_SYNC, LOG_NIVEL_DLL, ...):
+
+    log = obtener_logger('sync')
+    evento(log, 'sync.etapa', "Existencias sincronizadas", filas=1200, duracion_ms=350)
+
+Los campos (`filas=...`) viajan en el registro y el formateador los escribe como
+`llave=valor` o JSON (LOG_FORMATO). `contexto_log(bitacora=15)` agrega campos a todo lo
+que se registre dentro del bloque (mismo hilo/tarea), para correlacionar una ejecución.
+
+ColaHandler solo encola el registro; la escritura a consola la hace un QueueListener en
+su propio hilo, así que el hilo de Waitress o del worker no espera la E/S.
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+RAIZ = 'capturador_inventario_api'
+
+_contexto = ContextVar('contexto_log', default={})
+
+
+def obtener_logger(subsistema):
+    return logging.getLogger(f"{RAIZ}.{subsistema}")
+
+
+def evento(logger, nombre, mensaje=None, nivel=logging.INFO, **campos):
+    """Registra un evento con nombre (ej. 'sync.etapa') y campos estructurados."""
+    if logger.isEnabledFor(nivel):
+        logger.log(nivel, mensaje or nombre, extra={'evento': nombre, 'campos': campos})
+
+
+@contextmanager
+def contexto_log(**campos):
+    token = _contexto.set({**_contexto.get(), **campos})
+    try:
+        yield
+    finally:
+        _contexto.reset(token)
+
+
+@contextmanager
+def medir(logger, nombre, mensaje=None, nivel=logging.INFO, **campos):
+    """
+    Registra el evento al terminar el bloque con su duracion_ms. El bloque puede agregar
+    campos al dict que recibe (ej. filas). Si el bloque falla no registra nada:
+    el error lo reporta quien lo atrape.
+    """
+    inicio = time.perf_counter()
+    yield campos
+    campos['duracion_ms'] = round((time.perf_counter() - inicio) * 1000, 1)
+    evento(logger, nombre, mensaje, nivel, **campos)
+
+
+class ContextoFilter(logging.Filter):
+    """Copia el contexto_log vigente al registro (se evalúa en el hilo que registra)."""
+
+    def filter(self, record):
+        contexto = _contexto.get()
+        if contexto:
+            record.contexto = contexto
+        return True
+
+
+class EventoFormatter(logging.Formatter):
+
+    def __init__(self, formato='texto'):
+        super().__init__('{levelname} {asctime} {name} {message}', style='{')
+        self.formato = formato
+
+    def _campos(self, record):
+        return {**getattr(record, 'contexto', {}), **getattr(record, 'campos', {})}
+
+    def format(self, record):
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        campos = self._campos(record)
+
+        if self.formato == 'json':
+            return json.dumps({
+                "fecha": self.formatTime(record),
+                "nivel": record.levelname,
+                "logger": record.name,
+                "evento": getattr(record, 'evento', None),
+                "mensaje": record.message,
+                **campos,
+                **({"excepcion": record.exc_text} if record.exc_text else {})
+            }, default=str, ensure_ascii=False)
+
+        record.asctime = self.formatTime(record)
+        texto = self.formatMessage(record)
+        evento_nombre = getattr(record, 'evento', None)
+        extras = ' '.join(f"{llave}={valor}" for llave, valor in campos.items())
+        if evento_nombre:
+            extras = f"evento={evento_nombre} {extras}".rstrip()
+        if extras:
+            texto = f"{texto} | {extras}"
+        # Los campos van en la primera línea; el traceback debajo
+        if record.exc_text:
+            texto = f"{texto}\n{record.exc_text}"
+        if record.stack_info:
+            texto = f"{texto}\n{self.formatStack(record.stack_info)}"
+        return texto
+
+
+class ColaHandler(QueueHandler):
+    """
+    Handler para settings.LOGGING ('()': ...). Crea su propio destino (consola) y el
+    QueueListener que escribe en él. Si el proceso se bifurca (workers de Django-Q en
+    Linux) el hijo no hereda el hilo del listener: se levanta uno nuevo al primer registro.
+    """
+
+    def __init__(self, formato='texto'):
+        super().__init__(queue.SimpleQueue())
+        self.destino = logging.StreamHandler(sys.stderr)
+        self.destino.setFormatter(EventoFormatter(formato))
+        self.addFilter(ContextoFilter())
+        self._iniciar_listener()
+
+    def _iniciar_listener(self):
+        self._pid = os.getpid()
+        self._listener = QueueListener(self.queue, self.destino)
+        self._listener.start()
+        # Al salir se vacía la cola (en el hijo de un fork, la del hijo)
+        atexit.register(self._detener_listener)
+
+    def _detener_listener(self):
+        if self._pid == os.getpid() and self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+    def prepare(self, record):
+        # Como QueueHandler.prepare (mensaje ya interpolado, sin exc_info que no se puede
+        # serializar), pero deja el traceback en exc_text para que EventoFormatter lo acomode
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or self.destino.formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            self.queue = queue.SimpleQueue()
+            self._iniciar_listener()
+        super().enqueue(record)
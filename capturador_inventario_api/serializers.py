@@ -1,8 +1,9 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.utils import timezone
-import datetime # Importante para obtener el año actual
 from .models import *
+from .totales_captura import ajustar_por_detalle, ajustar_totales
+from .conciliacion import reconciliar_si_confirmada
 
 # --- 1. Serializadores de Usuario y Empleado ---
 
@@ -79,10 +80,17 @@ class DetalleCapturaSerializer(serializers.ModelSerializer):
             'articulo_nombre',
             'existencia_sistema_al_momento',
             'tickets',         
-            'conteo_tickets'   
+            'conteo_tickets',
+            # Conciliación (solo con la captura CONFIRMADA, ver conciliacion.py)
+            'diferencia',
+            'diferencia_valor',
+            'estatus_conciliacion'
         ] 
         # 'articulo' se envía en el response automáticamente con el ID del objeto relacionado
-        read_only_fields = ['id', 'articulo', 'articulo_nombre', 'existencia_sistema_al_momento', 'tickets', 'conteo_tickets']
+        read_only_fields = [
+            'id', 'articulo', 'articulo_nombre', 'existencia_sistema_al_momento', 'tickets', 'conteo_tickets',
+            'diferencia', 'diferencia_valor', 'estatus_conciliacion'
+        ]
 
     def to_representation(self, instance):
         ret = super().to_representation(instance)
@@ -125,8 +133,11 @@ class DetalleCapturaSerializer(serializers.ModelSerializer):
         detalle_existente = DetalleCaptura.objects.filter(captura=captura, articulo=articulo).first()
 
         if detalle_existente:
+            contada_antes = detalle_existente.cantidad_contada
             detalle_existente.cantidad_contada += cantidad_nueva
             detalle_existente.save()
+            ajustar_por_detalle(detalle_existente, contada_antes, detalle_existente.existencia_sistema_al_momento)
+            reconciliar_si_confirmada(captura, [detalle_existente.pk])
             return detalle_existente
         
         else:
@@ -136,7 +147,18 @@ class DetalleCapturaSerializer(serializers.ModelSerializer):
                 if inv:
                     validated_data['existencia_sistema_al_momento'] = inv.existencia
 
-            return super().create(validated_data)
+            detalle = super().create(validated_data)
+            ajustar_por_detalle(detalle, nuevo=True)
+            reconciliar_si_confirmada(detalle.captura, [detalle.pk])
+            return detalle
+
+    def update(self, instance, validated_data):
+        contada_antes = instance.cantidad_contada
+        sistema_antes = instance.existencia_sistema_al_momento
+        instance = super().update(instance, validated_data)
+        ajustar_por_detalle(instance, contada_antes, sistema_antes)
+        reconciliar_si_confirmada(instance.captura, [instance.pk])
+        return instance
 
     def get_articulo_nombre(self, obj):
         if obj.articulo:
@@ -144,6 +166,9 @@ class DetalleCapturaSerializer(serializers.ModelSerializer):
         return "Producto Desconocido"
 
     def get_conteo_tickets(self, obj):
+        # Ya conciliado: se usa el total guardado
+        if obj.total_tickets is not None:
+            return obj.total_tickets
         total = sum(t.cantidad for t in obj.tickets.all())
         return total
 
@@ -165,39 +190,22 @@ class CapturaSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'folio', 'capturador', 'capturador_nombre',
             'almacen', 'almacen_nombre',
-            'fecha_captura', 'estado', 'detalles',
-            'modo_offline', 'fecha_reportada'
+            'fecha_captura', 'estado', 'tipo', 'detalles',
+            'modo_offline', 'fecha_reportada',
+            'total_renglones', 'total_unidades', 'renglones_con_diferencia', 'total_tickets'
+        ]
+        read_only_fields = [
+            'id', 'capturador_nombre', 'almacen_nombre', 'folio',
+            'total_renglones', 'total_unidades', 'renglones_con_diferencia', 'total_tickets'
         ]
-        read_only_fields = ['id', 'capturador_nombre', 'almacen_nombre', 'folio']
 
     def create(self, validated_data):
         detalles_data = validated_data.pop('detalles', [])
         modo_offline = validated_data.pop('modo_offline', False)
         fecha_reportada = validated_data.pop('fecha_reportada', None)
 
-        # --- LÓGICA DE GENERACIÓN DE FOLIO ---
-        # 1. Obtenemos el año actual
-        anio = datetime.date.today().year
-        prefix = f"INV-{anio}"
-        
-        # 2. Buscamos el último folio de este año para incrementar
-        # Asumimos formato INV-YYYY-XXXX (ej INV-2025-0001)
-        ultimo = Captura.objects.filter(folio__startswith=prefix).order_by('-id').first()
-        
-        if ultimo:
-            try:
-                # Extraemos la parte numérica final (despues del último guión)
-                secuencia = int(ultimo.folio.split('-')[-1]) + 1
-            except:
-                secuencia = 1
-        else:
-            secuencia = 1
-
-        # 3. Formateamos a 4 digitos (rellenando con ceros)
-        nuevo_folio = f"{prefix}-{str(secuencia).zfill(4)}"
-        
-        validated_data['folio'] = nuevo_folio
-        # -------------------------------------
+        # Folio INV-YYYY-XXXX (compartido con el conteo cíclico)
+        validated_data['folio'] = generar_folio_captura()
 
         captura = Captura.objects.create(**validated_data)
         
@@ -229,11 +237,62 @@ class CapturaSerializer(serializers.ModelSerializer):
                 ))
 
         if objs_detalles:
+            # Existencia de sistema al momento, igual que en la captura individual (una consulta)
+            if captura.almacen_id:
+                existencias = dict(
+                    InventarioArticulo.objects.filter(
+                        almacen_id=captura.almacen_id,
+                        articulo_id__in={d.articulo_id for d in objs_detalles}
+                    ).values_list('articulo_id', 'existencia')
+                )
+                for d in objs_detalles:
+                    d.existencia_sistema_al_momento = existencias.get(d.articulo_id, 0)
+
             DetalleCaptura.objects.bulk_create(objs_detalles)
+            ajustar_totales(
+                captura.id,
+                renglones=len(objs_detalles),
+                unidades=sum(d.cantidad_contada for d in objs_detalles),
+                con_diferencia=sum(1 for d in objs_detalles if d.cantidad_contada != d.existencia_sistema_al_momento)
+            )
+            captura.refresh_from_db(fields=['total_renglones', 'total_unidades', 'renglones_con_diferencia'])
             
         return captura
 
+class CapturaListaSerializer(serializers.ModelSerializer):
+    """Para listados: solo la cabecera y sus totales acumulados, sin leer los detalles."""
+    capturador_nombre = serializers.CharField(source='capturador.username', read_only=True)
+    almacen_nombre = serializers.CharField(source='almacen.nombre', read_only=True)
+
+    class Meta:
+        model = Captura
+        fields = [
+            'id', 'folio', 'capturador', 'capturador_nombre',
+            'almacen', 'almacen_nombre',
+            'fecha_captura', 'estado', 'tipo',
+            'total_renglones', 'total_unidades', 'renglones_con_diferencia', 'total_tickets'
+        ]
+        read_only_fields = fields
+
 class AlmacenSerializer(serializers.ModelSerializer):
     class Meta:
         model = Almacen
-        fields = ['id', 'almacen_id_msip', 'nombre', 'activo_web']
\ No newline at end of file
+        fields = ['id', 'almacen_id_msip', 'nombre', 'activo_web']
+
+
+# --- 4. Serializadores de Sincronización ---
+
+class BitacoraSincronizacionSerializer(serializers.ModelSerializer):
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    solicitado_por_nombre = serializers.CharField(source='solicitado_por.username', read_only=True, default=None)
+
+    class Meta:
+        model = BitacoraSincronizacion
+        fields = [
+            'id', 'status', 'status_display', 'etapa',
+            'fecha_inicio', 'fecha_fin',
+            'articulos_procesados', 'articulos_creados', 'articulos_actualizados', 'articulos_desactivados',
+            'existencias_procesadas', 'inventarios_actualizados',
+            'detalles', 'mensaje_error', 'task_id', 'solicitado_por_nombre'
+        ]
+        read_only_fields = fields
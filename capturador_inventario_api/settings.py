@@ -1,4 +1,5 @@
 import os
+from corsheaders.defaults import default_headers
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -63,6 +64,9 @@ else:
 # Permitir credenciales en ambos entornos (necesario para cookies/tokens a veces)
 CORS_ALLOW_CREDENTIALS = True
 
+# Headers propios de los handhelds (reintentos idempotentes)
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key', 'x-device-id')
+
 # -------------------------------------------------------------------------
 # APLICACIONES Y MIDDLEWARE
 # -------------------------------------------------------------------------
@@ -84,6 +88,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',     # SIEMPRE AL PRINCIPIO
+    'capturador_inventario_api.metricas.MetricasMiddleware',  # solo con METRICAS['HABILITADO']
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -170,6 +175,35 @@ REST_FRAMEWORK = {
     ),
 }
 
+# Horas que se conservan las respuestas de peticiones con Idempotency-Key
+# (deben cubrir el tiempo máximo que un handheld puede pasar sin conexión).
+IDEMPOTENCIA_RETENCION_HORAS = 72
+
+# Segundos que BearerTokenAuthentication guarda en cache el token (con su usuario).
+# Logout y los cambios de puesto/baja lo invalidan antes.
+TOKEN_CACHE_SEGUNDOS = 60
+
+# Instrumentación por endpoint (metricas.py): latencia, consultas SQL y tamaño de respuesta.
+# En memoria de cada proceso; se consulta en /api/metricas/ (solo ADMIN).
+METRICAS = {
+    'HABILITADO': os.getenv('METRICAS_HABILITADO', 'False') == 'True',
+    # Peticiones que se conservan por ruta para calcular percentiles
+    'MUESTRAS_POR_RUTA': int(os.getenv('METRICAS_MUESTRAS_POR_RUTA', 1000)),
+}
+
+# Conteo cíclico por clasificación ABC (ver conteo_ciclico.py)
+CONTEO_CICLICO = {
+    # Clase A: artículos que suman el primer 80% del valor del almacén, B hasta el 95%, C el resto
+    'UMBRAL_A': 0.80,
+    'UMBRAL_B': 0.95,
+    # Con diferencias en capturas de los últimos N días el artículo sube una clase
+    'DIAS_DIFERENCIAS': 90,
+    # Cada cuántos días se vuelve a contar un artículo de cada clase
+    'FRECUENCIA_DIAS': {'A': 30, 'B': 90, 'C': 180},
+    # Artículos por almacén en el borrador diario
+    'ARTICULOS_POR_DIA': int(os.getenv('CONTEO_CICLICO_ARTICULOS_POR_DIA', 50)),
+}
+
 # -------------------------------------------------------------------------
 # MICROSIP INTEGRATION SETTINGS
 # -------------------------------------------------------------------------
@@ -181,17 +215,58 @@ MICROSIP_CONFIG = {
     'ROLE': 'RDB$ADMIN',
     'CONCEPTOS': {
         'ENTRADA_COMPRA_ID': 1,  
-        'ALMACEN_PRINCIPAL_ID': 1 
+        'ALMACEN_PRINCIPAL_ID': 1,
+        # Conceptos de ajuste por inventario físico (CONCEPTOS_IN en Microsip).
+        # Verificar los IDs en la empresa antes de activar el envío de conteos.
+        'ENTRADA_AJUSTE_ID': 3,
+        'SALIDA_AJUSTE_ID': 4,
     },
-    'CAMPO_BUSQUEDA_DEFECTO': 'CODIGO_BARRAS' 
+    'CAMPO_BUSQUEDA_DEFECTO': 'CODIGO_BARRAS',
+    # Renglones máximos por documento al enviar conteos (documentos grandes = menos llamadas)
+    'RENGLONES_POR_DOCUMENTO': 500,
+    # Reintentos máximos de un documento en ERROR antes de requerir revisión manual
+    'MAX_INTENTOS_DOCUMENTO': 5,
+    # True para usar MicrosipDLLSimulada (pruebas / Linux) en lugar de ApiMicrosip.dll
+    'USAR_DLL_SIMULADA': False,
+    # True para leer con LectorSimulado en lugar de Firebird (fdb)
+    'USAR_LECTOR_SIMULADO': False,
+    # La sesión con la DLL es persistente; se verifica (SELECT 1) si pasó este tiempo sin verificar
+    'SESION_VERIFICAR_CADA_SEGUNDOS': 60,
+}
+
+# Bloqueo (lease) que evita sincronizaciones simultáneas entre procesos.
+# El dueño renueva cada HEARTBEAT_SEGUNDOS; si deja de hacerlo, expira tras DURACION_SEGUNDOS.
+# ESPERA_ADJUNTAR_SEGUNDOS: máximo que espera una ejecución con si_ocupado='adjuntar'.
+SINCRONIZACION_LEASE = {
+    'DURACION_SEGUNDOS': 120,
+    'HEARTBEAT_SEGUNDOS': 30,
+    'ESPERA_ADJUNTAR_SEGUNDOS': 3600,
 }
 
+# -------------------------------------------------------------------------
+# WORKER DLL MICROSIP (proceso dedicado, ver microsip_api/microsip_api_worker.py)
+# -------------------------------------------------------------------------
+# Con HABILITADO=True, todas las llamadas a la DLL se hacen desde un solo proceso
+# y el servidor web / Django-Q pueden usar varios hilos o workers.
+MICROSIP_WORKER = {
+    'HABILITADO': os.getenv('MICROSIP_WORKER_HABILITADO', 'False') == 'True',
+    'HOST': '127.0.0.1',
+    'PUERTO': int(os.getenv('MICROSIP_WORKER_PUERTO', 8765)),
+    'AUTHKEY': os.getenv('MICROSIP_WORKER_AUTHKEY', ''),  # Vacío = se usa SECRET_KEY
+    'TIMEOUT_SEGUNDOS': 600,
+}
+
+# Hilos de Waitress (run_server.py). Sin el worker DLL se fuerza a 1.
+SERVIDOR_HILOS = int(os.getenv('SERVIDOR_HILOS', 8)) if MICROSIP_WORKER['HABILITADO'] else 1
+
 # -------------------------------------------------------------------------
 # DJANGO Q2 CONFIGURATION (Background Tasks)
 # -------------------------------------------------------------------------
 Q_CLUSTER = {
     'name': 'microsip_sync_cluster',
-    'workers': 1,  # IMPORTANTE: Mantener en 1 para evitar conflictos con la DLL de Microsip/Firebird
+    # IMPORTANTE: Sin worker DLL mantener en 1 para evitar conflictos con la DLL de Microsip.
+    # La sincronización ya está protegida por SINCRONIZACION_LEASE.
+    'workers': int(os.getenv('Q_WORKERS', 4)) if MICROSIP_WORKER['HABILITADO'] else 1,
     'recycle': 500, 
     'timeout': 3600, 
     'retry': 3700, 
@@ -202,37 +277,47 @@ Q_CLUSTER = {
 # Configuración para evitar el warning models.W042
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# -------------------------------------------------------------------------
+# LOGGING (ver registro_eventos.py)
+# -------------------------------------------------------------------------
+# Todo pasa por ColaHandler: el hilo que registra solo encola y un QueueListener escribe.
+# LOG_FORMATO: 'texto' (llave=valor) o 'json'. Niveles por subsistema con LOG_NIVEL_<SUBSISTEMA>.
+LOG_NIVEL = os.getenv('LOG_NIVEL', 'DEBUG' if DEBUG else 'INFO')
+
+
+def _nivel_subsistema(subsistema):
+    return {'level': os.getenv(f'LOG_NIVEL_{subsistema.upper()}', LOG_NIVEL)}
+
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
-    'formatters': {
-        'verbose': {
-            'format': '{levelname} {asctime} {module} {message}',
-            'style': '{',
-        },
-    },
     'handlers': {
-        'console': {
-            'level': 'DEBUG',
-            'class': 'logging.StreamHandler',
-            'formatter': 'verbose',
+        'cola': {
+            '()': 'capturador_inventario_api.registro_eventos.ColaHandler',
+            'formato': os.getenv('LOG_FORMATO', 'texto'),
         },
     },
     'loggers': {
         'django': {
-            'handlers': ['console'],
+            'handlers': ['cola'],
             'level': 'INFO',  
             'propagate': True,
         },
         'django.request': {
-            'handlers': ['console'],
+            'handlers': ['cola'],
             'level': 'DEBUG',  
             'propagate': True,
         },
         'capturador_inventario_api': {  
-            'handlers': ['console'],
-            'level': 'DEBUG',
+            'handlers': ['cola'],
+            'level': LOG_NIVEL,
             'propagate': True,
         },
+        # Subsistemas: heredan el handler, solo ajustan el nivel
+        'capturador_inventario_api.sync': _nivel_subsistema('sync'),        # sincronización de artículos/existencias
+        'capturador_inventario_api.dll': _nivel_subsistema('dll'),          # ApiMicrosip.dll y su worker
+        'capturador_inventario_api.envio': _nivel_subsistema('envio'),      # envío de conteos a Microsip
+        'capturador_inventario_api.tareas': _nivel_subsistema('tareas'),    # tareas de Django-Q
     },
-}
\ No newline at end of file
+}
@@ -1,22 +1,48 @@
 import time
 from django.utils import timezone
+from capturador_inventario_api.models import Almacen, BitacoraSincronizacion, Captura
 from capturador_inventario_api.microsip_api.microsip_api_sync_Articulos import InventariosService
+from capturador_inventario_api.microsip_api.microsip_api_envio_conteos import EnvioConteosService
+from capturador_inventario_api.catalogo_snapshot import generar_snapshots_catalogo
+from capturador_inventario_api.idempotencia import purgar_solicitudes_idempotentes
+from capturador_inventario_api.no_contados import calcular_no_contados
+from capturador_inventario_api.conteo_ciclico import clasificar_abc, generar_conteo_ciclico
+from capturador_inventario_api.registro_eventos import contexto_log, evento, medir, obtener_logger
 
-def task_sincronizar_inventario():
+log = obtener_logger('tareas')
+
+def task_sincronizar_inventario(bitacora_id=None):
     """
     Tarea envoltorio compatible con Django-Q para ejecutar la sincronización.
     Esta función es la que debes llamar desde el Schedule de Django-Q.
+    
+    Cuando la encola el endpoint /api/sincronizacion/ recibe el ID de la bitácora
+    ya creada (estado EN_COLA) para reportar el avance sobre ese mismo registro.
     """
-    print(f"[{timezone.now()}] Iniciando tarea en segundo plano: Sincronización Microsip...")
+    with contexto_log(tarea='sincronizar_inventario', bitacora=bitacora_id):
+        return _sincronizar_inventario(bitacora_id)
+
+
+def _sincronizar_inventario(bitacora_id):
+    log.info("Iniciando tarea en segundo plano: Sincronización Microsip")
     
+    bitacora = None
+    if bitacora_id is not None:
+        bitacora = BitacoraSincronizacion.objects.filter(pk=bitacora_id).first()
+
     # Instanciamos el servicio. 
-    # Nota: La conexión se maneja internamente en el método sincronizar_articulos gracias al decorador.
+    # Nota: La sincronización solo lee Firebird (fdb); no abre sesión con la DLL de Microsip.
     service = InventariosService()
     
     try:
         # Ejecutamos la lógica de sincronización
-        resultado = service.sincronizar_articulos()
+        resultado = service.sincronizar_articulos(bitacora=bitacora)
         
+        if resultado.get('omitida'):
+            mensaje = f"Tarea omitida: ya había una sincronización en curso (bitácora {resultado.get('bitacora_id')})."
+            evento(log, 'tarea.omitida', mensaje, bitacora_activa=resultado.get('bitacora_id'))
+            return mensaje
+
         # Obtenemos los resultados de forma segura
         creados = resultado.get('articulos_creados', 0)
         actualizados = resultado.get('articulos_actualizados', 0)
@@ -28,11 +54,137 @@ def task_sincronizar_inventario():
             f"Arts Actualizados: {actualizados}, "
             f"Inventarios Sync: {inventarios}."
         )
-        print(f"[{timezone.now()}] {mensaje}")
+        evento(
+            log, 'tarea.fin', mensaje,
+            articulos_creados=creados, articulos_actualizados=actualizados, inventarios=inventarios
+        )
+
+        # Catálogo offline de los handhelds. Si falla, la sincronización sigue siendo válida.
+        try:
+            bitacora_sync = BitacoraSincronizacion.objects.filter(pk=resultado.get('bitacora_id')).first()
+            with medir(log, 'tarea.catalogo_offline', "Catálogo offline generado"):
+                generar_snapshots_catalogo(bitacora=bitacora_sync)
+        except Exception as snapshot_e:
+            log.warning("No se pudo generar el catálogo offline: %s", snapshot_e, exc_info=True)
+
         return mensaje
 
     except Exception as e:
-        error_msg = f"Error crítico en tarea de sincronización: {str(e)}"
-        print(f"[{timezone.now()}] {error_msg}")
+        log.error("Error crítico en tarea de sincronización: %s", e, extra={'evento': 'tarea.error'})
         # Relanzamos la excepción para que Django-Q marque la tarea como Fallida y se pueda reintentar o auditar
-        raise e
\ No newline at end of file
+        raise e
+
+
+def task_simular_sincronizacion(muestra=20):
+    """
+    Tarea para Django-Q: simulación (dry-run) de la sincronización con Microsip.
+    Extrae y calcula los mismos cambios que task_sincronizar_inventario sin escribir
+    nada. Retorna el resumen; Django-Q lo guarda como resultado de la tarea
+    (lo consulta /api/sincronizacion/simulacion/<task_id>/).
+    """
+    with contexto_log(tarea='simular_sincronizacion'):
+        log.info("Iniciando tarea en segundo plano: Simulación de sincronización Microsip")
+        return InventariosService().sincronizar_articulos(simular=True, muestra=muestra)
+
+
+def task_enviar_conteos_microsip():
+    """
+    Tarea para Django-Q: convierte las capturas CONFIRMADAS en documentos de ajuste
+    (bandeja DocumentoMicrosip) y envía a Microsip todos los pendientes con una sola
+    conexión a la DLL. Los documentos que fallen se reintentan en la siguiente corrida.
+    Programarla en el Schedule de Django-Q (ej. cada hora).
+    """
+    with contexto_log(tarea='enviar_conteos_microsip'):
+        return _enviar_conteos_microsip()
+
+
+def _enviar_conteos_microsip():
+    log.info("Iniciando tarea en segundo plano: Envío de conteos a Microsip")
+    service = EnvioConteosService()
+
+    try:
+        preparacion = service.preparar_documentos()
+        envio = service.enviar_documentos_pendientes()
+
+        mensaje = (
+            f"Envío finalizado. "
+            f"Capturas procesadas: {preparacion['capturas_procesadas']}, "
+            f"Documentos creados: {preparacion['documentos_creados']}, "
+            f"Omitidos (lotes/series): {len(preparacion['articulos_omitidos'])}, "
+            f"Sin costo: {len(preparacion['articulos_sin_costo'])}, "
+            f"Aplicados: {envio['aplicados']}, "
+            f"Con error: {envio['errores']}."
+        )
+        evento(
+            log, 'tarea.fin', mensaje,
+            capturas=preparacion['capturas_procesadas'], documentos=preparacion['documentos_creados'],
+            aplicados=envio['aplicados'], errores=envio['errores']
+        )
+        return mensaje
+
+    except Exception as e:
+        log.exception("Error crítico en tarea de envío de conteos: %s", e, extra={'evento': 'tarea.error'})
+        raise e
+
+
+def task_purgar_solicitudes_idempotentes():
+    """
+    Tarea para Django-Q: elimina las respuestas guardadas de peticiones con
+    Idempotency-Key más viejas que IDEMPOTENCIA_RETENCION_HORAS.
+    Programarla en el Schedule de Django-Q (ej. diario).
+    """
+    eliminadas = purgar_solicitudes_idempotentes()
+    mensaje = f"Solicitudes idempotentes purgadas: {eliminadas}."
+    evento(log, 'tarea.fin', mensaje, tarea='purgar_solicitudes_idempotentes', eliminadas=eliminadas)
+    return mensaje
+
+
+def task_calcular_no_contados(captura_id):
+    """
+    Tarea para Django-Q: materializa los artículos con existencia que no se contaron
+    en la captura (ArticuloNoContado). Se encola al confirmar la captura.
+    """
+    captura = Captura.objects.filter(pk=captura_id).first()
+    if captura is None:
+        # La captura se borró entre que se encoló la tarea y se ejecutó
+        mensaje = f"Tarea omitida: la captura {captura_id} ya no existe."
+        evento(log, 'tarea.omitida', mensaje, tarea='calcular_no_contados', captura=captura_id)
+        return mensaje
+
+    with contexto_log(tarea='calcular_no_contados', captura=captura.folio):
+        try:
+            with medir(log, 'tarea.fin', "No contados calculados") as campos:
+                campos['articulos'] = total = calcular_no_contados(captura)
+        except Exception as e:
+            Captura.objects.filter(pk=captura_id).update(estado_no_contados='ERROR')
+            log.exception("Error calculando no contados: %s", e, extra={'evento': 'tarea.error'})
+            raise e
+
+    return f"Captura {captura.folio}: {total} artículos con existencia sin contar."
+
+
+def task_conteo_ciclico_diario():
+    """
+    Tarea para Django-Q: reclasifica (ABC) las existencias de cada almacén activo y
+    crea la captura BORRADOR de conteo cíclico del día con sus asignaciones.
+    Programarla en el Schedule de Django-Q (diario, antes del turno).
+    """
+    log.info("Iniciando tarea en segundo plano: Conteo cíclico diario")
+    ahora = timezone.now()
+    resultados = []
+
+    for almacen in Almacen.objects.filter(activo_web=True):
+        clases = clasificar_abc(almacen, ahora)
+        captura = generar_conteo_ciclico(almacen, ahora)
+        asignados = captura.asignaciones.count() if captura else 0
+        evento(
+            log, 'tarea.conteo_ciclico', "Conteo cíclico del almacén",
+            almacen=almacen.almacen_id_msip, folio=captura.folio if captura else None, asignados=asignados, **clases
+        )
+        resultados.append(
+            f"{almacen.nombre}: A={clases['A']} B={clases['B']} C={clases['C']}, "
+            f"{captura.folio if captura else 'sin captura'} ({asignados} artículos)"
+        )
+
+    mensaje = "Conteo cíclico generado. " + "; ".join(resultados)
+    return mensaje
@@ -0,0 +1,94 @@
+"""
+Totales acumulados de Captura (total_renglones, total_unidades,
+renglones_con_diferencia, total_tickets).
+
+Las rutas que escriben detalles y tickets los ajustan con incrementos F() en la
+misma transacción, así que los listados no necesitan leer DetalleCaptura.
+Si quedan desfasados (p. ej. ediciones desde el admin) se reconstruyen con:
+    python manage.py recalcular_totales_capturas
+"""
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from capturador_inventario_api.models import Captura, DetalleCaptura, TicketSalida
+
+_DECIMAL = DecimalField(max_digits=18, decimal_places=5)
+
+
+def _con_diferencia(contada, sistema):
+    return 1 if contada is not None and contada != sistema else 0
+
+
+def ajustar_totales(captura_id, renglones=0, unidades=0, con_diferencia=0, tickets=0):
+    """Aplica los incrementos (pueden ser negativos) con un solo UPDATE."""
+    cambios = {}
+    if renglones:
+        cambios['total_renglones'] = F('total_renglones') + renglones
+    if unidades:
+        cambios['total_unidades'] = F('total_unidades') + unidades
+    if con_diferencia:
+        cambios['renglones_con_diferencia'] = F('renglones_con_diferencia') + con_diferencia
+    if tickets:
+        cambios['total_tickets'] = F('total_tickets') + tickets
+    if cambios:
+        Captura.objects.filter(pk=captura_id).update(**cambios)
+
+
+def ajustar_por_detalle(detalle, contada_antes=None, sistema_antes=None, nuevo=False, tickets=0):
+    """
+    Incrementos para un detalle ya guardado. contada_antes/sistema_antes son los
+    valores previos (None si el detalle es nuevo).
+    """
+    antes = _con_diferencia(contada_antes, sistema_antes) if not nuevo else 0
+    despues = _con_diferencia(detalle.cantidad_contada, detalle.existencia_sistema_al_momento)
+    ajustar_totales(
+        detalle.captura_id,
+        renglones=1 if nuevo else 0,
+        unidades=detalle.cantidad_contada - (contada_antes or 0),
+        con_diferencia=despues - antes,
+        tickets=tickets
+    )
+
+
+def restar_detalle(detalle):
+    """Antes de borrar un detalle (sus tickets se borran en cascada)."""
+    tickets = TicketSalida.objects.filter(detalle=detalle).aggregate(total=Sum('cantidad'))['total'] or 0
+    ajustar_totales(
+        detalle.captura_id,
+        renglones=-1,
+        unidades=-detalle.cantidad_contada,
+        con_diferencia=-_con_diferencia(detalle.cantidad_contada, detalle.existencia_sistema_al_momento),
+        tickets=-tickets
+    )
+
+
+def recalcular_totales(capturas=None):
+    """Reconstruye los totales con un UPDATE por conjunto (subconsultas por captura)."""
+    if capturas is None:
+        capturas = Captura.objects.all()
+
+    detalles = DetalleCaptura.objects.filter(captura=OuterRef('pk')).order_by().values('captura')
+    tickets = TicketSalida.objects.filter(detalle__captura=OuterRef('pk')).order_by().values('detalle__captura')
+    cero = Value(Decimal('0'))
+
+    return capturas.update(
+        total_renglones=Coalesce(
+            Subquery(detalles.annotate(n=Count('id')).values('n'), output_field=IntegerField()), Value(0)
+        ),
+        total_unidades=Coalesce(
+            Subquery(detalles.annotate(s=Sum('cantidad_contada')).values('s'), output_field=_DECIMAL), cero,
+            output_field=_DECIMAL
+        ),
+        renglones_con_diferencia=Coalesce(
+            Subquery(
+                detalles.exclude(cantidad_contada=F('existencia_sistema_al_momento')).annotate(n=Count('id')).values('n'),
+                output_field=IntegerField()
+            ), Value(0)
+        ),
+        total_tickets=Coalesce(
+            Subquery(tickets.annotate(s=Sum('cantidad')).values('s'), output_field=_DECIMAL), cero,
+            output_field=_DECIMAL
+        )
+    )
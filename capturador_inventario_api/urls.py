@@ -14,6 +14,31 @@ from .views.empleado import UsuarioGestionView, UsuarioListView
 # --- NUEVO: Importamos las vistas del Dashboard ---
 from .views.dashboard import DashboardKPIView, DashboardChartsView
 
+# Sincronización con Microsip bajo demanda
+from .views.sincronizacion import SincronizacionView, SincronizacionEstadoView, SincronizacionSimulacionView, SincronizacionSimulacionResultadoView
+from .views.metricas import MetricasView
+
+# Búsqueda de artículos por texto
+from .views.busquedaArticulos import ArticuloTextoBusquedaView, ArticuloBusquedaMasivaView
+
+# Catálogo offline por almacén
+from .views.catalogo import CatalogoSnapshotView, CatalogoCambiosView
+
+# Subida por fragmentos (conteos grandes)
+from .views.cargaCaptura import (
+    CargaCapturaCrearView, CargaCapturaEstadoView, FragmentoCargaView, CargaCapturaConfirmarView
+)
+
+# Ruta de conteo por localización
+from .views.rutaConteo import RutaConteoView
+from .views.reabasto import ReabastoView
+
+# Conteo cíclico (ABC)
+from .views.conteoCiclico import ConteoCiclicoListView, AsignacionesConteoView
+
+# Artículos con existencia que no se contaron
+from .views.noContados import ArticulosNoContadosView
+
 # Importamos vistas de inventario
 from .views.capturaInventario import (
     AlmacenOptionsView, 
@@ -35,6 +60,17 @@ urlpatterns = [
     path("api/dashboard/kpi/", DashboardKPIView.as_view(), name="api-dashboard-kpi"),
     path("api/dashboard/charts/", DashboardChartsView.as_view(), name="api-dashboard-charts"),
 
+    # --- SINCRONIZACIÓN MICROSIP ---
+    # POST encola (o reutiliza la que está en curso), GET consulta el avance
+    path("api/sincronizacion/", SincronizacionView.as_view(), name="api-sincronizacion"),
+    path("api/sincronizacion/<int:pk>/", SincronizacionEstadoView.as_view(), name="api-sincronizacion-estado"),
+    # Dry-run: POST encola, GET consulta el resumen
+    path("api/sincronizacion/simulacion/", SincronizacionSimulacionView.as_view(), name="api-sincronizacion-simulacion"),
+    path("api/sincronizacion/simulacion/<str:task_id>/", SincronizacionSimulacionResultadoView.as_view(), name="api-sincronizacion-simulacion-resultado"),
+
+    # --- MÉTRICAS DE RENDIMIENTO (solo ADMIN, requiere METRICAS_HABILITADO) ---
+    path("api/metricas/", MetricasView.as_view(), name="api-metricas"),
+
     # --- GESTIÓN DE USUARIOS UNIFICADA ---
     
     # 1. URL PARA OBTENER TODOS (LISTADO)
@@ -50,9 +86,15 @@ urlpatterns = [
     # 0. Catálogos
     path("api/inventario/almacenes/", AlmacenOptionsView.as_view(), name="api-almacenes-list"),
     path("api/inventario/estados/", EstadoCapturaOptionsView.as_view(), name="api-estados-list"),
+    path("api/inventario/almacenes/<int:pk>/catalogo/", CatalogoSnapshotView.as_view(), name="api-almacen-catalogo"),
+    path("api/inventario/almacenes/<int:pk>/catalogo/cambios/", CatalogoCambiosView.as_view(), name="api-almacen-catalogo-cambios"),
+    path("api/inventario/almacenes/<int:pk>/ruta-conteo/", RutaConteoView.as_view(), name="api-almacen-ruta-conteo"),
+    path("api/inventario/almacenes/<int:pk>/reabasto/", ReabastoView.as_view(), name="api-almacen-reabasto"),
 
     # 0.1 Búsqueda
     path("api/inventario/buscar-articulo/", ArticuloBusquedaView.as_view(), name="api-buscar-articulo"),
+    path("api/inventario/articulos/buscar/", ArticuloTextoBusquedaView.as_view(), name="api-articulos-buscar"),
+    path("api/inventario/buscar-articulos/", ArticuloBusquedaMasivaView.as_view(), name="api-buscar-articulos-lote"),
 
     # 1. Gestión de Cabecera
     path("api/inventario/captura/", CapturaInventarioView.as_view(), name="api-captura-create"),
@@ -61,6 +103,12 @@ urlpatterns = [
     # 2. Sincronización
     path("api/inventario/captura/<int:pk>/sincronizar/", SincronizarCapturaView.as_view(), name="api-captura-sync"),
 
+    # 2.1 Subida por fragmentos: abrir carga, enviar fragmentos (gzip), consultar faltantes y confirmar
+    path("api/inventario/captura/<int:pk>/cargas/", CargaCapturaCrearView.as_view(), name="api-captura-carga-create"),
+    path("api/inventario/cargas/<int:pk>/", CargaCapturaEstadoView.as_view(), name="api-carga-estado"),
+    path("api/inventario/cargas/<int:pk>/fragmentos/<int:numero>/", FragmentoCargaView.as_view(), name="api-carga-fragmento"),
+    path("api/inventario/cargas/<int:pk>/confirmar/", CargaCapturaConfirmarView.as_view(), name="api-carga-confirmar"),
+
     # 3. Detalle Individual
     path("api/inventario/detalle/", DetalleIndividualView.as_view(), name="api-detalle-create"),
     path("api/inventario/detalle/<int:pk>/", DetalleIndividualView.as_view(), name="api-detalle-manage"),
@@ -71,6 +119,13 @@ urlpatterns = [
     # 5. Exportar
     path("api/inventario/captura/<int:pk>/excel/", ExportarCapturaExcelView.as_view(), name="api-captura-excel"),
 
+    # 6. Artículos no contados (paginado o ?formato=xlsx)
+    path("api/inventario/captura/<int:pk>/no-contados/", ArticulosNoContadosView.as_view(), name="api-captura-no-contados"),
+
+    # 7. Conteo cíclico: borradores del día y artículos asignados (en orden de ruta)
+    path("api/inventario/conteo-ciclico/", ConteoCiclicoListView.as_view(), name="api-conteo-ciclico-list"),
+    path("api/inventario/captura/<int:pk>/asignaciones/", AsignacionesConteoView.as_view(), name="api-captura-asignaciones"),
+
     # --- RUTAS DE AUTENTICACIÓN ---
     path("api/login/", CustomAuthToken.as_view(), name="api-login"),
     path("api/logout/", Logout.as_view(), name="api-logout"),
@@ -1,4 +1,5 @@
 from django.db.models import *
+from django.db import transaction
 from capturador_inventario_api.models import *
 from capturador_inventario_api.serializers import *
 from capturador_inventario_api.models import *
@@ -8,6 +9,7 @@ from rest_framework import status
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.authtoken.models import Token
 from rest_framework.response import Response
+from capturador_inventario_api.permisos import resolver_rol
 
 class CustomAuthToken(ObtainAuthToken):
 
@@ -19,30 +21,9 @@ class CustomAuthToken(ObtainAuthToken):
         user = serializer.validated_data['user']
         
         if user.is_active:
-            # 1. Obtener roles de Django Groups
-            roles = user.groups.all()
-            role_names = [role.name for role in roles]
-
-            # 2. Lógica para definir el 'rol' principal (Singular)
-            # Esto es vital para que el frontend sepa si es ADMIN o CAPTURADOR sin procesar arrays
-            main_role = None
-            
-            if 'ADMIN' in role_names:
-                main_role = 'ADMIN'
-            elif role_names:
-                main_role = role_names[0] # Tomar el primero si hay otros
-            
-            # 3. Fallback: Si no tiene grupos, buscar en el modelo Empleado
-            if not main_role:
-                try:
-                    if hasattr(user, 'empleado'):
-                        main_role = user.empleado.puesto
-                except Exception:
-                    pass
-
-            # Si aun así es nulo, default a user
-            if not main_role:
-                main_role = 'user'
+            # Rol principal (singular) para que el frontend sepa si es ADMIN o CAPTURADOR
+            # sin procesar arrays. Misma resolución que usan los permisos de las vistas.
+            main_role, role_names = resolver_rol(user)
 
             token, created = Token.objects.get_or_create(user=user)
 
@@ -70,7 +51,10 @@ class Logout(generics.GenericAPIView):
         if user.is_active:
             try:
                 token = Token.objects.get(user=user)
-                token.delete()
+                # El cache se descarta al confirmar, ya sin el token en la BD
+                with transaction.atomic():
+                    invalidar_cache_token(user)
+                    token.delete()
                 return Response({'logout':True})
             except Token.DoesNotExist:
                 return Response({'logout': False, 'message': 'Token no encontrado'})
@@ -0,0 +1,188 @@
+import re
+from django.db import connection
+from django.db.models import Q, Case, When, IntegerField, OuterRef, Subquery, Value
+from django.db.models.expressions import RawSQL
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from rest_framework import status
+
+from ..models import Articulo, ClaveAuxiliar, InventarioArticulo
+
+LIMITE_DEFECTO = 20
+LIMITE_MAXIMO = 50
+
+# InnoDB ignora palabras más cortas que innodb_ft_min_token_size (3 por defecto)
+FULLTEXT_LONGITUD_MINIMA = 3
+
+# Caracteres con significado en el modo booleano de MATCH ... AGAINST
+_OPERADORES_FULLTEXT = re.compile(r'[+\-<>()~*"@]+')
+
+
+def _terminos(texto):
+    return [t for t in _OPERADORES_FULLTEXT.sub(' ', texto).split() if t]
+
+
+def _buscar_fulltext(queryset, terminos):
+    """
+    MariaDB: índice FULLTEXT (clave, nombre) en modo booleano. Cada término es
+    obligatorio y se busca por prefijo ("+tornillo* +hex*"); se ordena por relevancia.
+    """
+    consulta = ' '.join(f'+{t}*' for t in terminos)
+    tabla = Articulo._meta.db_table
+    return queryset.annotate(
+        relevancia=RawSQL(f"MATCH ({tabla}.clave, {tabla}.nombre) AGAINST (%s IN BOOLEAN MODE)", (consulta,))
+    ).filter(relevancia__gt=0).order_by('-relevancia', 'nombre')
+
+
+def _buscar_simple(queryset, terminos, texto):
+    """Respaldo (otros motores o términos cortos): todos los términos en clave o nombre."""
+    for termino in terminos:
+        queryset = queryset.filter(Q(nombre__icontains=termino) | Q(clave__istartswith=termino))
+    return queryset.annotate(
+        relevancia=Case(
+            When(clave__iexact=texto, then=Value(3)),
+            When(clave__istartswith=texto, then=Value(2)),
+            When(nombre__istartswith=texto, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField()
+        )
+    ).order_by('-relevancia', 'nombre')
+
+
+class ArticuloTextoBusquedaView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    """
+    Endpoint: GET /api/inventario/articulos/buscar/?q=tornillo hex&almacen=ID&limite=20
+    Búsqueda por nombre o clave (prefijos, varias palabras) ordenada por relevancia,
+    para cuando no se puede escanear la etiqueta.
+    """
+    def get(self, request, *args, **kwargs):
+        texto = request.query_params.get('q', '').strip()
+        almacen_id = request.query_params.get('almacen')
+
+        terminos = _terminos(texto)
+        if not terminos:
+            return Response({"error": "Texto de búsqueda no proporcionado"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            limite = max(1, min(int(request.query_params.get('limite', LIMITE_DEFECTO)), LIMITE_MAXIMO))
+        except ValueError:
+            limite = LIMITE_DEFECTO
+
+        queryset = Articulo.objects.filter(activo=True)
+
+        usar_fulltext = (
+            connection.vendor == 'mysql'
+            and all(len(t) >= FULLTEXT_LONGITUD_MINIMA for t in terminos)
+        )
+        if usar_fulltext:
+            queryset = _buscar_fulltext(queryset, terminos)
+        else:
+            queryset = _buscar_simple(queryset, terminos, texto)
+
+        if almacen_id:
+            queryset = queryset.annotate(
+                existencia_teorica=Subquery(
+                    InventarioArticulo.objects.filter(
+                        articulo=OuterRef('pk'), almacen_id=almacen_id
+                    ).values('existencia')[:1]
+                )
+            )
+
+        campos = ['id', 'clave', 'nombre'] + (['existencia_teorica'] if almacen_id else [])
+        resultados = list(queryset.values(*campos)[:limite])
+        if almacen_id:
+            for fila in resultados:
+                if fila['existencia_teorica'] is None:
+                    fila['existencia_teorica'] = 0
+
+        return Response({"resultados": resultados, "total": len(resultados)}, status=status.HTTP_200_OK)
+
+
+# -------------------------------------------------------------------------
+# BÚSQUEDA MASIVA POR CÓDIGO (cola offline de los handhelds)
+# -------------------------------------------------------------------------
+
+MAX_CODIGOS_LOTE = 1000
+
+
+def _normalizar_codigo(codigo):
+    return str(codigo).strip().upper()
+
+
+def resolver_codigos(normalizados):
+    """
+    Resuelve códigos ya normalizados a artículos con dos consultas por conjunto:
+    clave principal y luego claves auxiliares para los que falten.
+    Retorna {codigo: Articulo} (solo id, clave y nombre cargados).
+    """
+    articulo_por_codigo = {}
+    for articulo in Articulo.objects.filter(clave__in=normalizados).only('id', 'clave', 'nombre'):
+        articulo_por_codigo[articulo.clave.upper()] = articulo
+
+    pendientes = [c for c in normalizados if c not in articulo_por_codigo]
+    if pendientes:
+        auxiliares = ClaveAuxiliar.objects.filter(clave__in=pendientes).select_related('articulo').only(
+            'clave', 'articulo__id', 'articulo__clave', 'articulo__nombre'
+        )
+        for aux in auxiliares:
+            articulo_por_codigo.setdefault(aux.clave.upper(), aux.articulo)
+
+    return articulo_por_codigo
+
+
+class ArticuloBusquedaMasivaView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    """
+    Endpoint: POST /api/inventario/buscar-articulos/
+    Body: {"codigos": ["750100...", "TOR-10", ...], "almacen": ID}
+    Resuelve todos los códigos (clave principal o auxiliar) con consultas por
+    conjunto, igual que /buscar-articulo/ pero en una sola petición.
+    """
+    def post(self, request, *args, **kwargs):
+        codigos = request.data.get('codigos')
+        almacen_id = request.data.get('almacen')
+
+        if not isinstance(codigos, list) or not codigos:
+            return Response({"error": "Se requiere una lista de códigos en 'codigos'."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(codigos) > MAX_CODIGOS_LOTE:
+            return Response({"error": f"Máximo {MAX_CODIGOS_LOTE} códigos por petición."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Conserva el orden de llegada y quita duplicados/vacíos
+        normalizados = list(dict.fromkeys(c for c in map(_normalizar_codigo, codigos) if c))
+
+        # 1. Clave principal y 2. claves auxiliares
+        articulo_por_codigo = resolver_codigos(normalizados)
+
+        # 3. Existencias del almacén en una sola consulta
+        existencias = {}
+        if almacen_id and articulo_por_codigo:
+            existencias = dict(
+                InventarioArticulo.objects.filter(
+                    almacen_id=almacen_id,
+                    articulo_id__in={a.id for a in articulo_por_codigo.values()}
+                ).values_list('articulo_id', 'existencia')
+            )
+
+        encontrados = []
+        no_encontrados = []
+        for codigo in normalizados:
+            articulo = articulo_por_codigo.get(codigo)
+            if articulo is None:
+                no_encontrados.append(codigo)
+                continue
+            encontrados.append({
+                "codigo": codigo,
+                "id": articulo.id,
+                "clave": articulo.clave,
+                "nombre": articulo.nombre,
+                "existencia_teorica": existencias.get(articulo.id, 0)
+            })
+
+        return Response({
+            "encontrados": encontrados,
+            "no_encontrados": no_encontrados
+        }, status=status.HTTP_200_OK)
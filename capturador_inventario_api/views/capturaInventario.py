@@ -10,7 +10,12 @@ from rest_framework.permissions import IsAuthenticated, AllowAny # Importar perm
 
 # Importamos InventarioArticulo
 from ..models import Captura, DetalleCaptura, Almacen, Articulo, ClaveAuxiliar, TicketSalida, InventarioArticulo
-from ..serializers import CapturaSerializer, DetalleCapturaSerializer, AlmacenSerializer, TicketSalidaSerializer
+from ..serializers import CapturaSerializer, CapturaListaSerializer, DetalleCapturaSerializer, AlmacenSerializer, TicketSalidaSerializer
+from ..permisos import es_administrador
+from ..idempotencia import idempotente
+from ..conciliacion import conciliar_captura, limpiar_conciliacion, reconciliar_si_confirmada
+from ..totales_captura import ajustar_totales, restar_detalle
+from ..no_contados import encolar_calculo_no_contados
 
 # --- NUEVA VISTA: Opciones de Estado ---
 class EstadoCapturaOptionsView(APIView):
@@ -78,30 +83,46 @@ class ArticuloBusquedaView(APIView):
         else:
             return Response({"error": "Producto no encontrado"}, status=status.HTTP_404_NOT_FOUND)
 
+def _al_confirmar(captura):
+    """Conciliación (se calcula una vez y los reportes leen lo guardado) y no contados."""
+    conciliar_captura(captura)
+    # Artículos con existencia que no se contaron (segundo plano)
+    if captura.almacen_id:
+        transaction.on_commit(lambda: encolar_calculo_no_contados(captura))
+
+
 class CapturaInventarioView(APIView):
     permission_classes = [IsAuthenticated] # CRÍTICO: Esto evita el error de AnonymousUser
 
     def get(self, request, *args, **kwargs):
         # LÓGICA DE PERMISOS ADMIN
-        es_admin = False
-        if hasattr(request.user, 'empleado') and request.user.empleado.puesto == 'ADMIN':
-            es_admin = True
-        
-        if es_admin:
+        if es_administrador(request.user):
             capturas = Captura.objects.all().order_by('-fecha_captura')
         else:
             # Aquí fallaba antes porque request.user era AnonymousUser
             capturas = Captura.objects.filter(capturador=request.user).order_by('-fecha_captura')
-            
-        serializer = CapturaSerializer(capturas, many=True)
+
+        # Por defecto solo cabeceras con sus totales acumulados (no lee DetalleCaptura).
+        # ?incluir_detalles=1 conserva la respuesta anterior con los detalles anidados.
+        if request.query_params.get('incluir_detalles') in ('1', 'true'):
+            capturas = capturas.select_related('capturador', 'almacen').prefetch_related(
+                'detalles__articulo', 'detalles__tickets'
+            )
+            serializer = CapturaSerializer(capturas, many=True)
+        else:
+            serializer = CapturaListaSerializer(capturas.select_related('capturador', 'almacen'), many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @idempotente
     def post(self, request, *args, **kwargs):
         serializer = CapturaSerializer(data=request.data)
         if serializer.is_valid():
             try:
                 with transaction.atomic():
                     captura = serializer.save()
+                    # Capturas que llegan ya confirmadas (p. ej. desde el modo offline)
+                    if captura.estado == 'CONFIRMADO':
+                        _al_confirmar(captura)
                 return Response({
                     "mensaje": "Captura guardada exitosamente.",
                     "folio": captura.folio,
@@ -121,8 +142,8 @@ class CapturaDetailView(APIView):
     def get(self, request, pk, *args, **kwargs):
         captura = get_object_or_404(Captura, pk=pk)
         
-        es_admin = hasattr(request.user, 'empleado') and request.user.empleado.puesto == 'ADMIN'
-        if not es_admin and captura.capturador != request.user:
+        es_admin = es_administrador(request.user)
+        if not es_admin and captura.capturador_id != request.user.id:
              return Response({"error": "No tienes permiso para ver esta captura."}, status=status.HTTP_403_FORBIDDEN)
 
         serializer = CapturaSerializer(captura)
@@ -131,8 +152,8 @@ class CapturaDetailView(APIView):
     def delete(self, request, pk, *args, **kwargs):
         captura = get_object_or_404(Captura, pk=pk)
         
-        es_admin = hasattr(request.user, 'empleado') and request.user.empleado.puesto == 'ADMIN'
-        if not es_admin and captura.capturador != request.user:
+        es_admin = es_administrador(request.user)
+        if not es_admin and captura.capturador_id != request.user.id:
              return Response({"error": "No tienes permiso para eliminar esta captura."}, status=status.HTTP_403_FORBIDDEN)
 
         try:
@@ -144,10 +165,10 @@ class CapturaDetailView(APIView):
     def patch(self, request, pk, *args, **kwargs):
         captura = get_object_or_404(Captura, pk=pk)
         
-        es_admin = hasattr(request.user, 'empleado') and request.user.empleado.puesto == 'ADMIN'
+        es_admin = es_administrador(request.user)
         
         # 1. Permiso básico de edición
-        if not es_admin and captura.capturador != request.user:
+        if not es_admin and captura.capturador_id != request.user.id:
              return Response({"error": "No tienes permiso para editar esta captura."}, status=status.HTTP_403_FORBIDDEN)
 
         # 2. VALIDACIÓN EXTRA: Si intenta cambiar el ESTADO y NO es admin -> Prohibido
@@ -159,15 +180,24 @@ class CapturaDetailView(APIView):
                     status=status.HTTP_403_FORBIDDEN
                 )
 
+        estado_anterior = captura.estado
         serializer = CapturaSerializer(captura, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                captura = serializer.save()
+                # 3. Conciliación y no contados al confirmar
+                if captura.estado != estado_anterior:
+                    if captura.estado == 'CONFIRMADO':
+                        _al_confirmar(captura)
+                    elif captura.estado == 'BORRADOR':
+                        limpiar_conciliacion(captura)
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class SincronizarCapturaView(APIView):
     permission_classes = [IsAuthenticated] # Proteger
 
+    @idempotente
     def post(self, request, pk, *args, **kwargs):
         captura = get_object_or_404(Captura, pk=pk)
 
@@ -201,6 +231,7 @@ class SincronizarCapturaView(APIView):
 class DetalleIndividualView(APIView):
     permission_classes = [IsAuthenticated] # Proteger
 
+    @idempotente
     def post(self, request, *args, **kwargs):
         data = request.data.copy()
         if 'captura_id' in data:
@@ -208,26 +239,32 @@ class DetalleIndividualView(APIView):
 
         serializer = DetalleCapturaSerializer(data=data)
         if serializer.is_valid():
-            serializer.save()
+            # El detalle y el ajuste de totales de la captura van juntos
+            with transaction.atomic():
+                serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     def delete(self, request, pk, *args, **kwargs):
         detalle = get_object_or_404(DetalleCaptura, pk=pk)
-        detalle.delete()
+        with transaction.atomic():
+            restar_detalle(detalle)
+            detalle.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     def patch(self, request, pk, *args, **kwargs):
         detalle = get_object_or_404(DetalleCaptura, pk=pk)
         serializer = DetalleCapturaSerializer(detalle, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class TicketCreateView(APIView):
     permission_classes = [IsAuthenticated] # Proteger
 
+    @idempotente
     def post(self, request, *args, **kwargs):
         serializer = TicketSalidaSerializer(data=request.data)
         
@@ -244,11 +281,21 @@ class TicketCreateView(APIView):
                             "error": f"No se pueden retirar {cantidad_ticket} piezas. Solo hay {detalle.cantidad_contada} capturadas."
                         }, status=status.HTTP_400_BAD_REQUEST)
 
+                    tenia_diferencia = detalle.cantidad_contada != detalle.existencia_sistema_al_momento
                     detalle.cantidad_contada -= cantidad_ticket
                     detalle.save()
 
                     ticket = serializer.save()
 
+                    tiene_diferencia = detalle.cantidad_contada != detalle.existencia_sistema_al_momento
+                    ajustar_totales(
+                        detalle.captura_id,
+                        unidades=-cantidad_ticket,
+                        con_diferencia=int(tiene_diferencia) - int(tenia_diferencia),
+                        tickets=cantidad_ticket
+                    )
+                    reconciliar_si_confirmada(detalle.captura, [detalle.pk])
+
                 return Response({
                     "mensaje": "Ticket generado y cantidad descontada.",
                     "ticket_id": ticket.id,
@@ -270,8 +317,8 @@ class ExportarCapturaExcelView(APIView):
     def get(self, request, pk, *args, **kwargs):
         captura = get_object_or_404(Captura, pk=pk)
         
-        es_admin = hasattr(request.user, 'empleado') and request.user.empleado.puesto == 'ADMIN'
-        if not es_admin and captura.capturador != request.user:
+        es_admin = es_administrador(request.user)
+        if not es_admin and captura.capturador_id != request.user.id:
              return Response({"error": "No tienes permiso para descargar esta captura."}, status=status.HTTP_403_FORBIDDEN)
 
         detalles = captura.detalles.all().select_related('articulo').order_by('id')
@@ -291,6 +338,23 @@ class ExportarCapturaExcelView(APIView):
             
             row_num += 1
 
+        # Hoja de conciliación (columnas calculadas al confirmar). La primera hoja
+        # conserva el formato clave/cantidad para importar.
+        if captura.estado != 'BORRADOR':
+            ws_conc = wb.create_sheet("Conciliacion")
+            ws_conc.append(["Clave", "Artículo", "Contado", "Sistema", "Tickets", "Diferencia", "Diferencia $", "Estatus"])
+            for detalle in detalles:
+                ws_conc.append([
+                    detalle.articulo.clave if detalle.articulo else "SIN_CLAVE",
+                    detalle.articulo.nombre if detalle.articulo else "",
+                    detalle.cantidad_contada,
+                    detalle.existencia_sistema_al_momento,
+                    detalle.total_tickets,
+                    detalle.diferencia,
+                    detalle.diferencia_valor,
+                    detalle.estatus_conciliacion
+                ])
+
         buffer = BytesIO()
         wb.save(buffer)
         buffer.seek(0)
@@ -0,0 +1,289 @@
+"""
+Protocolo de subida por fragmentos para conteos grandes.
+
+1. POST /api/inventario/captura/<pk>/cargas/            {"total_fragmentos": N}  -> carga_id
+2. PUT  /api/inventario/cargas/<id>/fragmentos/<n>/      arreglo JSON de detalles (opcional gzip)
+   Cada fragmento (0..N-1) se valida y se guarda al llegar. Reenviar un fragmento lo reemplaza.
+3. GET  /api/inventario/cargas/<id>/                     fragmentos recibidos / faltantes
+4. POST /api/inventario/cargas/<id>/confirmar/           aplica todo en una transacción corta
+
+Los detalles tienen el mismo formato que /captura/<pk>/sincronizar/:
+{"articulo_id": 12} o {"producto_codigo": "750..."} y "cantidad_contada".
+"""
+import json
+import zlib
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from rest_framework import status
+
+from ..models import Articulo, Captura, CargaCaptura, DetalleCaptura, FragmentoCarga, InventarioArticulo
+from ..permisos import es_administrador
+from ..idempotencia import idempotente
+from ..totales_captura import ajustar_totales
+from ..conciliacion import reconciliar_si_confirmada
+from .busquedaArticulos import resolver_codigos, _normalizar_codigo
+
+MAX_FRAGMENTOS = 1000
+MAX_RENGLONES_FRAGMENTO = 5000
+# Límite del cuerpo ya descomprimido (protege contra "gzip bombs")
+MAX_BYTES_FRAGMENTO = 10 * 1024 * 1024
+
+
+def _puede_editar(user, captura):
+    return es_administrador(user) or captura.capturador_id == user.id
+
+
+def _leer_cuerpo_fragmento(request):
+    """Lee el cuerpo crudo (gzip si lo indica Content-Encoding o la firma) y lo parsea como JSON."""
+    cuerpo = request.body
+    if request.headers.get('Content-Encoding', '').lower() == 'gzip' or cuerpo[:2] == b'\x1f\x8b':
+        descompresor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        cuerpo = descompresor.decompress(cuerpo, MAX_BYTES_FRAGMENTO + 1)
+        if len(cuerpo) > MAX_BYTES_FRAGMENTO:
+            raise ValueError("El fragmento descomprimido excede el tamaño máximo.")
+    elif len(cuerpo) > MAX_BYTES_FRAGMENTO:
+        raise ValueError("El fragmento excede el tamaño máximo.")
+    return json.loads(cuerpo.decode('utf-8'))
+
+
+def _validar_renglones(datos):
+    """
+    Valida un fragmento y resuelve los artículos con consultas por conjunto.
+    Retorna (renglones_normalizados, errores_por_indice).
+    """
+    errores = {}
+    pendientes = []
+    ids = set()
+    codigos = set()
+
+    for indice, item in enumerate(datos):
+        if not isinstance(item, dict):
+            errores[indice] = "Se esperaba un objeto."
+            continue
+        try:
+            cantidad = Decimal(str(item.get('cantidad_contada')))
+            if not cantidad.is_finite() or cantidad.as_tuple().exponent < -5 or abs(cantidad) >= Decimal('1e13'):
+                raise InvalidOperation
+        except (InvalidOperation, ValueError):
+            errores[indice] = "cantidad_contada inválida."
+            continue
+
+        try:
+            articulo_id = int(item['articulo_id']) if item.get('articulo_id') else None
+        except (TypeError, ValueError):
+            errores[indice] = "articulo_id inválido."
+            continue
+        codigo = _normalizar_codigo(item.get('producto_codigo') or '')
+        if articulo_id:
+            ids.add(articulo_id)
+        elif codigo:
+            codigos.add(codigo)
+        else:
+            errores[indice] = "Se requiere articulo_id o producto_codigo."
+            continue
+        pendientes.append((indice, articulo_id, codigo, cantidad))
+
+    ids_validos = set(Articulo.objects.filter(pk__in=ids).values_list('pk', flat=True)) if ids else set()
+    por_codigo = resolver_codigos(list(codigos)) if codigos else {}
+
+    renglones = []
+    for indice, articulo_id, codigo, cantidad in pendientes:
+        if articulo_id in ids_validos:
+            resuelto = articulo_id
+        elif codigo in por_codigo:
+            resuelto = por_codigo[codigo].id
+        else:
+            errores[indice] = f"No se encontró el artículo (ID: {articulo_id} o Clave: {codigo})."
+            continue
+        renglones.append({"articulo_id": resuelto, "cantidad_contada": str(cantidad)})
+
+    return renglones, errores
+
+
+def _estado_carga(carga):
+    recibidos = sorted(carga.fragmentos.values_list('numero', flat=True))
+    faltantes = sorted(set(range(carga.total_fragmentos)) - set(recibidos))
+    return {
+        "carga_id": carga.id,
+        "captura_id": carga.captura_id,
+        "estado": carga.estado,
+        "total_fragmentos": carga.total_fragmentos,
+        "recibidos": recibidos,
+        "faltantes": faltantes
+    }
+
+
+def _aplicar_carga(carga):
+    """
+    Suma los renglones de todos los fragmentos a los detalles de la captura (misma
+    regla que DetalleCapturaSerializer: si el artículo ya está, se incrementa).
+    """
+    totales = defaultdict(Decimal)
+    for renglones in carga.fragmentos.values_list('renglones', flat=True):
+        for renglon in renglones:
+            totales[renglon['articulo_id']] += Decimal(renglon['cantidad_contada'])
+
+    captura = carga.captura
+    existentes = {
+        d.articulo_id: d
+        for d in DetalleCaptura.objects.select_for_update().filter(captura=captura, articulo_id__in=list(totales))
+    }
+
+    existencias = {}
+    if captura.almacen_id:
+        existencias = dict(
+            InventarioArticulo.objects.filter(
+                almacen_id=captura.almacen_id, articulo_id__in=[a for a in totales if a not in existentes]
+            ).values_list('articulo_id', 'existencia')
+        )
+
+    actualizar = []
+    crear = []
+    con_diferencia = 0
+    for articulo_id, cantidad in totales.items():
+        detalle = existentes.get(articulo_id)
+        if detalle:
+            con_diferencia -= int(detalle.cantidad_contada != detalle.existencia_sistema_al_momento)
+            detalle.cantidad_contada += cantidad
+            actualizar.append(detalle)
+        else:
+            detalle = DetalleCaptura(
+                captura=captura,
+                articulo_id=articulo_id,
+                cantidad_contada=cantidad,
+                existencia_sistema_al_momento=existencias.get(articulo_id, 0)
+            )
+            crear.append(detalle)
+        con_diferencia += int(detalle.cantidad_contada != detalle.existencia_sistema_al_momento)
+
+    if actualizar:
+        DetalleCaptura.objects.bulk_update(actualizar, ['cantidad_contada'], batch_size=2000)
+    if crear:
+        DetalleCaptura.objects.bulk_create(crear, batch_size=2000)
+
+    ajustar_totales(
+        captura.id,
+        renglones=len(crear),
+        unidades=sum(totales.values()),
+        con_diferencia=con_diferencia
+    )
+    reconciliar_si_confirmada(captura)
+
+    return {"articulos_actualizados": len(actualizar), "articulos_creados": len(crear)}
+
+
+class CargaCapturaCrearView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    """
+    Endpoint: POST /api/inventario/captura/<pk>/cargas/
+    Body: {"total_fragmentos": N}. Abre una carga nueva para la captura.
+    """
+    def post(self, request, pk, *args, **kwargs):
+        captura = get_object_or_404(Captura, pk=pk)
+        if not _puede_editar(request.user, captura):
+            return Response({"error": "No tienes permiso para editar esta captura."}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            total = int(request.data.get('total_fragmentos'))
+        except (TypeError, ValueError):
+            total = 0
+        if not 1 <= total <= MAX_FRAGMENTOS:
+            return Response({"error": f"total_fragmentos debe estar entre 1 y {MAX_FRAGMENTOS}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        carga = CargaCaptura.objects.create(captura=captura, usuario=request.user, total_fragmentos=total)
+        return Response(_estado_carga(carga), status=status.HTTP_201_CREATED)
+
+
+class CargaCapturaEstadoView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    """
+    Endpoint: GET /api/inventario/cargas/<pk>/
+    Tras una desconexión el cliente consulta aquí y reenvía solo los 'faltantes'.
+    """
+    def get(self, request, pk, *args, **kwargs):
+        carga = get_object_or_404(CargaCaptura.objects.select_related('captura'), pk=pk)
+        if not _puede_editar(request.user, carga.captura):
+            return Response({"error": "No tienes permiso para ver esta carga."}, status=status.HTTP_403_FORBIDDEN)
+        return Response(_estado_carga(carga), status=status.HTTP_200_OK)
+
+
+class FragmentoCargaView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    """
+    Endpoint: PUT /api/inventario/cargas/<pk>/fragmentos/<numero>/
+    Body: arreglo JSON de detalles, opcionalmente con Content-Encoding: gzip.
+    Si algún renglón es inválido no se guarda nada y se responde 400 con los errores por índice.
+    """
+    def put(self, request, pk, numero, *args, **kwargs):
+        carga = get_object_or_404(CargaCaptura.objects.select_related('captura'), pk=pk)
+        if not _puede_editar(request.user, carga.captura):
+            return Response({"error": "No tienes permiso para editar esta captura."}, status=status.HTTP_403_FORBIDDEN)
+        if carga.estado != 'ABIERTA':
+            return Response({"error": f"La carga está {carga.estado}."}, status=status.HTTP_409_CONFLICT)
+        if not 0 <= numero < carga.total_fragmentos:
+            return Response({"error": f"Fragmento fuera de rango (0 a {carga.total_fragmentos - 1})."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            datos = _leer_cuerpo_fragmento(request)
+        except (ValueError, zlib.error) as e:
+            return Response({"error": f"Cuerpo inválido: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not isinstance(datos, list):
+            return Response({"error": "Se esperaba una lista (array) de detalles."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(datos) > MAX_RENGLONES_FRAGMENTO:
+            return Response({"error": f"Máximo {MAX_RENGLONES_FRAGMENTO} renglones por fragmento."}, status=status.HTTP_400_BAD_REQUEST)
+
+        renglones, errores = _validar_renglones(datos)
+        if errores:
+            return Response({"errores": dict(sorted(errores.items()))}, status=status.HTTP_400_BAD_REQUEST)
+
+        FragmentoCarga.objects.update_or_create(carga=carga, numero=numero, defaults={'renglones': renglones})
+        return Response({"numero": numero, "renglones": len(renglones)}, status=status.HTTP_200_OK)
+
+
+class CargaCapturaConfirmarView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    """
+    Endpoint: POST /api/inventario/cargas/<pk>/confirmar/
+    Aplica los fragmentos (ya validados) a la captura. Acepta Idempotency-Key.
+    """
+    @idempotente
+    def post(self, request, pk, *args, **kwargs):
+        with transaction.atomic():
+            carga = get_object_or_404(CargaCaptura.objects.select_for_update().select_related('captura'), pk=pk)
+            if not _puede_editar(request.user, carga.captura):
+                return Response({"error": "No tienes permiso para editar esta captura."}, status=status.HTTP_403_FORBIDDEN)
+            if carga.estado != 'ABIERTA':
+                return Response({"error": f"La carga ya está {carga.estado}."}, status=status.HTTP_409_CONFLICT)
+
+            estado = _estado_carga(carga)
+            if estado['faltantes']:
+                return Response({
+                    "error": "Faltan fragmentos por recibir.",
+                    "faltantes": estado['faltantes']
+                }, status=status.HTTP_409_CONFLICT)
+
+            resumen = _aplicar_carga(carga)
+
+            carga.estado = 'CONFIRMADA'
+            carga.fecha_confirmacion = timezone.now()
+            carga.save(update_fields=['estado', 'fecha_confirmacion'])
+            # Los renglones ya viven en DetalleCaptura
+            carga.fragmentos.all().delete()
+
+        return Response({
+            "mensaje": "Carga aplicada a la captura.",
+            "captura_id": carga.captura_id,
+            **resumen
+        }, status=status.HTTP_200_OK)
@@ -0,0 +1,145 @@
+from django.http import FileResponse, HttpResponseNotModified
+from django.shortcuts import get_object_or_404
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from rest_framework import status
+
+from ..models import Almacen, Articulo, BitacoraSincronizacion, ClaveAuxiliar, InventarioArticulo, SnapshotCatalogo
+from ..catalogo_snapshot import generar_snapshot_almacen, generacion_actual
+
+
+def _etag_coincide(request, etag):
+    """Compara el header If-None-Match (puede traer varios, débiles o '*') con el etag."""
+    encabezado = request.META.get('HTTP_IF_NONE_MATCH', '')
+    if not encabezado:
+        return False
+    for valor in encabezado.split(','):
+        valor = valor.strip()
+        if valor == '*':
+            return True
+        if valor.startswith('W/'):
+            valor = valor[2:]
+        if valor.strip('"') == etag:
+            return True
+    return False
+
+
+class CatalogoSnapshotView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    """
+    Endpoint: GET /api/inventario/almacenes/<pk>/catalogo/
+    Descarga el catálogo offline del almacén (SQLite comprimido con gzip).
+    Enviar el ETag recibido en If-None-Match: si el catálogo no cambió responde 304 sin cuerpo.
+    """
+    def get(self, request, pk, *args, **kwargs):
+        almacen = get_object_or_404(Almacen, pk=pk)
+
+        snapshot = SnapshotCatalogo.objects.filter(almacen=almacen).first()
+        if snapshot is None:
+            # Aún no hay sincronización que lo haya generado
+            snapshot = generar_snapshot_almacen(almacen)
+
+        etag_header = f'"{snapshot.etag}"'
+        if _etag_coincide(request, snapshot.etag):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag_header
+            return response
+
+        response = FileResponse(
+            snapshot.archivo.open('rb'),
+            as_attachment=True,
+            filename=f"catalogo_{almacen.almacen_id_msip}.sqlite3.gz",
+            content_type='application/gzip'
+        )
+        response['ETag'] = etag_header
+        response['Cache-Control'] = 'private, no-cache'
+        response['X-Catalogo-Generado'] = snapshot.fecha_generacion.isoformat()
+        response['X-Catalogo-Articulos'] = str(snapshot.total_articulos)
+        return response
+
+
+# -------------------------------------------------------------------------
+# FEED DE CAMBIOS (desde una generación)
+# -------------------------------------------------------------------------
+
+# Arriba de esto conviene más descargar el snapshot completo
+MAX_ARTICULOS_FEED = 20000
+
+
+class CatalogoCambiosView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    """
+    Endpoint: GET /api/inventario/almacenes/<pk>/catalogo/cambios/?desde_generacion=N
+    Retorna solo lo que cambió desde la generación N (ID de la sincronización que
+    el dispositivo ya tiene; viene en los metadatos del snapshot y en cada respuesta):
+    - articulos: creados/modificados, con todas sus claves auxiliares (reemplazan las anteriores).
+    - eliminados: IDs de artículos desactivados (tombstones).
+    - existencias: filas de InventarioArticulo del almacén que cambiaron.
+    Las filas de la generación N tienen fecha <= fecha_fin de esa sincronización y las
+    siguientes generaciones escriben después, así que basta comparar contra esa fecha.
+    """
+    def get(self, request, pk, *args, **kwargs):
+        almacen = get_object_or_404(Almacen, pk=pk)
+
+        try:
+            desde_generacion = int(request.query_params.get('desde_generacion', ''))
+        except ValueError:
+            return Response({"error": "Se requiere 'desde_generacion' (entero). Sin generación descargue el catálogo completo."}, status=status.HTTP_400_BAD_REQUEST)
+
+        generacion = generacion_actual()
+        corte = BitacoraSincronizacion.objects.filter(
+            pk=desde_generacion, status='EXITO'
+        ).values_list('fecha_fin', flat=True).first()
+        if corte is None:
+            return Response({
+                "error": "Generación desconocida. Descargue el catálogo completo.",
+                "requiere_snapshot": True
+            }, status=status.HTTP_410_GONE)
+
+        articulos_cambiados = Articulo.objects.filter(ultima_sincronizacion__gt=corte)
+        if articulos_cambiados.count() > MAX_ARTICULOS_FEED:
+            return Response({
+                "error": "Demasiados cambios. Descargue el catálogo completo.",
+                "requiere_snapshot": True
+            }, status=status.HTTP_410_GONE)
+
+        articulos = {}
+        eliminados = []
+        for articulo_id, clave, nombre, seguimiento, activo in articulos_cambiados.values_list(
+            'id', 'clave', 'nombre', 'seguimiento_tipo', 'activo'
+        ):
+            if not activo:
+                eliminados.append(articulo_id)
+                continue
+            articulos[articulo_id] = {
+                "id": articulo_id,
+                "clave": clave,
+                "nombre": nombre,
+                "seguimiento": seguimiento,
+                "claves_auxiliares": []
+            }
+
+        if articulos:
+            for articulo_id, clave in ClaveAuxiliar.objects.filter(
+                articulo_id__in=list(articulos)
+            ).order_by('articulo_id', 'clave').values_list('articulo_id', 'clave'):
+                articulos[articulo_id]["claves_auxiliares"].append(clave)
+
+        existencias = [
+            {"articulo_id": articulo_id, "existencia": existencia, "localizacion": localizacion}
+            for articulo_id, existencia, localizacion in InventarioArticulo.objects.filter(
+                almacen=almacen,
+                fecha_ultima_modificacion_local__gt=corte,
+                articulo__activo=True
+            ).values_list('articulo_id', 'existencia', 'localizacion')
+        ]
+
+        return Response({
+            "generacion": generacion,
+            "articulos": list(articulos.values()),
+            "eliminados": eliminados,
+            "existencias": existencias
+        }, status=status.HTTP_200_OK)
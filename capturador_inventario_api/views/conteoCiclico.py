@@ -0,0 +1,79 @@
+from django.db.models import Exists, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.shortcuts import get_object_or_404
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from rest_framework import status
+
+from ..models import AsignacionConteo, Captura, DetalleCaptura, InventarioArticulo, LOCALIZACION_ORDEN_VACIA
+from ..permisos import es_administrador
+from ..serializers import CapturaListaSerializer
+
+
+class ConteoCiclicoListView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    """
+    Endpoint: GET /api/inventario/conteo-ciclico/?almacen=ID
+    Capturas de conteo cíclico abiertas (BORRADOR), generadas por task_conteo_ciclico_diario.
+    """
+    def get(self, request, *args, **kwargs):
+        capturas = Captura.objects.filter(tipo='CICLICO', estado='BORRADOR').select_related(
+            'capturador', 'almacen'
+        ).order_by('-fecha_captura')
+
+        almacen_id = request.query_params.get('almacen')
+        if almacen_id:
+            capturas = capturas.filter(almacen_id=almacen_id)
+
+        return Response(CapturaListaSerializer(capturas, many=True).data, status=status.HTTP_200_OK)
+
+
+class AsignacionesConteoView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    """
+    Endpoint: GET /api/inventario/captura/<pk>/asignaciones/
+    Artículos que el conteo cíclico pide contar, en el orden de la ruta del almacén
+    y marcando los que ya tienen detalle en la captura.
+    """
+    def get(self, request, pk, *args, **kwargs):
+        captura = get_object_or_404(Captura, pk=pk)
+
+        # Las capturas cíclicas se generan sin capturador: cualquiera puede tomarlas
+        if captura.capturador_id and captura.capturador_id != request.user.id and not es_administrador(request.user):
+            return Response({"error": "No tienes permiso para ver esta captura."}, status=status.HTTP_403_FORBIDDEN)
+
+        inventario = InventarioArticulo.objects.filter(almacen_id=captura.almacen_id, articulo_id=OuterRef('articulo_id'))
+        asignaciones = AsignacionConteo.objects.filter(captura=captura).annotate(
+            localizacion=Subquery(inventario.values('localizacion')[:1]),
+            localizacion_orden=Coalesce(Subquery(inventario.values('localizacion_orden')[:1]), Value(LOCALIZACION_ORDEN_VACIA)),
+            existencia_teorica=Subquery(inventario.values('existencia')[:1]),
+            contado=Exists(DetalleCaptura.objects.filter(captura=captura, articulo_id=OuterRef('articulo_id')))
+        ).order_by('localizacion_orden', 'articulo__clave').values(
+            'articulo_id', 'articulo__clave', 'articulo__nombre', 'clasificacion_abc', 'ultimo_conteo',
+            'localizacion', 'existencia_teorica', 'contado'
+        )
+
+        resultados = [
+            {
+                "articulo_id": fila['articulo_id'],
+                "clave": fila['articulo__clave'],
+                "nombre": fila['articulo__nombre'],
+                "clasificacion_abc": fila['clasificacion_abc'],
+                "ultimo_conteo": fila['ultimo_conteo'],
+                "localizacion": fila['localizacion'],
+                "existencia_teorica": fila['existencia_teorica'] or 0,
+                "contado": fila['contado']
+            }
+            for fila in asignaciones
+        ]
+
+        return Response({
+            "captura_id": captura.id,
+            "folio": captura.folio,
+            "total": len(resultados),
+            "contados": sum(1 for r in resultados if r['contado']),
+            "asignaciones": resultados
+        }, status=status.HTTP_200_OK)
@@ -95,19 +95,11 @@ class DashboardChartsView(APIView):
 
         # --- ESTRATEGIA SEGURA: TRAER DATOS CRUDOS Y AGRUPAR EN PYTHON ---
         
-        # 1. Obtener todas las capturas relevantes con sus campos necesarios
+        # 1. Capturas relevantes con sus totales acumulados (ver totales_captura.py);
+        #    no hace falta recorrer DetalleCaptura
         capturas_raw = Captura.objects.filter(
             fecha_captura__gte=start_date
-        ).values('id', 'fecha_captura')
-
-        # 2. Obtener detalles relevantes, optimizando la query
-        detalles_raw = DetalleCaptura.objects.filter(
-            captura__fecha_captura__gte=start_date
-        ).values(
-            'captura__fecha_captura', 
-            'cantidad_contada', 
-            'existencia_sistema_al_momento'
-        )
+        ).values('id', 'fecha_captura', 'total_renglones', 'renglones_con_diferencia')
 
         data_map = {}
 
@@ -122,7 +114,7 @@ class DashboardChartsView(APIView):
                     "articulos_exactos": 0
                 }
 
-        # --- A. PROCESAR CAPTURAS (Conteo total) ---
+        # --- PROCESAR CAPTURAS (Conteo total, Diferencias vs Exactos) ---
         for c in capturas_raw:
             fecha = c['fecha_captura']
             if fecha:
@@ -136,27 +128,8 @@ class DashboardChartsView(APIView):
                 
                 init_month(mes_key, nombre_mes)
                 data_map[mes_key]["capturas_totales"] += 1
-
-        # --- B. PROCESAR DETALLES (Diferencias vs Exactos) ---
-        for d in detalles_raw:
-            fecha = d['captura__fecha_captura']
-            cant_contada = d['cantidad_contada']
-            cant_sistema = d['existencia_sistema_al_momento']
-
-            if fecha:
-                mes_key = f"{fecha.year}-{str(fecha.month).zfill(2)}"
-                try:
-                    nombre_mes = calendar.month_name[fecha.month]
-                except (IndexError, ValueError):
-                    nombre_mes = "Desconocido"
-                
-                init_month(mes_key, nombre_mes)
-
-                # Lógica de comparación exacta (Decimal vs Decimal)
-                if cant_contada == cant_sistema:
-                    data_map[mes_key]["articulos_exactos"] += 1
-                else:
-                    data_map[mes_key]["articulos_con_diferencia"] += 1
+                data_map[mes_key]["articulos_con_diferencia"] += c['renglones_con_diferencia']
+                data_map[mes_key]["articulos_exactos"] += c['total_renglones'] - c['renglones_con_diferencia']
 
         # Ordenar cronológicamente
         final_data = sorted(data_map.values(), key=lambda x: x['fecha'])
@@ -8,7 +8,7 @@ from rest_framework.response import Response
 from datetime import date, datetime
 
 # Importaciones locales
-from ..models import Empleado
+from ..models import Empleado, invalidar_cache_token
 from ..serializers import EmpleadoSerializer, UserSerializer
 
 def calcular_edad(fecha_nacimiento_str):
@@ -167,6 +167,9 @@ class UsuarioGestionView(APIView):
         user.last_name = data.get("last_name", user.last_name)
         user.save()
 
+        # El token cacheado lleva el puesto anterior (se descarta al confirmar la transacción)
+        invalidar_cache_token(user)
+
         return Response({"mensaje": "Actualizado correctamente"}, status=200)
 
     # ELIMINAR USUARIO (DELETE)
@@ -181,5 +184,6 @@ class UsuarioGestionView(APIView):
         empleado = get_object_or_404(Empleado, id=usuario_id)
         empleado.user.is_active = False
         empleado.user.save()
+        invalidar_cache_token(empleado.user)
 
         return Response({"mensaje": "Usuario desactivado correctamente"}, status=200)
\ No newline at end of file
@@ -0,0 +1,47 @@
+import os
+from django.conf import settings
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from rest_framework import status
+
+from .. import metricas
+from ..permisos import EsAdministrador
+
+ORDENES = {
+    'p95': lambda fila: fila['latencia_ms']['p95'] or 0,
+    'consultas': lambda fila: fila['consultas']['p95'] or 0,
+    'bytes': lambda fila: fila['bytes']['max'] or 0,
+    'peticiones': lambda fila: fila['peticiones'],
+}
+
+
+class MetricasView(APIView):
+    permission_classes = [IsAuthenticated, EsAdministrador]
+
+    """
+    Endpoint: /api/metricas/
+    GET:    Latencia (p50/p95/p99), consultas SQL, tiempo en BD y tamaño de respuesta por
+            endpoint, de las últimas METRICAS['MUESTRAS_POR_RUTA'] peticiones de este proceso.
+            ?orden=p95|consultas|bytes|peticiones (por defecto p95, de mayor a menor).
+    DELETE: Reinicia los contadores.
+    """
+    def get(self, request, *args, **kwargs):
+        habilitado = settings.METRICAS['HABILITADO']
+        orden = request.query_params.get('orden', 'p95')
+        if orden not in ORDENES:
+            return Response({"error": f"orden inválido. Opciones: {', '.join(ORDENES)}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        desde, filas = metricas.resumen()
+        filas.sort(key=ORDENES[orden], reverse=True)
+
+        return Response({
+            "habilitado": habilitado,
+            "pid": os.getpid(),
+            "desde": desde,
+            "rutas": filas
+        }, status=status.HTTP_200_OK)
+
+    def delete(self, request, *args, **kwargs):
+        metricas.reiniciar()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,130 @@
+import openpyxl
+from io import BytesIO
+from django.db.models import Count, Min, Sum
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.pagination import PageNumberPagination
+from rest_framework import status
+
+from ..models import ArticuloNoContado, Captura
+from ..permisos import es_administrador
+from ..no_contados import calculo_en_curso, encolar_calculo_no_contados
+
+SIN_LOCALIZACION = 'SIN LOCALIZACION'
+
+
+class PaginacionNoContados(PageNumberPagination):
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+def _resumen_por_localizacion(resultados):
+    return [
+        {
+            "localizacion": fila['localizacion'] or SIN_LOCALIZACION,
+            "articulos": fila['articulos'],
+            "existencia": fila['existencia']
+        }
+        for fila in resultados.order_by().values('localizacion').annotate(
+            articulos=Count('id'), existencia=Sum('existencia'), orden=Min('localizacion_orden')
+        ).order_by('orden')
+    ]
+
+
+def _exportar_excel(captura, resultados):
+    # write_only: el resultado puede tener decenas de miles de filas
+    wb = openpyxl.Workbook(write_only=True)
+
+    ws = wb.create_sheet("No contados")
+    ws.append(["Localización", "Clave", "Artículo", "Existencia"])
+    for localizacion, clave, nombre, existencia in resultados.values_list(
+        'localizacion', 'articulo__clave', 'articulo__nombre', 'existencia'
+    ).iterator(chunk_size=5000):
+        ws.append([localizacion or SIN_LOCALIZACION, clave, nombre, existencia])
+
+    ws_resumen = wb.create_sheet("Por localizacion")
+    ws_resumen.append(["Localización", "Artículos", "Existencia"])
+    for fila in _resumen_por_localizacion(resultados):
+        ws_resumen.append([fila['localizacion'], fila['articulos'], fila['existencia']])
+
+    buffer = BytesIO()
+    wb.save(buffer)
+    buffer.seek(0)
+
+    response = HttpResponse(
+        buffer,
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+    response['Content-Disposition'] = f'attachment; filename="NoContados_{captura.folio}.xlsx"'
+    return response
+
+
+class ArticulosNoContadosView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    """
+    Endpoint: /api/inventario/captura/<pk>/no-contados/
+    GET:  Artículos con existencia en el almacén que no se contaron, ordenados por
+          localización (?localizacion=A-01, ?page=, ?page_size=). ?formato=xlsx exporta todo.
+    POST: Vuelve a calcular en segundo plano (se calcula solo al confirmar la captura).
+    """
+    def _obtener_captura(self, request, pk):
+        captura = get_object_or_404(Captura.objects.select_related('almacen'), pk=pk)
+        if not es_administrador(request.user) and captura.capturador_id != request.user.id:
+            return None
+        return captura
+
+    def get(self, request, pk, *args, **kwargs):
+        captura = self._obtener_captura(request, pk)
+        if captura is None:
+            return Response({"error": "No tienes permiso para ver esta captura."}, status=status.HTTP_403_FORBIDDEN)
+
+        if captura.estado_no_contados != 'LISTO':
+            return Response({
+                "estado": captura.estado_no_contados or 'SIN_CALCULAR',
+                "mensaje": "El cálculo aún no está disponible. Use POST para solicitarlo."
+            }, status=status.HTTP_202_ACCEPTED if calculo_en_curso(captura) else status.HTTP_409_CONFLICT)
+
+        resultados = ArticuloNoContado.objects.filter(captura=captura).select_related('articulo').order_by(
+            'localizacion_orden', 'articulo__clave'
+        )
+        localizacion = request.query_params.get('localizacion')
+        if localizacion is not None:
+            resultados = resultados.filter(localizacion='' if localizacion == SIN_LOCALIZACION else localizacion)
+
+        if request.query_params.get('formato') == 'xlsx':
+            return _exportar_excel(captura, resultados)
+
+        paginador = PaginacionNoContados()
+        pagina = paginador.paginate_queryset(resultados, request, view=self)
+        response = paginador.get_paginated_response([
+            {
+                "articulo_id": fila.articulo_id,
+                "clave": fila.articulo.clave,
+                "nombre": fila.articulo.nombre,
+                "localizacion": fila.localizacion or SIN_LOCALIZACION,
+                "existencia": fila.existencia
+            }
+            for fila in pagina
+        ])
+        response.data['fecha_calculo'] = captura.fecha_no_contados
+        response.data['por_localizacion'] = _resumen_por_localizacion(resultados)
+        return response
+
+    def post(self, request, pk, *args, **kwargs):
+        captura = self._obtener_captura(request, pk)
+        if captura is None:
+            return Response({"error": "No tienes permiso para editar esta captura."}, status=status.HTTP_403_FORBIDDEN)
+        if not captura.almacen_id:
+            return Response({"error": "La captura no tiene almacén."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Un cálculo EN_PROCESO cuyo worker murió se vuelve a encolar (ver calculo_en_curso)
+        if not calculo_en_curso(captura):
+            if encolar_calculo_no_contados(captura) is None:
+                return Response({"error": "No se pudo encolar el cálculo."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        return Response({"estado": "EN_COLA"}, status=status.HTTP_202_ACCEPTED)
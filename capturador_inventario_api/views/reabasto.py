@@ -0,0 +1,100 @@
+import openpyxl
+from io import BytesIO
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from rest_framework.views import APIView
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.pagination import PageNumberPagination
+
+from ..models import Almacen, InventarioArticulo
+
+SIN_LOCALIZACION = 'SIN LOCALIZACION'
+
+
+class PaginacionReabasto(PageNumberPagination):
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+def _fila_reabasto(existencia, stock_minimo, stock_maximo, punto_reorden):
+    """Cantidad sugerida: hasta stock_maximo; sin máximo, hasta el nivel de reorden."""
+    nivel = punto_reorden if punto_reorden > 0 else stock_minimo
+    objetivo = stock_maximo if stock_maximo > nivel else nivel
+    return {
+        "bajo_minimo": stock_minimo > 0 and existencia < stock_minimo,
+        "cantidad_sugerida": max(objetivo - existencia, 0)
+    }
+
+
+def _exportar_excel(almacen, reabasto):
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(f"Reabasto {almacen.almacen_id_msip}")
+    ws.append([
+        "Clave", "Artículo", "Localización", "Existencia", "Mínimo", "Punto reorden",
+        "Máximo", "Bajo mínimo", "Cantidad sugerida"
+    ])
+    for clave, nombre, localizacion, existencia, minimo, maximo, reorden in reabasto.values_list(
+        'articulo__clave', 'articulo__nombre', 'localizacion', 'existencia',
+        'stock_minimo', 'stock_maximo', 'punto_reorden'
+    ).iterator(chunk_size=5000):
+        calculo = _fila_reabasto(existencia, minimo, maximo, reorden)
+        ws.append([
+            clave, nombre, localizacion or SIN_LOCALIZACION, existencia, minimo, reorden, maximo,
+            "SI" if calculo['bajo_minimo'] else "NO", calculo['cantidad_sugerida']
+        ])
+
+    buffer = BytesIO()
+    wb.save(buffer)
+    buffer.seek(0)
+
+    response = HttpResponse(
+        buffer,
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+    response['Content-Disposition'] = f'attachment; filename="Reabasto_{almacen.almacen_id_msip}.xlsx"'
+    return response
+
+
+class ReabastoView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    """
+    Endpoint: GET /api/inventario/almacenes/<pk>/reabasto/
+    Artículos del almacén en o debajo de su punto de reorden (o del mínimo si no tienen
+    punto de reorden), con la cantidad sugerida para llegar al máximo.
+    Usa InventarioArticulo.bajo_punto_reorden, que se calcula en la sincronización.
+    ?orden=ruta ordena por localización (por defecto por clave).
+    Paginado (?page=, ?page_size=) o ?formato=xlsx para la lista completa.
+    """
+    def get(self, request, pk, *args, **kwargs):
+        almacen = get_object_or_404(Almacen, pk=pk)
+
+        reabasto = InventarioArticulo.objects.filter(
+            almacen=almacen, bajo_punto_reorden=True, articulo__activo=True
+        ).select_related('articulo')
+
+        if request.query_params.get('orden') == 'ruta':
+            reabasto = reabasto.order_by('localizacion_orden', 'articulo__clave')
+        else:
+            reabasto = reabasto.order_by('articulo__clave')
+
+        if request.query_params.get('formato') == 'xlsx':
+            return _exportar_excel(almacen, reabasto)
+
+        paginador = PaginacionReabasto()
+        pagina = paginador.paginate_queryset(reabasto, request, view=self)
+        return paginador.get_paginated_response([
+            {
+                "articulo_id": fila.articulo_id,
+                "clave": fila.articulo.clave,
+                "nombre": fila.articulo.nombre,
+                "localizacion": fila.localizacion or SIN_LOCALIZACION,
+                "existencia": fila.existencia,
+                "stock_minimo": fila.stock_minimo,
+                "punto_reorden": fila.punto_reorden,
+                "stock_maximo": fila.stock_maximo,
+                **_fila_reabasto(fila.existencia, fila.stock_minimo, fila.stock_maximo, fila.punto_reorden)
+            }
+            for fila in pagina
+        ])
@@ -0,0 +1,107 @@
+import openpyxl
+from decimal import Decimal, InvalidOperation
+from io import BytesIO
+from django.db.models import DecimalField, ExpressionWrapper, F
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.pagination import PageNumberPagination
+from rest_framework import status
+
+from ..models import Almacen, InventarioArticulo, calcular_localizacion_orden
+
+SIN_LOCALIZACION = 'SIN LOCALIZACION'
+
+
+class PaginacionRuta(PageNumberPagination):
+    page_size = 200
+    page_size_query_param = 'page_size'
+    max_page_size = 2000
+
+
+def _hoja_conteo(almacen, ruta):
+    """Hoja imprimible: la columna 'Contado' queda vacía para llenarla a mano."""
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(f"Ruta {almacen.almacen_id_msip}")
+    ws.append(["#", "Localización", "Clave", "Artículo", "Existencia", "Contado"])
+    for numero, (localizacion, clave, nombre, existencia) in enumerate(ruta.values_list(
+        'localizacion', 'articulo__clave', 'articulo__nombre', 'existencia'
+    ).iterator(chunk_size=5000), start=1):
+        ws.append([numero, localizacion or SIN_LOCALIZACION, clave, nombre, existencia, None])
+
+    buffer = BytesIO()
+    wb.save(buffer)
+    buffer.seek(0)
+
+    response = HttpResponse(
+        buffer,
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+    response['Content-Disposition'] = f'attachment; filename="RutaConteo_{almacen.almacen_id_msip}.xlsx"'
+    return response
+
+
+class RutaConteoView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    """
+    Endpoint: GET /api/inventario/almacenes/<pk>/ruta-conteo/
+    Artículos del almacén en el orden en que se recorre (pasillo/anaquel/nivel con
+    orden natural: A-2 antes que A-10, ver InventarioArticulo.localizacion_orden).
+    Filtros: ?con_existencia=1, ?valor_minimo=500 (existencia * costo_ultimo; 409 si
+             el almacén aún no tiene costos sincronizados), ?desde=B-01 (retomar la
+             ruta desde una localización).
+    Paginado (?page=, ?page_size=) o ?formato=xlsx para la hoja de conteo completa.
+    """
+    def get(self, request, pk, *args, **kwargs):
+        almacen = get_object_or_404(Almacen, pk=pk)
+
+        ruta = InventarioArticulo.objects.filter(almacen=almacen, articulo__activo=True)
+
+        if request.query_params.get('con_existencia') in ('1', 'true'):
+            ruta = ruta.filter(existencia__gt=0)
+
+        valor_minimo = request.query_params.get('valor_minimo')
+        if valor_minimo:
+            try:
+                valor_minimo = Decimal(valor_minimo)
+            except InvalidOperation:
+                valor_minimo = None
+            # Decimal acepta 'NaN' e 'Infinity', que el filtro no puede usar
+            if valor_minimo is None or not valor_minimo.is_finite():
+                return Response({"error": "valor_minimo inválido."}, status=status.HTTP_400_BAD_REQUEST)
+            # costo_ultimo lo llena la sincronización; sin costos el filtro vaciaría la ruta en silencio
+            if not ruta.filter(articulo__costo_ultimo__gt=0).exists():
+                return Response({
+                    "error": "Los artículos del almacén aún no tienen costo; sincronice con Microsip antes de filtrar por valor_minimo."
+                }, status=status.HTTP_409_CONFLICT)
+            ruta = ruta.annotate(
+                valor=ExpressionWrapper(
+                    F('existencia') * F('articulo__costo_ultimo'),
+                    output_field=DecimalField(max_digits=36, decimal_places=11)
+                )
+            ).filter(valor__gte=valor_minimo)
+
+        desde = request.query_params.get('desde')
+        if desde:
+            ruta = ruta.filter(localizacion_orden__gte=calcular_localizacion_orden(desde))
+
+        ruta = ruta.select_related('articulo').order_by('localizacion_orden', 'articulo__clave')
+
+        if request.query_params.get('formato') == 'xlsx':
+            return _hoja_conteo(almacen, ruta)
+
+        paginador = PaginacionRuta()
+        pagina = paginador.paginate_queryset(ruta, request, view=self)
+        return paginador.get_paginated_response([
+            {
+                "articulo_id": fila.articulo_id,
+                "clave": fila.articulo.clave,
+                "nombre": fila.articulo.nombre,
+                "localizacion": fila.localizacion or SIN_LOCALIZACION,
+                "existencia": fila.existencia
+            }
+            for fila in pagina
+        ])
@@ -0,0 +1,159 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django_q.tasks import async_task, fetch
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from rest_framework import status
+
+from ..models import BitacoraSincronizacion, BloqueoSincronizacion
+from ..microsip_api.microsip_api_sync_bloqueo import ArrendamientoSincronizacion, NOMBRE_BLOQUEO_SYNC
+from ..serializers import BitacoraSincronizacionSerializer
+from ..permisos import EsAdministrador
+
+TAREA_SINCRONIZACION = 'capturador_inventario_api.tasks.task_sincronizar_inventario'
+TAREA_SIMULACION = 'capturador_inventario_api.tasks.task_simular_sincronizacion'
+MUESTRA_MAXIMA = 200
+
+
+def _sincronizacion_activa():
+    """
+    Retorna la bitácora de una sincronización en proceso (según el bloqueo de
+    sincronización) o en cola. Las bitácoras en cola más viejas que el timeout de
+    Django-Q se ignoran (el worker murió sin poder tomarlas).
+    """
+    bloqueo = ArrendamientoSincronizacion.bloqueo_activo()
+    if bloqueo:
+        if bloqueo.bitacora_id:
+            return bloqueo.bitacora
+        en_proceso = BitacoraSincronizacion.objects.filter(status='EN_PROCESO').order_by('-fecha_inicio').first()
+        if en_proceso:
+            return en_proceso
+
+    timeout = settings.Q_CLUSTER.get('timeout', 3600)
+    limite = timezone.now() - timedelta(seconds=timeout)
+    return BitacoraSincronizacion.objects.filter(
+        status='EN_COLA',
+        fecha_inicio__gte=limite
+    ).order_by('-fecha_inicio').first()
+
+
+class SincronizacionView(APIView):
+    """
+    Endpoint: /api/sincronizacion/
+    POST: Encola una sincronización con Microsip y retorna el ID del trabajo (bitácora).
+          Si ya hay una en curso, retorna esa misma en lugar de encolar otra.
+    GET:  Últimas sincronizaciones registradas.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_permissions(self):
+        # Consultar es libre; iniciar una sincronización es exclusivo de administradores
+        if self.request.method == 'POST':
+            return [IsAuthenticated(), EsAdministrador()]
+        return super().get_permissions()
+
+    def get(self, request, *args, **kwargs):
+        bitacoras = BitacoraSincronizacion.objects.select_related('solicitado_por').order_by('-fecha_inicio')[:10]
+        serializer = BitacoraSincronizacionSerializer(bitacoras, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    def post(self, request, *args, **kwargs):
+        # La fila del bloqueo serializa las solicitudes simultáneas: la segunda espera
+        # aquí y, al continuar, ya ve la bitácora EN_COLA de la primera
+        with transaction.atomic():
+            BloqueoSincronizacion.objects.select_for_update().get_or_create(nombre=NOMBRE_BLOQUEO_SYNC)
+            activa = _sincronizacion_activa()
+            if activa is None:
+                bitacora = BitacoraSincronizacion.objects.create(
+                    status='EN_COLA',
+                    etapa='EN_COLA',
+                    solicitado_por=request.user
+                )
+
+        if activa:
+            return Response({
+                "mensaje": "Ya hay una sincronización en curso.",
+                "job_id": activa.id,
+                "duplicada": True,
+                "sincronizacion": BitacoraSincronizacionSerializer(activa).data
+            }, status=status.HTTP_200_OK)
+
+        try:
+            bitacora.task_id = async_task(
+                TAREA_SINCRONIZACION,
+                bitacora.id,
+                task_name=f"sincronizacion-{bitacora.id}"
+            )
+            bitacora.save(update_fields=['task_id'])
+        except Exception as e:
+            bitacora.status = 'ERROR'
+            bitacora.mensaje_error = f"No se pudo encolar la tarea: {e}"
+            bitacora.fecha_fin = timezone.now()
+            bitacora.save()
+            return Response({"error": "No se pudo encolar la sincronización.", "detalle": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        return Response({
+            "mensaje": "Sincronización encolada.",
+            "job_id": bitacora.id,
+            "duplicada": False,
+            "sincronizacion": BitacoraSincronizacionSerializer(bitacora).data
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class SincronizacionEstadoView(APIView):
+    """
+    Endpoint: /api/sincronizacion/<id>/
+    Retorna la etapa actual y los contadores de una sincronización (para polling).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk, *args, **kwargs):
+        bitacora = get_object_or_404(BitacoraSincronizacion.objects.select_related('solicitado_por'), pk=pk)
+        serializer = BitacoraSincronizacionSerializer(bitacora)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class SincronizacionSimulacionView(APIView):
+    """
+    Endpoint: /api/sincronizacion/simulacion/
+    POST: Encola una simulación (dry-run): qué crearía, renombraría (_DUP_), desactivaría
+          y cuántas claves y existencias cambiaría la sincronización, sin escribir nada.
+          ?muestra=N filas de ejemplo por tipo de cambio (por defecto 20, 0 = solo conteos).
+          El resultado se consulta en SincronizacionSimulacionResultadoView.
+    """
+    permission_classes = [IsAuthenticated, EsAdministrador]
+
+    def post(self, request, *args, **kwargs):
+        try:
+            muestra = int(request.query_params.get('muestra', request.data.get('muestra', 20)))
+        except (TypeError, ValueError):
+            return Response({"error": "muestra debe ser un número."}, status=status.HTTP_400_BAD_REQUEST)
+        muestra = max(0, min(muestra, MUESTRA_MAXIMA))
+
+        try:
+            task_id = async_task(TAREA_SIMULACION, muestra, task_name=f"simulacion-{timezone.now():%Y%m%d%H%M%S}")
+        except Exception as e:
+            return Response({"error": "No se pudo encolar la simulación.", "detalle": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        return Response({"mensaje": "Simulación encolada.", "task_id": task_id}, status=status.HTTP_202_ACCEPTED)
+
+
+class SincronizacionSimulacionResultadoView(APIView):
+    """
+    Endpoint: /api/sincronizacion/simulacion/<task_id>/
+    GET: Resultado de la simulación (202 mientras corre).
+    """
+    permission_classes = [IsAuthenticated, EsAdministrador]
+
+    def get(self, request, task_id, *args, **kwargs):
+        tarea = fetch(task_id)
+        if tarea is None:
+            # Django-Q solo guarda la tarea al terminar
+            return Response({"task_id": task_id, "estado": "EN_PROCESO"}, status=status.HTTP_202_ACCEPTED)
+        if not tarea.success:
+            return Response({"task_id": task_id, "estado": "ERROR", "error": str(tarea.result)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response({"task_id": task_id, "estado": "LISTO", **tarea.result}, status=status.HTTP_200_OK)
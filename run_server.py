@@ -1,15 +1,25 @@
+from multiprocessing import Process
+
 from waitress import serve
 # Asegúrate que 'capturador_inventario_api' sea el nombre de la carpeta que contiene wsgi.py
-from capturador_inventario_api.wsgi import application 
+from capturador_inventario_api.wsgi import application
+from django.conf import settings
 
 if __name__ == '__main__':
     print("--- INICIANDO SERVIDOR DE APLICACIÓN (WAITRESS) ---")
     print("Escuchando internamente en 127.0.0.1:8080")
     print("Recuerda iniciar Nginx para recibir tráfico externo.")
 
+    if settings.MICROSIP_WORKER['HABILITADO']:
+        # La DLL vive en su propio proceso; aquí ya se pueden usar varios hilos
+        from capturador_inventario_api.microsip_api.microsip_api_worker import iniciar_servidor_dll
+        worker_dll = Process(target=iniciar_servidor_dll, name='worker_dll_microsip', daemon=True)
+        worker_dll.start()
+
+    print(f"Hilos: {settings.SERVIDOR_HILOS}")
     serve(
-        application, 
+        application,
         host='127.0.0.1', # Solo acepta tráfico de Nginx (localhost)
         port=8080,
-        threads=1         # CRUCIAL: 1 hilo para evitar conflictos con la DLL de Microsip
-    )
\ No newline at end of file
+        threads=settings.SERVIDOR_HILOS  # 1 si no hay worker DLL (la DLL no es thread-safe)
+    )
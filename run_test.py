@@ -39,6 +39,10 @@ def ejecutar_prueba_completa():
         
         end_time = time.time()
         duracion = end_time - start_time
+
+        if resultados.get('omitida'):
+            print(f"\n⚠️  Ya hay una sincronización en curso (bitácora {resultados.get('bitacora_id')}). No se ejecutó otra.")
+            return
         
         # ---------------------------------------------------------
         # PASO 2: REPORTE DE EJECUCIÓN (LO QUE HIZO EL SCRIPT)